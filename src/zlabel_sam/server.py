@@ -0,0 +1,475 @@
+"""
+Stand-in for the ZLabel SAM server, to run the client and its tests locally.
+
+Images, annotations and tasks are kept in memory, optionally loaded from a
+directory with ``images/``, ``annos/*.zlabel`` and ``tasks.json``. Responses
+carry the validators the client relies on: ETag (sha256 of the body),
+Last-Modified and X-Content-SHA256, conditional requests are answered with 304.
+
+    python -m zlabel_sam.server --root data --port 8001
+"""
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from PIL import Image
+
+from zlabel.utils.anno_delta import apply_patch
+from zlabel.utils.project import Annotation
+
+
+@dataclass
+class Item(object):
+    data: bytes
+    mtime: float = field(default_factory=time.time)
+    rev: int = 1
+
+    @property
+    def sha256(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime, usegmt=True)
+
+    def not_modified(self, headers) -> bool:
+        inm = headers.get("If-None-Match", None)
+        if inm is not None:
+            return inm.strip() == "*" or self.etag in [t.strip() for t in inm.split(",")]
+        ims = headers.get("If-Modified-Since", None)
+        if ims is not None:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        users: Dict[str, str] | None = None,
+    ) -> None:
+        super().__init__((host, port), StandInHandler)
+        self.users = users
+        # token -> expiry time, tokens live token_ttl seconds if it is set
+        self.tokens: Dict[str, float] = {}
+        self.token_ttl: float | None = None
+        self.images: Dict[str, Item] = {}
+        self.zlabels: Dict[str, Item] = {}
+        self.tasks: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        # False answers get_tasks with one json list, as servers without paging do
+        self.stream_tasks = True
+        # (endpoint, status) -> number of responses
+        self.stats: Counter[Tuple[str, int]] = Counter()
+        # name -> bytes sent before the connection is dropped, once, to test resumes
+        self.drop_after: Dict[str, int] = {}
+        # seconds every image takes to start sending
+        self.image_delay = 0.0
+        # endpoint -> status it answers with, as an older server without it would
+        self.unsupported: Dict[str, int] = {}
+        # seconds every prediction takes, and the images an embedding was computed for
+        self.predict_delay = 0.0
+        self.embedded: set[str] = set()
+        # File-Path -> body of alist style uploads, and the seconds each one takes
+        self.files: Dict[str, bytes] = {}
+        self.put_delay = 0.0
+
+        self.lock = threading.RLock()
+        # every task change gets the next sequence number, sync cursors are sequence numbers
+        self.seq = 0
+        self._changed: Dict[str, int] = {}
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # region data
+    def put_image(self, name: str, data: bytes):
+        with self.lock:
+            self.images[name] = Item(data)
+
+    def put_zlabel(self, name: str, text: str) -> int:
+        with self.lock:
+            old = self.zlabels.get(name, None)
+            rev = old.rev + 1 if old is not None else 1
+            self.zlabels[name] = Item(text.encode("utf-8"), rev=rev)
+            return rev
+
+    def put_task(self, task: Dict[str, Any]):
+        with self.lock:
+            self.tasks[task["anno_id"]] = task
+            self._touch(task["anno_id"])
+
+    def remove_task(self, anno_id: str):
+        with self.lock:
+            if self.tasks.pop(anno_id, None) is not None:
+                self._touch(anno_id)
+
+    def _touch(self, anno_id: str):
+        self.seq += 1
+        self._changed[anno_id] = self.seq
+
+    def load_dir(self, root: str):
+        path = Path(root)
+        for p in sorted((path / "images").glob("*")):
+            self.put_image(p.name, p.read_bytes())
+        for p in sorted((path / "annos").glob("*.zlabel")):
+            self.put_zlabel(p.name, p.read_text(encoding="utf-8"))
+        if (path / "tasks.json").exists():
+            for t in json.loads((path / "tasks.json").read_text(encoding="utf-8")):
+                self.put_task(t)
+
+    def save(self, filename: str, text: str, base_rev: int | None = None, patch=None):
+        """Store a full annotation or a patch against base_rev, returns the new revision or None"""
+        name = Path(filename).name
+        with self.lock:
+            if patch is not None:
+                old = self.zlabels.get(name, None)
+                if old is None or old.rev != base_rev:
+                    return None
+                base = Annotation.model_validate_json(old.data)
+                text = apply_patch(base, patch).model_dump_json(indent=4)
+            rev = self.put_zlabel(name, text)
+            task = self.tasks.get(Path(name).stem, None)
+            if task is not None and not task.get("finished", False):
+                task["finished"] = True
+                self._touch(task["anno_id"])
+            return rev
+
+    # endregion
+
+    # region tasks
+    @staticmethod
+    def _match(task: Dict[str, Any], finished: int) -> bool:
+        return finished == -1 or bool(task.get("finished", False)) == bool(finished)
+
+    def list_tasks(self, finished: int) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(t) for t in self.tasks.values() if self._match(t, finished)]
+
+    def changes_since(self, since: int, finished: int) -> List[Dict[str, Any]]:
+        with self.lock:
+            ids = sorted((s, id_) for id_, s in self._changed.items() if s > since)
+            changes = []
+            for _, id_ in ids:
+                task = self.tasks.get(id_, None)
+                if task is not None and self._match(task, finished):
+                    changes.append({"op": "upsert", "task": dict(task)})
+                else:
+                    changes.append({"op": "remove", "anno_id": id_})
+            return changes
+
+    # endregion
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PUT(self):
+        self.route("PUT")
+
+    def route(self, method: str):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/", 1)
+        endpoint = parts[0]
+        arg = unquote(parts[1]) if len(parts) > 1 else ""
+        self.endpoint = f"{method} /{endpoint}"
+
+        routes = {
+            ("POST", "login"): self.login,
+            ("GET", "health"): lambda: self.send_json({"status": "ok"}),
+            ("POST", "predict"): self.predict,
+            ("GET", "get_image"): lambda: self.get_image(arg),
+            ("GET", "get_thumbnail"): lambda: self.get_thumbnail(arg, query),
+            ("GET", "get_zlabel"): lambda: self.send_item(self.server.zlabels, arg),
+            ("POST", "get_zlabels"): self.get_zlabels,
+            ("GET", "get_tasks"): lambda: self.get_tasks(query),
+            ("GET", "get_task_changes"): lambda: self.get_task_changes(query),
+            ("PUT", "save_zlabel"): self.save_zlabel,
+            ("PUT", "patch_zlabel"): self.patch_zlabel,
+            ("PUT", "save_zlabels"): self.save_zlabels,
+            ("PUT", "api"): lambda: self.fs_put(arg),
+        }
+        if endpoint in self.server.unsupported:
+            return self.send(self.server.unsupported[endpoint], b"")
+        handler = routes.get((method, endpoint), None)
+        if handler is None:
+            allowed = any(e == endpoint for _, e in routes)
+            return self.send(405 if allowed else 404, b"")
+        if endpoint not in ("login", "health", "predict") and not self.authorized():
+            return self.send(401, b"unauthorized")
+        try:
+            handler()
+        except Exception as e:
+            self.send(500, f"{e=}".encode("utf-8"))
+
+    # region helpers
+    def authorized(self) -> bool:
+        if self.server.users is None:
+            return True
+        return self.server.tokens.get(self.headers.get("Authorization", ""), 0) > time.time()
+
+    def body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def form(self) -> Dict[str, str]:
+        return {k: v[-1] for k, v in parse_qs(self.body().decode("utf-8")).items()}
+
+    def send(
+        self,
+        status: int,
+        data: bytes,
+        headers: Dict[str, str] | None = None,
+        drop_after: int | None = None,
+    ):
+        """drop_after: announce the whole body but hang up after that many bytes"""
+        self.server.stats[(self.endpoint, status)] += 1
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if drop_after is None:
+            self.wfile.write(data)
+            return
+        self.wfile.write(data[:drop_after])
+        self.wfile.flush()
+        self.close_connection = True
+
+    def send_json(self, obj: Any, status: int = 200):
+        self.send(status, json.dumps(obj).encode("utf-8"), {"Content-Type": "application/json"})
+
+    def send_ndjson(self, lines: List[Dict[str, Any]]):
+        data = "".join(f"{json.dumps(d)}\n" for d in lines).encode("utf-8")
+        self.send(200, data, {"Content-Type": "application/x-ndjson"})
+
+    def send_item(self, items: Dict[str, Item], name: str):
+        item = items.get(name, None)
+        if item is None:
+            return self.send(404, b"not found")
+        validators = {"ETag": item.etag, "Last-Modified": item.last_modified}
+        if item.not_modified(self.headers):
+            return self.send(304, b"", validators)
+        headers = {
+            **validators,
+            "Content-Type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+            "Accept-Ranges": "bytes",
+            "X-Content-SHA256": item.sha256,
+        }
+        status, data = 200, item.data
+        start = self.range_start(item)
+        if start is not None:
+            if start >= len(item.data):
+                return self.send(416, b"", {"Content-Range": f"bytes */{len(item.data)}"})
+            status, data = 206, item.data[start:]
+            headers["Content-Range"] = f"bytes {start}-{len(item.data) - 1}/{len(item.data)}"
+        self.send(status, data, headers, drop_after=self.server.drop_after.pop(name, None))
+
+    def range_start(self, item: Item) -> int | None:
+        """Start of an open ended "bytes=N-" range, None if the whole body is to be sent"""
+        r = self.headers.get("Range", None)
+        if r is None or not r.startswith("bytes=") or not r.endswith("-"):
+            return None
+        if_range = self.headers.get("If-Range", None)
+        if if_range is not None and if_range not in (item.etag, item.last_modified):
+            return None
+        try:
+            return int(r[len("bytes=") : -1])
+        except ValueError:
+            return None
+
+    # endregion
+
+    # region endpoints
+    def login(self):
+        form = self.form()
+        users = self.server.users
+        if users is not None and users.get(form.get("username", ""), None) != form.get("password"):
+            return self.send(401, b"wrong username or password")
+        token = uuid.uuid4().hex
+        ttl = self.server.token_ttl
+        self.server.tokens[token] = time.time() + ttl if ttl is not None else float("inf")
+        self.send_json({"token": token} if ttl is None else {"token": token, "expires_in": ttl})
+
+    def predict(self):
+        """A box of 20 pixels around every point, rects are returned as they are"""
+        form = self.form()
+        d = json.loads(form["data"])
+        with self.server.lock:
+            self.server.embedded.add(form.get("image_name", ""))
+        time.sleep(self.server.predict_delay)
+        rects = [{"x": p["x"] - 10, "y": p["y"] - 10, "w": 20, "h": 20} for p in d.get("points") or []]
+        rects += list(d.get("rects") or [])
+        self.send_json({"anno_id": d["id"], "status": True, "rects": rects})
+
+    def get_image(self, name: str):
+        time.sleep(self.server.image_delay)
+        self.send_item(self.server.images, name)
+
+    def get_thumbnail(self, name: str, query: Dict[str, str]):
+        item = self.server.images.get(name, None)
+        if item is None:
+            return self.send(404, b"not found")
+        size = max(1, int(query.get("size", 512)))
+        image = Image.open(BytesIO(item.data))
+        width, height = image.size
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+        bio = BytesIO()
+        image.convert("RGB").save(bio, format="JPEG", quality=80)
+        headers = {
+            "Content-Type": "image/jpeg",
+            "X-Image-Width": str(width),
+            "X-Image-Height": str(height),
+        }
+        self.send(200, bio.getvalue(), headers)
+
+    def get_zlabels(self):
+        d = json.loads(self.body())
+        etags: Dict[str, str] = d.get("etags", {})
+        zlabels: Dict[str, str | None] = {}
+        sent: Dict[str, str] = {}
+        not_modified: List[str] = []
+        for name in d["names"]:
+            item = self.server.zlabels.get(name, None)
+            if item is None:
+                zlabels[name] = None
+            elif etags.get(name, None) == item.etag:
+                not_modified.append(name)
+            else:
+                zlabels[name] = item.data.decode("utf-8")
+                sent[name] = item.etag
+        self.send_json({"zlabels": zlabels, "not_modified": not_modified, "etags": sent})
+
+    def get_tasks(self, query: Dict[str, str]):
+        finished = int(query.get("finished", 1))
+        num = int(query.get("num", 50))
+        tasks = self.server.list_tasks(finished)[:num]
+        if not (query.get("stream") and self.server.stream_tasks):
+            return self.send_json(tasks)
+        page_size = max(1, int(query.get("page_size", 1000)))
+        # cursor: offset and the sequence number the listing started at
+        offset, seq = 0, self.server.seq
+        if "cursor" in query:
+            offset, seq = (int(v) for v in query["cursor"].split(":"))
+        end = offset + page_size
+        next_cursor = f"{end}:{seq}" if end < len(tasks) else None
+        self.send_ndjson(tasks[offset:end] + [{"next_cursor": next_cursor, "sync_cursor": str(seq)}])
+
+    def get_task_changes(self, query: Dict[str, str]):
+        try:
+            since = int(query["since"])
+        except (KeyError, ValueError):
+            return self.send(410, b"unknown cursor")
+        if since > self.server.seq:
+            return self.send(410, b"unknown cursor")
+        finished = int(query.get("finished", 1))
+        page_size = max(1, int(query.get("page_size", 1000)))
+        offset, seq = 0, self.server.seq
+        if "cursor" in query:
+            offset, seq = (int(v) for v in query["cursor"].split(":"))
+        changes = self.server.changes_since(since, finished)
+        end = offset + page_size
+        next_cursor = f"{end}:{seq}" if end < len(changes) else None
+        self.send_ndjson(
+            changes[offset:end] + [{"next_cursor": next_cursor, "sync_cursor": str(seq)}]
+        )
+
+    def save_zlabel(self):
+        form = self.form()
+        rev = self.server.save(form["filename"], form["zlabel"])
+        self.send_json([{"status": rev is not None, "rev": rev}])
+
+    def patch_zlabel(self):
+        d = json.loads(self.body())
+        rev = self.server.save(d["filename"], "", d["base_rev"], d["patch"])
+        if rev is None:
+            return self.send_json({"status": False, "rev": None}, 409)
+        self.send_json({"status": True, "rev": rev})
+
+    def save_zlabels(self):
+        d = json.loads(self.body())
+        results = []
+        for it in d["items"]:
+            if "patch" in it:
+                rev = self.server.save(it["filename"], "", it["base_rev"], it["patch"])
+            else:
+                rev = self.server.save(it["filename"], it["zlabel"])
+            results.append({"status": rev is not None, "rev": rev})
+        self.send_json({"results": results})
+
+    def fs_put(self, arg: str):
+        """alist's /api/fs/put"""
+        if arg != "fs/put":
+            return self.send(404, b"")
+        data = self.body()
+        time.sleep(self.server.put_delay)
+        with self.server.lock:
+            self.server.files[self.headers.get("File-Path", "")] = data
+        self.send_json({"code": 200, "message": "success"})
+
+    # endregion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in ZLabel SAM server")
+    parser.add_argument("--root", type=str, default="", help="directory to load data from")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    server = StandInServer(args.host, args.port)
+    if args.root:
+        server.load_dir(args.root)
+    print(f"Serving {len(server.tasks)} tasks on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Size, encode and decode time of a ``.zlabel`` file in each annotation format.
+
+    python test/bench_anno_format.py [results_per_anno]
+
+json is the indented text ``Annotation.save_json`` writes, json compact is
+``model_dump_json`` without indent, binary is ``anno_codec.encode_binary``. Every format
+is checked to round trip losslessly.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_project_load import build
+
+from zlabel.utils.anno_codec import decode_binary, encode_binary
+from zlabel.utils.project import LABEL_REFS, Annotation
+
+
+def timeit(f, *args, repeat: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    per_anno = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    proj = build(per_anno, per_anno=per_anno)
+    anno = next(t.anno for t in proj.tasks.values() if t.anno is not None)
+    expected = anno.model_dump()
+    formats = {
+        "json": (
+            lambda a: a.model_dump_json(indent=4, context=LABEL_REFS).encode("utf-8"),
+            Annotation.model_validate_json,
+        ),
+        "json compact": (
+            lambda a: a.model_dump_json(context=LABEL_REFS).encode("utf-8"),
+            Annotation.model_validate_json,
+        ),
+        "binary": (encode_binary, decode_binary),
+    }
+    print(f"{per_anno} polygons of 4 points per annotation")
+    base_size = base_enc = base_dec = 0.0
+    for name, (encode, decode) in formats.items():
+        data = encode(anno)
+        assert decode(data).model_dump() == expected, f"{name} does not round trip"
+        size, enc, dec = len(data), timeit(encode, anno), timeit(decode, data)
+        if not base_size:
+            base_size, base_enc, base_dec = size, enc, dec
+        print(
+            f"{name:13} {size / 1024:8.1f} KB ({base_size / size:4.1f}x)"
+            f"  encode {enc * 1000:6.2f} ms ({base_enc / enc:4.1f}x)"
+            f"  decode {dec * 1000:6.2f} ms ({base_dec / dec:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
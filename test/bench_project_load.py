@@ -0,0 +1,118 @@
+"""Time loading a large project snapshot.
+
+    python test/bench_project_load.py [num_results]
+
+Compares model_dump with json.dumps and json.loads with model_validate, the way snapshots
+used to be written and read, with ``ProjectJournal.write_snapshot`` and ``read_snapshot``,
+which let pydantic-core serialize, or parse and validate, the bytes in one pass. Building
+the models with model_construct is timed as well: it skips validation but creates every
+object in python, so it is slower than pydantic-core validating them.
+"""
+
+import json
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from zlabel.utils.project import (
+    LABEL_REFS,
+    Annotation,
+    Label,
+    Project,
+    Result,
+    ResultType,
+    Task,
+    User,
+)
+from zlabel.utils.project_journal import ProjectJournal
+
+
+def build(num_results: int, per_anno: int = 100) -> Project:
+    proj = Project.new(name="bench")
+    user = User.new("bench")
+    labels = [Label.new(f"label{i}") for i in range(4)]
+    for i in range(num_results // per_anno):
+        proj.add_task(Task(id=i, anno_id=f"a{i}", filename=f"{i}.jpg", labels=["label0"]))
+        table = OrderedDict((label.id, label.model_copy()) for label in labels)
+        anno = Annotation.new(f"{i}.jpg", 1024, 768, user, f"a{i}", table)
+        for j in range(per_anno):
+            r = Result.new(
+                ResultType.POLYGON,
+                [labels[j % 4]],
+                x=j,
+                y=j,
+                w=10,
+                h=10,
+                points=[(j, j), (j + 10, j), (j + 10, j + 10), (j, j + 10)],
+            )
+            anno.add_result(r)
+        proj.add_annotation(anno)
+    return proj
+
+
+def dump_json(path: Path, proj: Project):
+    d = proj.model_dump(mode="json", context=LABEL_REFS)
+    d["annos"] = {
+        k: t.anno.model_dump(mode="json", context=LABEL_REFS) for k, t in proj.tasks.items() if t.anno
+    }
+    path.write_text(json.dumps(d), encoding="utf-8")
+
+
+def load_validate(path: Path):
+    d = json.loads(path.read_text(encoding="utf-8"))
+    annos = d.pop("annos", {})
+    proj = Project.model_validate(d)
+    for anno_id, anno in annos.items():
+        proj.tasks[anno_id].anno = Annotation.model_validate(anno)
+
+
+def load_construct(path: Path):
+    d = json.loads(path.read_text(encoding="utf-8"))
+    annos = d.pop("annos", {})
+    proj = Project.model_validate(d)
+    for anno_id, a in annos.items():
+        labels = OrderedDict((k, Label.model_construct(**v)) for k, v in a["labels"].items())
+        results = OrderedDict()
+        for k, r in a["results"].items():
+            r["type_id"] = ResultType(r["type_id"])
+            r["labels"] = [labels[label] for label in r["labels"]]
+            r["points"] = [tuple(p) for p in r["points"]]
+            results[k] = Result.model_construct(**r)
+        a["results"] = results
+        a["labels"] = labels
+        proj.tasks[anno_id].anno = Annotation.model_construct(**a)
+
+
+def timeit(f, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    num_results = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    proj = build(num_results)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.zproj"
+        base = timeit(dump_json, path, proj)
+        print(f"{num_results} results, {path.stat().st_size / 1024 / 1024:.1f} MB")
+        print(f"model_dump + json.dumps:        {base:.3f}s")
+        t = timeit(ProjectJournal.write_snapshot, path, proj)
+        print(f"write_snapshot:                 {t:.3f}s ({base / t:.2f}x)")
+        base = timeit(load_validate, path)
+        print(f"json.loads + model_validate:    {base:.3f}s")
+        t = timeit(load_construct, path)
+        print(f"json.loads + model_construct:   {t:.3f}s ({base / t:.2f}x)")
+        t = timeit(ProjectJournal.read_snapshot, path)
+        print(f"read_snapshot:                  {t:.3f}s ({base / t:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
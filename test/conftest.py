@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the stand-in server the tests run against, zlabel_sam
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,49 @@
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from zlabel.utils.anno_cache import AnnotationCache
+from zlabel.utils.project import Annotation, Label
+
+
+def new_anno(anno_id: str) -> Annotation:
+    label = Label.new("cat")
+    return Annotation.new(f"{anno_id}.jpg", 10, 10, None, anno_id, OrderedDict({label.id: label}))
+
+
+class TestAnnotationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = AnnotationCache(self.tmp.name, maxsize=2)
+
+    def test_take_consumes(self):
+        anno = new_anno("a")
+        self.cache.put("a", anno.model_dump_json(), anno)
+        self.assertTrue(self.cache.contains("a"))
+        self.assertIs(self.cache.take("a"), anno)
+        self.assertFalse(self.cache.contains("a"))
+        self.assertIsNone(self.cache.take("a"))
+
+    def test_parsed_from_disk(self):
+        annos = [new_anno(k) for k in "abc"]
+        for anno in annos:
+            self.cache.put(anno.id, anno.model_dump_json(), anno)
+        # evicted from memory, still on disk, also for the next run
+        self.assertFalse(self.cache.memory.find("a"))
+        cache = AnnotationCache(self.tmp.name)
+        self.assertTrue(cache.contains("a"))
+        taken = cache.take("a")
+        self.assertIsNot(taken, annos[0])
+        self.assertEqual(taken.model_dump(), annos[0].model_dump())  # type: ignore
+        self.assertIs(self.cache.take("c"), annos[2])
+
+    def test_invalid_text(self):
+        self.cache.put("a", "{not json")
+        self.assertTrue(self.cache.contains("a"))
+        self.assertIsNone(self.cache.take("a"))
+        self.assertFalse(self.cache.contains("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
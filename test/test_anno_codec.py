@@ -0,0 +1,62 @@
+import json
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from zlabel.utils.anno_codec import encode_binary, read_anno, read_anno_json, save_anno
+from zlabel.utils.anno_shards import AnnotationShards
+from zlabel.utils.project import Annotation, Label, Result, ResultType, User
+
+
+class TestAnnoCodec(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cat, dog = Label.new("cat"), Label.new("dog")
+        table = OrderedDict((label.id, label) for label in (cat, dog))
+        self.anno = Annotation.new("1.jpg", 640, 480, User.new("u"), "a1", table)
+        results = [
+            Result.new(ResultType.RECTANGLE, [cat], x=0.1, y=1 / 3, w=5, h=5, rotation=12.5),
+            Result.new(ResultType.POLYGON, [dog, cat], points=[(0.5, 1e-9), (3, 4), (1, 7)]),
+            Result.new(ResultType.POINT, [Label.new("inline")], x=2, origin="sam", score=0.97),
+            Result.new(ResultType.RECTANGLE, [], x=-1),
+            # an older copy of a table label stays inline
+            Result.new(ResultType.POINT, [Label.new("cat", "#ff0000", cat.id)]),
+        ]
+        results[0].note = "géant"
+        for r in results:
+            self.anno.add_result(r)
+
+    def test_round_trip(self):
+        for anno_format in ("json", "binary"):
+            path = Path(self.tmp.name) / f"{anno_format}.zlabel"
+            save_anno(self.anno, path, anno_format)
+            anno = read_anno(path)
+            self.assertEqual(anno.model_dump_json(), self.anno.model_dump_json())
+            # labels of the table are shared again
+            r = anno.results[anno.results.first_key()]  # type: ignore[attr-defined]
+            self.assertIs(r.labels[0], anno.labels[r.labels[0].id])
+            text = read_anno_json(path)
+            self.assertEqual(Annotation.model_validate_json(text).model_dump(), anno.model_dump())
+            # what is uploaded has every label inline, a result validates on its own
+            for k, d in json.loads(text)["results"].items():
+                self.assertEqual(Result.model_validate(d), self.anno.results[k])
+        empty = Annotation.new("2.jpg", 1, 1, None, "a2", OrderedDict())
+        path = Path(self.tmp.name) / "empty.zlabel"
+        save_anno(empty, path, "binary")
+        self.assertEqual(read_anno(path).model_dump(), empty.model_dump())
+        self.assertLess(len(encode_binary(self.anno)), len(self.anno.model_dump_json()))
+
+    def test_shards_read_either_format(self):
+        shards = AnnotationShards(f"{self.tmp.name}/shards")
+        shards.save(self.anno)
+        shards.anno_format = "binary"
+        self.assertEqual(shards.load("a1").model_dump(), self.anno.model_dump())
+        shards.save(self.anno)
+        self.assertTrue(shards.path("a1").read_bytes().startswith(b"ZLB"))
+        self.assertEqual(shards.load("a1").model_dump(), self.anno.model_dump())
+
+
+if __name__ == "__main__":
+    unittest.main()
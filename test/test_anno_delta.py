@@ -0,0 +1,87 @@
+import json
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from zlabel.utils import Annotation, Label, Result, ResultType, User
+from zlabel.utils.anno_delta import DeltaUploader, apply_patch, diff_annotation, is_empty_patch
+
+
+def make_anno(n: int) -> Annotation:
+    label = Label.new("seed")
+    anno = Annotation.new("1.png", 100, 100, User.default(), "anno", OrderedDict({label.id: label}))
+    for i in range(n):
+        anno.add_result(Result.new(ResultType.RECTANGLE, [label], i, i, 10, 10, id_=f"r{i}"))
+    return anno
+
+
+class FakeServer(object):
+    def __init__(self):
+        self.rev = 0
+        self.anno: Annotation | None = None
+        self.sent = 0
+
+    def save_zlabel_rev(self, filename, data):
+        self.sent += len(data)
+        self.rev += 1
+        self.anno = Annotation.model_validate_json(data)
+        return True, self.rev
+
+    def patch_zlabel(self, filename, base_rev, patch):
+        self.sent += len(json.dumps(patch))
+        if base_rev != self.rev:
+            return False, None
+        self.rev += 1
+        self.anno = apply_patch(self.anno, patch)  # type: ignore
+        return True, self.rev
+
+
+class TestAnnoDelta(unittest.TestCase):
+    def test_round_trip(self):
+        base = make_anno(5)
+        new = base.model_copy(deep=True)
+        new.remove_result("r1")
+        new.results["r2"].x = 42
+        new.add_result(Result.new(ResultType.RECTANGLE, [], 1, 2, 3, 4, id_="r9"))
+        patch = diff_annotation(base, new)
+        self.assertEqual(patch["removed"], ["r1"])
+        self.assertEqual([d["id"] for d in patch["modified"]], ["r2"])
+        self.assertEqual([d["id"] for d in patch["added"]], ["r9"])
+        self.assertEqual(apply_patch(base, patch).model_dump(), new.model_dump())
+        self.assertTrue(is_empty_patch(diff_annotation(new, new)))
+
+    def test_reorder(self):
+        base = make_anno(3)
+        new = base.model_copy(deep=True)
+        r = new.results.pop("r0")
+        new.add_result(r)
+        patched = apply_patch(base, diff_annotation(base, new))
+        self.assertEqual(list(patched.results), ["r1", "r2", "r0"])
+
+    def test_uploader(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = FakeServer()
+            uploader = DeltaUploader(server, f"{tmp}/acked")
+            path = Path(tmp) / "anno.zlabel"
+            anno = make_anno(300)
+            path.write_text(anno.model_dump_json(indent=4))
+            self.assertTrue(uploader.upload(str(path)))
+            full = server.sent
+
+            anno.results["r7"].w = 1
+            path.write_text(anno.model_dump_json(indent=4))
+            self.assertTrue(uploader.upload(str(path)))
+            self.assertLess(server.sent - full, full * 0.1)
+            self.assertEqual(server.anno.model_dump(), anno.model_dump())  # type: ignore
+
+            # server moved on, patch refused, falls back to a full upload
+            server.rev += 1
+            anno.remove_result("r8")
+            path.write_text(anno.model_dump_json(indent=4))
+            self.assertTrue(uploader.upload(str(path)))
+            self.assertEqual(server.anno.model_dump(), anno.model_dump())  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from qtpy.QtCore import Qt
+from qtpy.QtWidgets import QApplication
+
+from zlabel.utils.anno_cache import AnnotationCache
+from zlabel.utils.anno_shards import AnnotationShards
+from zlabel.utils.api_helper import SamApiHelper
+from zlabel.utils.offline_pack import OfflinePack
+from zlabel.utils.project import Annotation, Label, Project, Task
+from zlabel.utils.project_journal import ProjectJournal
+from zlabel.widgets.mainwindow import MainWindow
+from zlabel.widgets.zworker import ZGetAnnosWorker
+from zlabel_sam.server import StandInServer
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+app = QApplication.instance() or QApplication([])
+
+
+def new_anno(source: str) -> Annotation:
+    """An annotation of a1 that tells where it came from by its image path"""
+    label = Label.new("cat")
+    return Annotation.new(source, 1, 1, None, "a1", OrderedDict({label.id: label}))
+
+
+class TestAnnoHydration(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = StandInServer(users={"u": "p"})
+        self.server.put_image("1.jpg", b"image")
+        self.server.put_zlabel("a1.zlabel", new_anno("pack").model_dump_json())
+        self.server.put_zlabel("a2.zlabel", "{not json")
+        self.api = SamApiHelper("u", "p", self.server.start())
+        self.addCleanup(self.server.stop)
+        self.api.login()
+        self.cache = AnnotationCache(f"{self.tmp.name}/annos")
+
+    def new_window(self) -> MainWindow:
+        # the window reads and writes zlabel.conf in the working directory
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        window = MainWindow()
+        self.addCleanup(window.close)
+        window.api_predict = self.api
+        window.anno_cache = self.cache
+        window.journal = ProjectJournal(
+            f"{self.tmp.name}/project.json", shards=AnnotationShards(f"{self.tmp.name}/shards")
+        )
+        window.proj = Project.new(name="p")
+        window.proj.add_task(Task(id=1, anno_id="a1", filename="1.jpg", labels=[]))
+        # only where the annotation comes from is tested, not how it is drawn
+        window.show_crt_anno = lambda: None  # type: ignore[method-assign]
+        return window
+
+    def test_worker_fills_cache(self):
+        worker = ZGetAnnosWorker(self.api, ["a1", "a2", "a3"], self.cache)
+        results = []
+        worker.emitter.success.connect(
+            lambda found, missing: results.append((found, missing)),
+            Qt.ConnectionType.DirectConnection,
+        )
+        worker.run()
+        # invalid json counts as missing, a new annotation is started for it
+        self.assertEqual(results, [(["a1"], ["a2", "a3"])])
+        self.assertTrue(self.cache.contains("a1"))
+        self.assertFalse(self.cache.contains("a2"))
+        self.assertEqual(self.cache.take("a1").image_path, "pack")  # type: ignore
+
+    def test_order(self):
+        window = self.new_window()
+        shards = window.journal.shards  # type: ignore
+        pack, _ = OfflinePack.build(
+            Path(self.tmp.name) / "offline.zpack", self.api, list(window.proj.tasks.values())
+        )
+        self.addCleanup(pack.close)
+        window.offline_pack = pack
+        shards.save(new_anno("shard"))
+        self.cache.put("a1", new_anno("cache").model_dump_json(), new_anno("cache"))
+        self.server.put_zlabel("a1.zlabel", new_anno("server").model_dump_json())
+
+        def hydrated() -> str:
+            window.hydrate_crt_anno()
+            source = window.proj.crt_anno.image_path  # type: ignore
+            # hydrating keeps it in the shard, start over from the next source
+            window.proj.crt_task.anno = None  # type: ignore
+            shards.remove("a1")
+            return source
+
+        self.assertEqual(hydrated(), "shard")
+        self.assertEqual(hydrated(), "cache")
+        self.assertEqual(hydrated(), "pack")
+
+        # nothing local, the server is asked without blocking the UI
+        window.offline_pack = None
+        requests = self.server.stats[("POST /get_zlabels", 200)]
+        window.on_dock_files_item_clicked("a1")
+        self.assertIsNone(window.proj.crt_anno)
+        window.threadpool.waitForDone()
+        app.processEvents()
+        self.assertEqual(window.proj.crt_anno.image_path, "server")  # type: ignore
+        self.assertEqual(self.server.stats[("POST /get_zlabels", 200)], requests + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
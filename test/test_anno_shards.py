@@ -0,0 +1,113 @@
+import json
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from zlabel.utils.anno_shards import AnnotationShards
+from zlabel.utils.project import Annotation, Label, Project, Result, ResultType, Task
+from zlabel.utils.project_journal import ProjectJournal
+from zlabel.utils.save_service import SaveService
+
+
+class TestAnnotationShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = f"{self.tmp.name}/project.json"
+        self.shard_dir = f"{self.tmp.name}/shards"
+        self.proj = Project.new(name="p")
+        for i in range(10):
+            self.proj.add_task(Task(id=i, anno_id=f"a{i}", filename=f"{i}.jpg", labels=["x"]))
+
+    def anno(self, i: int, n: int = 1):
+        anno = Annotation.new(f"{i}.jpg", 10, 10, None, f"a{i}", OrderedDict())
+        for x in range(n):
+            anno.add_result(Result.new(ResultType.RECTANGLE, [Label.new("x")], x=x, w=5, h=5))
+        return anno
+
+    def test_migrate_and_lazy_load(self):
+        # a project saved before shards, annotations in the snapshot and the journal
+        journal = ProjectJournal(self.path)
+        self.proj.add_annotation(self.anno(1))
+        journal.rewrite(self.proj)
+        anno = self.anno(2)
+        journal.put_anno(anno)
+        r = Result.new(ResultType.RECTANGLE, [Label.new("x")], x=7, w=5, h=5)
+        anno.add_result(r)
+        journal.put_result(anno, r)
+        journal.close()
+
+        journal = ProjectJournal(self.path, shards=AnnotationShards(self.shard_dir))
+        proj = journal.load()
+        journal.close()
+        # only the task index is loaded, the snapshot no longer holds annotations
+        self.assertTrue(all(task.anno is None for task in proj.tasks.values()))
+        self.assertNotIn("annos", json.loads(Path(self.path).read_text()))
+        self.assertFalse(journal.journal_path.exists())
+        a1 = self.proj.tasks["a1"].anno
+        self.assertEqual(journal.load_anno("a1").model_dump(), a1.model_dump())
+        self.assertEqual(journal.load_anno("a2").model_dump(), anno.model_dump())
+        self.assertFalse(journal.has_anno("a3"))
+
+        # a result edit is journaled, the shard is left as it is until the journal is folded
+        anno = journal.load_anno("a2")
+        anno.remove_result(r.id)
+        journal.remove_result(anno, r.id)
+        journal.close()
+        self.assertTrue(journal.journal_path.exists())
+        self.assertIn(r.id, journal.load_anno("a2").results)
+        journal = ProjectJournal(self.path, shards=AnnotationShards(self.shard_dir))
+        journal.load()
+        journal.close()
+        self.assertFalse(journal.journal_path.exists())
+        self.assertNotIn(r.id, journal.load_anno("a2").results)
+
+    def test_compaction_writes_shards(self):
+        saver = SaveService(delay=60)
+        self.addCleanup(saver.close)
+        shards = AnnotationShards(self.shard_dir, saver=saver)
+        journal = ProjectJournal(self.path, compact_bytes=1024, shards=shards)
+        journal.rewrite(self.proj)
+        anno = self.anno(1)
+        journal.put_anno(anno)
+        saver.flush()
+        for x in range(20):
+            r = Result.new(ResultType.RECTANGLE, [Label.new("x")], x=x, w=5, h=5)
+            anno.add_result(r)
+            journal.put_result(anno, r)
+            anno.remove_result(r.id)
+            journal.remove_result(anno, r.id)
+        anno.add_result(r)
+        journal.put_result(anno, r)
+        # records appended while a compaction ran are folded by the next one
+        journal.wait()
+        journal.compact()
+        journal.close()
+        # the rotations wrote the shard, on disk before the records folded into it are dropped
+        self.assertFalse(journal.rotated_path.exists())
+        self.assertFalse(journal.journal_path.exists())
+        self.assertFalse(saver.pending(shards.path("a1")))
+        self.assertLess(saver.writes, 20)
+        on_disk = AnnotationShards(self.shard_dir).load("a1")
+        self.assertEqual(on_disk.model_dump(), anno.model_dump())
+
+    def test_over_budget(self):
+        shards = AnnotationShards(self.shard_dir)
+        for i in range(5):
+            shards.save(self.anno(i, n=3))
+        size = shards.nbytes // 5
+        shards.budget_bytes = size * 3
+        shards.load("a0")
+        # least recently used first, the kept one stays
+        self.assertEqual(shards.over_budget(keep=["a1"]), ["a2", "a3"])
+        shards.forget("a2")
+        shards.forget("a3")
+        self.assertEqual(shards.over_budget(), [])
+        self.assertTrue(shards.contains("a2"))
+        shards.remove("a2")
+        self.assertFalse(shards.contains("a2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import tempfile
+import threading
+import time
+import unittest
+
+from zlabel.utils.api_helper import SamApiHelper
+from zlabel.utils.auth import AuthManager
+from zlabel_sam.server import StandInServer
+
+
+class TestAuthManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = StandInServer(users={"u": "p"})
+        self.server.put_zlabel("a.zlabel", '{"id": "a"}')
+        self.url = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.token_path = f"{self.tmp.name}/token.json"
+
+    def new_api(self):
+        api = SamApiHelper("u", "p", self.url)
+        auth = AuthManager(api.request_token, self.token_path, key=self.url)
+        api.set_auth(auth)
+        self.addCleanup(auth.stop)
+        return api, auth
+
+    def logins(self):
+        return self.server.stats[("POST /login", 200)]
+
+    def test_single_flight_and_persisted(self):
+        api, _ = self.new_api()
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(api.login())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.logins(), 1)
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertEqual(api.get_zlabel("a.zlabel"), '{"id": "a"}')
+
+        # the next run reuses it without logging in
+        api2, _ = self.new_api()
+        self.assertEqual(api2.user_token, tokens[0])
+        self.assertEqual(api2.login(), tokens[0])
+        self.assertEqual(self.logins(), 1)
+
+    def test_refresh_before_expiry(self):
+        self.server.token_ttl = 0.5
+        api, auth = self.new_api()
+        first = api.login()
+        auth.start()
+        # renewed at 80% of its lifetime, requests never saw it expire
+        for _ in range(250):
+            if api.user_token not in ("", first):
+                break
+            time.sleep(0.02)
+        self.assertGreaterEqual(self.logins(), 2)
+        self.assertNotEqual(api.user_token, first)
+        self.assertEqual(api.get_zlabel("a.zlabel"), '{"id": "a"}')
+
+    def test_refused_token_is_renewed(self):
+        api, auth = self.new_api()
+        first = api.login()
+        auth.start()
+        self.server.tokens.clear()
+        # the refused request is sent again with the renewed token
+        self.assertEqual(api.get_zlabel("a.zlabel"), '{"id": "a"}')
+        self.assertNotEqual(auth.token, first)
+        self.assertEqual(self.logins(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
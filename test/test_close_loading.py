@@ -0,0 +1,58 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from qtpy.QtCore import QRunnable
+from qtpy.QtWidgets import QApplication
+
+from zlabel.utils.project_journal import ProjectJournal
+from zlabel.widgets.mainwindow import MainWindow
+from zlabel.widgets.zworker import ZLoadProjectWorker
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+app = QApplication.instance() or QApplication([])
+
+
+class Blocker(QRunnable):
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+
+    def run(self) -> None:
+        self.release.wait(10)
+
+
+class TestCloseWhileLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # the window reads and writes zlabel.conf in the working directory
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.window = MainWindow()
+        self.window.journal = ProjectJournal(f"{self.tmp.name}/project.json")
+
+    def test_queued_load(self):
+        pool = self.window.threadpool
+        pool.setMaxThreadCount(1)
+        blocker = Blocker()
+        pool.start(blocker)
+        self.addCleanup(pool.waitForDone)
+        self.addCleanup(blocker.release.set)
+        worker = ZLoadProjectWorker(self.window.journal)  # type: ignore[arg-type]
+        self.window._load_worker = worker
+        pool.start(worker)
+
+        # the load waits behind the blocker, closing takes it off the queue
+        t0 = time.perf_counter()
+        self.window.close()
+        self.assertLess(time.perf_counter() - t0, 5)
+        self.assertIsNone(self.window._load_worker)
+        self.assertFalse(worker.done.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
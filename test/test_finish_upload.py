@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from qtpy.QtWidgets import QApplication
+
+from zlabel.utils.project import Annotation, Label, Project, Task
+from zlabel.utils.save_service import SaveService
+from zlabel.utils.upload_queue import UploadQueue
+from zlabel.widgets.mainwindow import MainWindow
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+app = QApplication.instance() or QApplication([])
+
+
+class TestFinishUpload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # the window reads and writes zlabel.conf in the working directory
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.window = MainWindow()
+        self.addCleanup(self.window.close)
+        # a write that waits longer than the test, only a flush puts the file on disk
+        self.window.saver = SaveService(delay=60)
+        self.addCleanup(self.window.saver.close)
+        self.window.upload_queue = UploadQueue(f"{self.tmp.name}/upload_queue.json")
+        self.window.journal = None
+        label = Label.new("cat")
+        anno = Annotation.new("1.jpg", 1, 1, None, "a1", OrderedDict({label.id: label}))
+        self.window.proj = Project.new(name="p")
+        self.window.proj.add_task(Task(id=1, anno_id="a1", filename="1.jpg", labels=[]))
+        self.window.proj.add_annotation(anno)
+
+    def test_file_written_before_queued(self):
+        self.window.actionFinish.trigger()
+        self.assertIn("a1", self.window.upload_queue)
+        filename = self.window.upload_queue.due()[0].filename
+        # on disk already, an upload after a crash finds it
+        self.assertTrue(Path(filename).exists())
+        self.assertFalse(self.window.saver.pending(filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
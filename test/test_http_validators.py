@@ -0,0 +1,98 @@
+import tempfile
+import threading
+import unittest
+
+from zlabel.utils.api_helper import SamApiHelper
+from zlabel.utils.disk_cache import DiskCache
+from zlabel_sam.server import StandInServer
+
+
+class TestHttpValidators(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = StandInServer(users={"u": "p"})
+        self.server.put_image("a.png", b"image-a")
+        self.server.put_zlabel("a.zlabel", '{"id": "a"}')
+        self.server.put_zlabel("b.zlabel", '{"id": "b"}')
+        self.addCleanup(self.server.stop)
+
+        self.api = SamApiHelper("u", "p", self.server.start())
+        self.api.login()
+        self.api.image_store = DiskCache(f"{self.tmp.name}/images")
+        self.api.anno_store = DiskCache(f"{self.tmp.name}/zlabels")
+
+    def test_repeat_fetch_is_not_modified(self):
+        self.assertEqual(self.api.get_image_bytes("a.png"), b"image-a")
+        self.assertEqual(self.api.get_image_bytes("a.png"), b"image-a")
+        self.assertEqual(self.server.stats[("GET /get_image", 200)], 1)
+        self.assertEqual(self.server.stats[("GET /get_image", 304)], 1)
+
+        self.server.put_image("a.png", b"image-a2")
+        self.assertEqual(self.api.get_image_bytes("a.png"), b"image-a2")
+        self.assertEqual(self.server.stats[("GET /get_image", 200)], 2)
+
+    def test_corrupt_copy_is_fetched_again(self):
+        self.assertEqual(self.api.get_zlabel("a.zlabel"), '{"id": "a"}')
+        self.api.anno_store.path("a.zlabel").write_bytes(b"garbage")  # type: ignore
+        self.assertEqual(self.api.get_zlabel("a.zlabel"), '{"id": "a"}')
+        self.assertEqual(self.server.stats[("GET /get_zlabel", 200)], 2)
+        self.assertEqual(self.server.stats[("GET /get_zlabel", 304)], 0)
+
+    def test_batch_sends_only_changed(self):
+        names = ["a.zlabel", "b.zlabel", "c.zlabel"]
+        first = self.api.get_zlabels(names)
+        self.server.put_zlabel("b.zlabel", '{"id": "b", "rev": 2}')
+        second = self.api.get_zlabels(names)
+        self.assertEqual(first, {"a.zlabel": '{"id": "a"}', "b.zlabel": '{"id": "b"}', "c.zlabel": None})
+        self.assertEqual(second, {**first, "b.zlabel": '{"id": "b", "rev": 2}'})
+
+    def test_batch_falls_back_to_single(self):
+        names = ["a.zlabel", "c.zlabel"]
+        for status in (404, 405):
+            self.server.unsupported["get_zlabels"] = status
+            zlabels = self.api.get_zlabels(names)
+            self.assertEqual(zlabels, {"a.zlabel": '{"id": "a"}', "c.zlabel": None})
+        self.assertEqual(self.server.stats[("POST /get_zlabels", 404)], 1)
+        self.assertEqual(self.server.stats[("POST /get_zlabels", 405)], 1)
+        self.assertEqual(self.server.stats[("GET /get_zlabel", 404)], 2)
+
+    def test_download_resumes(self):
+        data = bytes(range(256)) * 4096
+        self.server.put_image("big.bin", data)
+        self.api.chunk_size = 64 * 1024
+
+        # the first try is cut off and not retried, the partial file stays
+        self.api.download_retries = 0
+        self.server.drop_after["big.bin"] = 300_000
+        self.assertIsNone(self.api.download_image("big.bin"))
+
+        # the next one picks up where it stopped, even after another drop
+        self.api.download_retries = 2
+        self.server.drop_after["big.bin"] = 200_000
+        path = self.api.download_image("big.bin")
+        self.assertEqual(path.read_bytes(), data)  # type: ignore
+        self.assertEqual(self.server.stats[("GET /get_image", 200)], 1)
+        self.assertEqual(self.server.stats[("GET /get_image", 206)], 2)
+        self.assertEqual(self.api.download_image("big.bin"), path)
+        self.assertEqual(self.server.stats[("GET /get_image", 304)], 1)
+
+    def test_concurrent_downloads_share_one(self):
+        self.server.image_delay = 0.2
+        paths = []
+        threads = [
+            threading.Thread(target=lambda: paths.append(self.api.download_image("a.png")))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(paths[0].read_bytes(), b"image-a")  # type: ignore
+        self.assertEqual(self.server.stats[("GET /get_image", 200)], 1)
+        self.assertEqual(self.server.stats[("GET /get_image", 304)], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
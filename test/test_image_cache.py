@@ -0,0 +1,78 @@
+import tempfile
+import unittest
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from zlabel.utils.image_cache import ImageCache
+
+
+def encode_png(value: int, size=(32, 32)) -> bytes:
+    bio = BytesIO()
+    Image.new("RGB", size, (value, value, value)).save(bio, format="png")
+    return bio.getvalue()
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_memory_then_disk_then_miss(self):
+        cache = ImageCache(self.tmp.name)
+        cache.put("a.png", encode_png(10))
+        self.assertIsNotNone(cache.get("a.png"))
+        cache.memory.pop("a.png")
+        image = cache.get("a.png")
+        self.assertIsNotNone(image)
+        self.assertEqual(image[0, 0, 0], 10)  # type: ignore
+        self.assertIsNone(cache.get("b.png"))
+        self.assertEqual(
+            (cache.stats.memory_hits, cache.stats.disk_hits, cache.stats.misses), (1, 1, 1)
+        )
+
+    def test_peek_counts_only_hits(self):
+        cache = ImageCache(self.tmp.name)
+        cache.put("a.png", encode_png(10))
+        self.assertIsNotNone(cache.peek("a.png"))
+        self.assertIsNotNone(cache.peek("a.png", count_hit=True))
+        self.assertIsNone(cache.peek("b.png", count_hit=True))
+        self.assertEqual(
+            (cache.stats.memory_hits, cache.stats.disk_hits, cache.stats.misses), (1, 0, 0)
+        )
+
+    def test_memory_budget(self):
+        one = 32 * 32 * 3
+        cache = ImageCache(self.tmp.name, max_memory_bytes=2 * one)
+        for i in range(3):
+            cache.put(f"{i}.png", encode_png(i))
+        self.assertLessEqual(cache.memory_bytes, 2 * one)
+        self.assertIsNone(cache.peek("0.png"))
+        self.assertIsNotNone(cache.peek("2.png"))
+
+    def test_disk_cap_and_restart(self):
+        data = [encode_png(i) for i in range(3)]
+        cache = ImageCache(self.tmp.name, max_disk_bytes=len(data[0]) + len(data[1]) + 1)
+        for i, d in enumerate(data):
+            cache.put(f"{i}.png", d)
+        self.assertLessEqual(cache.disk_bytes, cache.max_disk_bytes)
+
+        # disk tier survives a restart, memory tier does not
+        cache = ImageCache(self.tmp.name)
+        self.assertIsNone(cache.peek("2.png"))
+        self.assertIsNone(cache.get_bytes("0.png"))
+        self.assertEqual(cache.get_bytes("2.png"), data[2])
+        self.assertTrue(np.array_equal(cache.get("2.png"), ImageCache.decode(data[2])))  # type: ignore
+
+    def test_decode_preview(self):
+        bio = BytesIO()
+        Image.new("RGB", (2000, 1000), (200, 10, 10)).save(bio, format="jpeg")
+        preview, full = ImageCache.decode_preview(bio.getvalue(), 256)  # type: ignore
+        self.assertEqual(full, (1000, 2000))
+        self.assertLessEqual(max(preview.shape[:2]), 256)
+        self.assertIsNone(ImageCache.decode_preview(encode_png(1), 256))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import io
+import json
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from zlabel.utils.json_stream import JsonStream
+from zlabel.utils.project import Annotation, Project, Task
+from zlabel.utils.project_journal import ProjectJournal
+
+
+class TestJsonStream(unittest.TestCase):
+    def test_values_across_chunks(self):
+        doc = {"n": 12345678901234, "s": "a \"q\" é", "x": [1.5e-3, None, True], "o": {}}
+        text = json.dumps({"meta": doc, "items": [{"i": i} for i in range(20)], "e": []}, indent=1)
+        # chunks shorter than most values, numbers and strings get split
+        stream = JsonStream(io.StringIO(text), chunk_size=3)
+        items, meta, e = [], None, None
+        for key in stream.items():
+            if key == "items":
+                for i in stream.elements():
+                    items.append((i, stream.value()))
+            elif key == "meta":
+                meta = stream.value()
+            else:
+                e = list(stream.elements())
+        self.assertEqual(meta, doc)
+        self.assertEqual(items, [(i, {"i": i}) for i in range(20)])
+        self.assertEqual(e, [])
+
+        stream = JsonStream(io.StringIO('{"a": [1, 2'))
+        with self.assertRaises(ValueError):
+            for _ in stream.items():
+                stream.value()
+
+    def test_load_streamed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            proj = Project.new(name="p")
+            for i in range(25):
+                proj.add_task(Task(id=i, anno_id=f"a{i}", filename=f"{i}.jpg", labels=["x"]))
+            proj.tasks["a3"].anno = Annotation.new("3.jpg", 10, 10, None, "a3", OrderedDict())
+            journal = ProjectJournal(f"{tmp}/p.zproj")
+            journal.rewrite(proj)
+            journal.remove_tasks(["a7"])
+            journal.close()
+
+            pages = []
+            loaded = ProjectJournal(f"{tmp}/p.zproj").load(on_tasks=pages.append, page_size=10)
+            # the pages are the snapshot, the journal is replayed after
+            self.assertEqual([len(page) for page in pages], [10, 10, 5])
+            expected = ProjectJournal(f"{tmp}/p.zproj").load()
+            self.assertNotIn("a7", loaded.tasks)
+            self.assertEqual(loaded.model_dump(), expected.model_dump())
+            anno = proj.tasks["a3"].anno
+            self.assertEqual(loaded.tasks["a3"].anno.model_dump(), anno.model_dump())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from zlabel.utils.api_helper import SamApiHelper
+from zlabel.utils.model_router import ModelRouter
+from zlabel_sam.server import StandInServer
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.servers = [StandInServer() for _ in range(3)]
+        self.urls = [server.start() for server in self.servers]
+        for server in self.servers:
+            self.addCleanup(server.stop)
+        self.router = ModelRouter(self.urls)
+        self.api = SamApiHelper("u", "p", self.urls[0])
+        self.api.router = self.router
+
+    def predict(self, image_name: str):
+        return self.api.predict("a", image_name, points=[{"x": 50, "y": 50}], labels=[1])
+
+    def served(self, image_name: str):
+        return [i for i, s in enumerate(self.servers) if image_name in s.embedded]
+
+    def test_pinned_per_image(self):
+        for _ in range(3):
+            for name in ("a.jpg", "b.jpg", "c.jpg"):
+                self.assertTrue(self.predict(name)["status"])
+        for name in ("a.jpg", "b.jpg", "c.jpg"):
+            self.assertEqual(len(self.served(name)), 1)
+
+    def test_failover_and_recovery(self):
+        self.assertTrue(self.predict("a.jpg")["status"])
+        down = self.served("a.jpg")[0]
+        self.servers[down].stop()
+
+        resp = self.predict("a.jpg")
+        self.assertTrue(resp["status"])
+        self.assertFalse(self.router.endpoints[down].healthy)
+        moved = [i for i in self.served("a.jpg") if i != down]
+        self.assertEqual(len(moved), 1)
+        # pinned to the new server from now on
+        self.predict("a.jpg")
+        self.assertEqual(self.servers[moved[0]].stats[("POST /predict", 200)], 2)
+        self.assertEqual(self.router.check_all().count(False), 1)
+
+    def test_prefers_fast_and_idle(self):
+        router = ModelRouter(["http://a", "http://b", "http://c"])
+        a, b, c = router.endpoints
+        router.end(a, 0.5)
+        router.end(b, 0.1)
+        router.end(c, 0.12)
+        self.assertIs(router.choose(), b)
+        router.begin(b)
+        self.assertIs(router.choose(), c)
+        router.end(c, None)
+        self.assertIs(router.choose(), b)
+
+    def test_hedge_slow_request(self):
+        self.api.hedge_percentile = 90
+        for _ in range(20):
+            self.router.end(self.router.endpoints[0], 0.05)
+        self.servers[0].predict_delay = 1.0
+        self.router.pins.put("a.jpg", self.urls[0])
+
+        resp = self.predict("a.jpg")
+        self.assertTrue(resp["status"])
+        self.assertEqual(self.router.hedge_stats.hedged, 1)
+        self.assertEqual(self.router.hedge_stats.wins, 1)
+        self.assertEqual(len(self.served("a.jpg")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from zlabel.utils.api_helper import SamApiHelper
+from zlabel.utils.offline_pack import OfflinePack
+from zlabel.utils.project import Task
+from zlabel_sam.server import StandInServer
+
+
+class TestOfflinePack(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = StandInServer(users={"u": "p"})
+        self.addCleanup(self.server.stop)
+        self.tasks = []
+        for i in range(10):
+            self.server.put_image(f"{i}.jpg", bytes([i]) * (1000 + i))
+            if i % 2 == 0:
+                self.server.put_zlabel(f"a{i}.zlabel", f'{{"id": "a{i}"}}')
+            self.tasks.append(Task(id=i, anno_id=f"a{i}", filename=f"{i}.jpg", labels=[]))
+        # no image on the server
+        self.tasks.append(Task(id=10, anno_id="a10", filename="10.jpg", labels=[]))
+
+        self.api = SamApiHelper("u", "p", self.server.start())
+        self.api.login()
+
+    def test_build_and_read(self):
+        path = Path(self.tmp.name) / "offline.zpack"
+        progress = []
+        pack, failed = OfflinePack.build(
+            path, self.api, self.tasks, threads=4, page_size=4, progress=lambda *a: progress.append(a)
+        )
+        self.addCleanup(pack.close)
+
+        self.assertEqual([t.anno_id for t in failed], ["a10"])
+        self.assertEqual([t.anno_id for t in pack.tasks], [f"a{i}" for i in range(10)])
+        self.assertEqual(progress[-1], (22, 22))
+        self.assertEqual(pack.image("3.jpg"), bytes([3]) * 1003)
+        self.assertIsNone(pack.image("10.jpg"))
+        self.assertEqual(pack.zlabel("a4"), '{"id": "a4"}')
+        self.assertFalse(pack.has_zlabel("a5"))
+        self.assertEqual(sorted(pack.missing), ["a1", "a10", "a3", "a5", "a7", "a9"])
+        self.assertEqual(pack.verify(), [])
+        self.assertFalse(path.with_name("offline.zpack.tmp").exists())
+
+        with OfflinePack(path) as reopened:
+            self.assertEqual(reopened.image("9.jpg"), bytes([9]) * 1009)
+
+    def test_not_a_pack(self):
+        path = Path(self.tmp.name) / "bad.zpack"
+        path.write_bytes(b"0" * 64)
+        with self.assertRaises(ValueError):
+            OfflinePack(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import pickle
+import unittest
+from collections import OrderedDict
+
+from zlabel.utils.ordered_index import OrderedIndex
+from zlabel.utils.project import Annotation, Label, Result, ResultType
+
+
+class TestOrderedIndex(unittest.TestCase):
+    def test_neighbours(self):
+        d = OrderedIndex((k, i) for i, k in enumerate("abcde"))
+        self.assertEqual((d.prev_key("c"), d.next_key("c")), ("b", "d"))
+        self.assertEqual(d.remove_many(["b", "x", "d"]), ["b", "d"])
+        self.assertEqual((d.prev_key("c"), d.next_key("c")), ("a", "e"))
+        d.pop("a")
+        d.move_to_end("c")
+        d["f"] = 5
+        self.assertEqual(list(d), ["e", "c", "f"])
+        self.assertEqual((d.first_key(), d.last_key()), ("e", "f"))
+        self.assertEqual(d.prev_key("c"), "e")
+        self.assertEqual(d.popitem(last=False), ("e", 4))
+        d = pickle.loads(pickle.dumps(d))
+        self.assertEqual((d.prev_key("f"), d.next_key("c")), ("c", "f"))
+
+    def test_remove_results(self):
+        anno = Annotation.new("1.jpg", 10, 10, None, "a1", OrderedDict())
+        results = [Result.new(ResultType.RECTANGLE, [Label.new("x")], x=x) for x in range(6)]
+        for r in results:
+            anno.add_result(r)
+        ids = [r.id for r in results]
+        one_by_one = anno.model_copy(deep=True)
+        for id_ in (ids[4], ids[3], ids[1]):
+            one_by_one.remove_result(id_)
+
+        removed = anno.remove_results([ids[4], ids[3], ids[1], "x"])
+        self.assertEqual(removed, [ids[4], ids[3], ids[1]])
+        self.assertEqual(list(anno.results), [ids[0], ids[2], ids[5]])
+        self.assertEqual(anno.key_result, one_by_one.key_result)
+        self.assertEqual(anno.results.prev_key(ids[5]), ids[2])  # type: ignore[attr-defined]
+        # the index is kept through validation
+        anno = Annotation.model_validate_json(anno.model_dump_json())
+        self.assertEqual(anno.results.next_key(ids[0]), ids[2])  # type: ignore[attr-defined]
+
+
+if __name__ == "__main__":
+    unittest.main()
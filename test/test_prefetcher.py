@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+
+from PIL import Image
+from qtpy.QtWidgets import QApplication
+
+from zlabel.utils.api_helper import SamApiHelper
+from zlabel.utils.image_cache import ImageCache
+from zlabel.utils.project import Task
+from zlabel.widgets.dock_file import ZDockFileContent
+from zlabel.widgets.zprefetcher import ZPrefetcher
+from zlabel_sam.server import StandInServer
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+app = QApplication.instance() or QApplication([])
+
+
+def encode_png(value: int) -> bytes:
+    bio = BytesIO()
+    Image.new("RGB", (8, 8), (value, value, value)).save(bio, format="png")
+    return bio.getvalue()
+
+
+class TestPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = StandInServer(users={"u": "p"})
+        self.names = [f"{i}.png" for i in range(6)]
+        for i, name in enumerate(self.names):
+            self.server.put_image(name, encode_png(i))
+        self.api = SamApiHelper("u", "p", self.server.start())
+        self.addCleanup(self.server.stop)
+        self.api.login()
+        self.cache = ImageCache(self.tmp.name)
+        self.api.image_store = self.cache.disk
+
+    def new_prefetcher(self, threads: int = 2) -> ZPrefetcher:
+        self.prefetcher = ZPrefetcher(self.api, self.cache, radius=2, threads=threads)
+        self.addCleanup(self.prefetcher.pool.waitForDone)
+        self.addCleanup(self.prefetcher.stop)
+        return self.prefetcher
+
+    def fetched(self) -> int:
+        return self.server.stats[("GET /get_image", 200)]
+
+    def test_neighbours_nearest_first(self):
+        dock = ZDockFileContent()
+        tasks = [
+            Task(id=i, anno_id=f"a{i}", filename=name, labels=[])
+            for i, name in enumerate(self.names)
+        ]
+        dock.append_tasks(tasks)
+        dock.setCurrentRow(1)
+        # next before previous, clipped at the first row
+        self.assertEqual([it.id_ for it in dock.get_neighbours(2)], ["a2", "a0", "a3"])
+
+    def test_fetch_once(self):
+        prefetcher = self.new_prefetcher()
+        # the same image twice, and one already in memory
+        self.cache.put(self.names[0], encode_png(0))
+        prefetcher.schedule(self.names[:3] + self.names[1:2])
+        prefetcher.pool.waitForDone()
+        self.assertEqual(self.fetched(), 2)
+        for name in self.names[:3]:
+            self.assertIsNotNone(self.cache.peek(name))
+        # already warm, nothing is scheduled again
+        prefetcher.schedule(self.names[:3])
+        prefetcher.pool.waitForDone()
+        self.assertEqual(self.fetched(), 2)
+
+    def test_stop_drops_queued(self):
+        self.server.image_delay = 0.2
+        prefetcher = self.new_prefetcher(threads=1)
+        prefetcher.schedule(self.names)
+        prefetcher.stop()
+        prefetcher.pool.waitForDone()
+        # at most the one already running finishes
+        self.assertLessEqual(self.fetched(), 1)
+        warm = [name for name in self.names if self.cache.peek(name) is not None]
+        self.assertEqual(len(warm), self.fetched())
+
+
+if __name__ == "__main__":
+    unittest.main()
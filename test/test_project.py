@@ -0,0 +1,54 @@
+import json
+import unittest
+from collections import OrderedDict
+
+from zlabel.utils.project import LABEL_REFS, Annotation, Label, Result, ResultType
+
+
+class TestLabelRefs(unittest.TestCase):
+    def setUp(self):
+        self.cat, self.dog = Label.new("cat", "#ff0000"), Label.new("dog", "#00ff00")
+        labels = OrderedDict((label.id, label) for label in (self.cat, self.dog))
+        self.anno = Annotation.new("1.jpg", 10, 10, None, "a1", labels)
+        for x in range(3):
+            # copies, as results read from an older file or undone
+            label = (self.cat if x % 2 else self.dog).model_copy()
+            self.anno.add_result(Result.new(ResultType.RECTANGLE, [label], x=x, w=5, h=5))
+
+    def test_refs_on_disk(self):
+        text = self.anno.model_dump_json(context=LABEL_REFS)
+        d = json.loads(text)
+        refs = [r["labels"] for r in d["results"].values()]
+        self.assertEqual(refs, [[self.dog.id], [self.cat.id], [self.dog.id]])
+        anno = Annotation.model_validate_json(text)
+        self.assertEqual(anno.model_dump(), self.anno.model_dump())
+        r = list(anno.results.values())[0]
+        self.assertIs(r.labels[0], anno.labels[self.dog.id])
+        # anything else, the server and other tools, gets every label inline
+        d = json.loads(self.anno.model_dump_json())
+        for r in d["results"].values():
+            self.assertEqual(Result.model_validate(r).labels[0].id, r["labels"][0]["id"])
+
+    def test_inline_accepted(self):
+        d = self.anno.model_dump(mode="json")
+        # a label that is not in the table stays inline
+        other = Label.new("bird").model_dump()
+        list(d["results"].values())[0]["labels"] = [other]
+        anno = Annotation.model_validate(d)
+        r0, r1 = list(anno.results.values())[:2]
+        self.assertIs(r1.labels[0], anno.labels[self.cat.id])
+        d = anno.model_dump(mode="json", context=LABEL_REFS)
+        self.assertEqual(d["results"][r0.id]["labels"], [other])
+        self.assertEqual(d["results"][r1.id]["labels"], [self.cat.id])
+
+    def test_relabel(self):
+        self.anno.relabel(self.cat.id)
+        self.anno.labels[self.cat.id].color = "#0000ff"
+        # one update reaches every result
+        self.assertTrue(all(r.labels[0].color == "#0000ff" for r in self.anno.results.values()))
+        # and leaves the other labels alone
+        self.assertEqual(self.anno.labels[self.dog.id].color, "#00ff00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from zlabel.utils.project import Annotation, Label, Project, Result, ResultType, Task
+from zlabel.utils.project_db import ProjectDB
+from zlabel.utils.project_journal import ProjectJournal
+
+
+class TestProjectDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.proj = Project.new(name="p")
+        for i in range(100):
+            labels = ["cat", "dog"] if i % 2 else ["cat"]
+            task = Task(id=i, anno_id=f"a{i}", filename=f"{i}.jpg", labels=labels, finished=i < 10)
+            self.proj.add_task(task)
+        self.db = ProjectDB(f"{self.tmp.name}/p.zdb")
+        self.addCleanup(self.db.close)
+        self.db.rewrite(self.proj)
+
+    def result(self, x: float):
+        return Result.new(ResultType.RECTANGLE, [Label.new("cat")], x=x, w=5, h=5)
+
+    def test_query(self):
+        tasks = self.db.query_tasks(finished=False, label="dog")
+        self.assertEqual([t.anno_id for t in tasks], [f"a{i}" for i in range(11, 100, 2)])
+        self.assertEqual(self.db.query_tasks(filename="42.jpg")[0].anno_id, "a42")
+        self.assertEqual(self.db.task_by_id(7).filename, "7.jpg")
+        self.assertEqual(self.db.count_tasks(finished=True), 10)
+        self.assertEqual(len(self.db.query_tasks(label="cat", limit=5)), 5)
+
+        # an update moves the task between queries, keeping its position
+        task = self.proj.tasks["a11"]
+        task.finished = True
+        task.labels = ["cat"]
+        self.db.put_task(task)
+        tasks = self.db.query_tasks(finished=False, label="dog")
+        self.assertNotIn("a11", [t.anno_id for t in tasks])
+        self.assertEqual(list(self.db.load().tasks)[11], "a11")
+        self.db.remove_tasks(["a13"])
+        self.assertIsNone(self.db.task_by_id(13))
+
+    def test_annotations_and_json(self):
+        anno = Annotation.new("1.jpg", 10, 10, None, "a1", OrderedDict())
+        self.db.put_anno(anno)
+        r1, r2 = self.result(1), self.result(2)
+        for r in (r1, r2):
+            anno.add_result(r)
+            self.db.put_result(anno, r)
+        r1.x = 3
+        self.db.put_result(anno, r1)
+        anno.remove_result(r2.id)
+        self.db.remove_result(anno, r2.id)
+        self.assertTrue(self.db.has_anno("a1"))
+        self.assertFalse(self.db.has_anno("a2"))
+        self.assertEqual(self.db.load_anno("a1").model_dump(), anno.model_dump())
+        self.proj.key_task = "a5"
+        self.db.put_meta(self.proj)
+
+        # round trip through the json a project without the database uses
+        path = f"{self.tmp.name}/p.json"
+        self.db.export_json(path)
+        proj = ProjectJournal(path).load()
+        self.assertEqual(proj.model_dump(), self.proj.model_dump())
+        self.assertEqual(proj.tasks["a1"].anno.model_dump(), anno.model_dump())
+        db = ProjectDB(f"{self.tmp.name}/imported.zdb")
+        self.addCleanup(db.close)
+        self.assertFalse(db.exists())
+        db.import_json(path)
+        self.assertEqual(db.load().model_dump(), self.proj.model_dump())
+        self.assertEqual(db.load_anno("a1").model_dump(), anno.model_dump())
+        self.assertTrue(Path(f"{self.tmp.name}/imported.zdb-wal").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
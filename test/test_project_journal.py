@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from zlabel.utils.project import Annotation, Label, Project, Result, ResultType, Task
+from zlabel.utils.project_journal import ProjectJournal
+
+
+class TestProjectJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = f"{self.tmp.name}/project.json"
+        self.proj = Project.new(name="p")
+        for i in range(100):
+            self.proj.add_task(Task(id=i, anno_id=f"a{i}", filename=f"{i}.jpg", labels=["x"]))
+        self.journal = ProjectJournal(self.path)
+        self.journal.rewrite(self.proj)
+
+    def result(self, x: float):
+        return Result.new(ResultType.RECTANGLE, [Label.new("x")], x=x, w=5, h=5)
+
+    def change(self, journal: ProjectJournal):
+        anno = Annotation.new("1.jpg", 10, 10, None, "a1", OrderedDict())
+        self.proj.add_annotation(anno)
+        journal.put_anno(anno)
+        r1, r2 = self.result(1), self.result(2)
+        for r in (r1, r2):
+            anno.add_result(r)
+            journal.put_result(anno, r)
+        r2.x = 3
+        journal.put_result(anno, r2)
+        anno.remove_result(r1.id)
+        journal.remove_result(anno, r1.id)
+        self.proj.tasks["a1"].finished = True
+        journal.put_task(self.proj.tasks["a1"])
+        self.proj.tasks.pop("a2")
+        journal.remove_tasks(["a2"])
+        self.proj.key_task = "a1"
+        journal.put_meta(self.proj)
+
+    def assertSameProject(self, proj: Project):
+        self.assertEqual(proj.model_dump(), self.proj.model_dump())
+        self.assertEqual(proj.tasks["a1"].anno.model_dump(), self.proj.tasks["a1"].anno.model_dump())
+
+    def test_replay(self):
+        snapshot = Path(self.path).read_bytes()
+        self.change(self.journal)
+        self.journal.close()
+        # saves only appended, the snapshot is untouched
+        self.assertEqual(Path(self.path).read_bytes(), snapshot)
+        self.assertSameProject(ProjectJournal(self.path).load())
+
+    def test_compaction(self):
+        journal = ProjectJournal(self.path, compact_bytes=256)
+        self.change(journal)
+        self.assertSameProject(ProjectJournal(self.path).load())
+        # records appended while a compaction ran are folded by the next one
+        journal.wait()
+        journal.compact()
+        journal.close()
+        self.assertFalse(journal.rotated_path.exists())
+        self.assertFalse(journal.journal_path.exists())
+        self.assertSameProject(ProjectJournal.read_snapshot(Path(self.path)))
+
+    def test_partial_record_and_old_snapshot(self):
+        self.change(self.journal)
+        self.journal.close()
+        with open(self.journal.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"op": "remove_tas')
+        self.assertSameProject(ProjectJournal(self.path).load())
+        # a project.json written by save_json still loads
+        self.proj.save_json(self.path)
+        self.journal.journal_path.unlink()
+        proj = ProjectJournal(self.path).load()
+        self.assertEqual(proj.model_dump(), self.proj.model_dump())
+
+
+if __name__ == "__main__":
+    unittest.main()
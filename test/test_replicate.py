@@ -0,0 +1,77 @@
+import json
+import tempfile
+import time
+import unittest
+from collections import OrderedDict
+
+from zlabel.utils.anno_codec import save_anno
+from zlabel.utils.api_helper import AlistApiHelper
+from zlabel.utils.project import Annotation, Label, Result, ResultType
+from zlabel.utils.replicate import ReplicatedUploader, Target
+from zlabel_sam.server import StandInServer
+
+
+class TestReplicatedUploader(unittest.TestCase):
+    def setUp(self):
+        self.servers = [StandInServer() for _ in range(3)]
+        self.urls = [server.start() for server in self.servers]
+        for server in self.servers:
+            server.put_delay = 0.3
+            self.addCleanup(server.stop)
+        self.uploader = ReplicatedUploader()
+        self.addCleanup(self.uploader.close)
+
+    def targets(self):
+        return [Target(f"{url}/api/fs/put", {"File-Path": "/a.zlabel"}) for url in self.urls]
+
+    def test_parallel(self):
+        t0 = time.perf_counter()
+        outcome = self.uploader.upload(b"data", self.targets())
+        self.assertLess(time.perf_counter() - t0, 0.6)
+        self.assertTrue(outcome.ok)
+        self.assertEqual(outcome.acked, 3)
+        for server in self.servers:
+            self.assertEqual(server.files["/a.zlabel"], b"data")
+
+    def test_quorum(self):
+        self.servers[0].stop()
+        self.servers[1].put_delay = 1.0
+        t0 = time.perf_counter()
+        outcome = self.uploader.upload(b"data", self.targets(), quorum=1)
+        self.assertLess(time.perf_counter() - t0, 0.8)
+        self.assertTrue(outcome.ok)
+        self.assertEqual([r.ok for r in outcome.results], [False, False, True])
+        self.assertFalse(outcome.results[0].pending)
+        self.assertTrue(outcome.results[1].pending)
+
+        # decided as soon as a quorum is out of reach
+        t0 = time.perf_counter()
+        outcome = self.uploader.upload(b"data", self.targets(), quorum=3)
+        self.assertLess(time.perf_counter() - t0, 0.2)
+        self.assertFalse(outcome.ok)
+
+    def test_alist_upload_file(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        filename = f"{tmp.name}/a.zlabel"
+        label = Label.new("cat")
+        anno = Annotation.new("1.jpg", 1, 1, None, "a", OrderedDict({label.id: label}))
+        anno.add_result(Result.new(ResultType.POINT, [label]))
+        save_anno(anno, filename, "binary")
+        api = AlistApiHelper(self.urls[0])
+        api.username = "u"
+        outcome = api.upload_file(filename)
+        self.assertTrue(outcome.ok)
+        self.assertEqual(len(self.servers[0].files), 2)
+        # exported as json with the labels inline
+        for data in self.servers[0].files.values():
+            for d in json.loads(data)["results"].values():
+                self.assertEqual(Result.model_validate(d).labels, [label])
+        # unchanged content is not sent again
+        outcome = api.upload_file(filename)
+        self.assertTrue(outcome.ok)
+        self.assertEqual(self.servers[0].stats[("PUT /api", 200)], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from collections import OrderedDict
+
+from zlabel.utils.project import Annotation, Label, Result, ResultType
+from zlabel.utils.result_store import ResultColumns
+
+
+class TestResultColumns(unittest.TestCase):
+    def setUp(self):
+        self.cat, self.dog = Label.new("cat"), Label.new("dog")
+        labels = OrderedDict((label.id, label) for label in (self.cat, self.dog))
+        self.anno = Annotation.new("1.jpg", 100, 100, None, "a1", labels)
+        for i in range(40):
+            label = self.cat if i % 4 else self.dog
+            r = Result.new(ResultType.RECTANGLE, [label], x=i, y=i, w=5, h=5)
+            self.anno.add_result(r)
+        poly = Result.new(
+            ResultType.POLYGON, [self.cat, self.dog], origin="sam", points=[(1, 2), (3, 4)]
+        )
+        poly.note = "two labels"
+        self.anno.add_result(poly)
+        self.store = ResultColumns.from_annotation(self.anno)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.store), 41)
+        results = self.store.to_results()
+        self.assertEqual(list(results), list(self.anno.results))
+        for k, r in results.items():
+            self.assertEqual(r.model_dump(), self.anno.results[k].model_dump())
+        ids = self.store.ids
+        self.assertEqual(self.store.result(ids[3]).x, 3.0)
+        self.assertEqual(self.store.column("w")[3], 5.0)
+        self.assertLess(self.store.nbytes / len(self.store), 100)
+
+        # the columns and sparse fields are all it takes to rebuild them
+        sparse = {k: self.store.sparse(k) for k in ("more_labels", "note", "points")}
+        self.assertEqual(sparse["note"], {40: "two labels"})
+        columns = {
+            k: self.store.column(k)
+            for k in ("x", "y", "w", "h", "rotation", "score", "type", "origin", "label")
+        }
+        rebuilt = ResultColumns.from_columns(
+            ids, columns, self.store.labels, self.store.origins, sparse
+        )
+        self.assertEqual(
+            [r.model_dump() for r in rebuilt.to_results().values()],
+            [r.model_dump() for r in results.values()],
+        )
+
+    def test_view(self):
+        ids = self.store.ids
+        view = self.store[ids[4]]
+        self.assertEqual((view.x, view.labels), (4.0, [self.dog]))
+        view.x, view.note = 7, "moved"
+        view.labels = [self.cat]
+        r = self.store.result(ids[4])
+        self.assertEqual((r.x, r.note, r.labels), (7.0, "moved", [self.cat]))
+        self.assertEqual(self.store[ids[40]].points, [(1, 2), (3, 4)])
+        self.assertEqual([v.id for v in self.store], ids)
+        with self.assertRaises(KeyError):
+            self.store["missing"]
+
+    def test_vectorised(self):
+        ids = self.store.ids
+        # boxes i..i+5 overlap the point 6.5 for i in 2..6
+        self.assertEqual(self.store.hit_test(6.5, 6.5), ids[2:7])
+        # the polygon has an empty box at 0, 0
+        self.assertEqual(self.store.in_rect(0, 0, 11, 11), ids[:7] + ids[40:])
+        self.assertEqual(self.store.label_counts(), {self.cat.id: 31, self.dog.id: 10})
+        self.store.translate(10, 0, ids[40:])
+        self.assertEqual(self.store[ids[40]].points, [(11, 2), (13, 4)])
+        self.store.relabel(self.dog, ids[:4])
+        self.assertEqual(self.store.label_counts(), {self.cat.id: 28, self.dog.id: 13})
+        self.assertEqual(self.store.boxes().shape, (41, 4))
+
+        self.store.remove(ids[:39:2])
+        self.assertEqual(self.store.ids, ids[1:39:2] + ids[39:])
+        self.assertEqual(self.store.result(ids[39]).x, 39.0)
+        self.assertEqual(self.store.result(ids[40]).note, "two labels")
+        self.assertEqual(self.store.column("x").tolist(), list(range(1, 39, 2)) + [39.0, 10.0])
+
+    def test_duplicate_ids(self):
+        r = self.anno.results[self.store.ids[0]]
+        moved = r.model_copy(update={"x": 99.0})
+        store = ResultColumns.from_results([r, moved], [self.cat, self.dog])
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.result(r.id).x, 99.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
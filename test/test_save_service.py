@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+from collections import OrderedDict
+from pathlib import Path
+
+from zlabel.utils.anno_shards import AnnotationShards
+from zlabel.utils.project import Annotation, Label, Result, ResultType
+from zlabel.utils.save_service import SaveService
+
+
+class TestSaveService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.saver = SaveService(delay=0.5)
+        self.addCleanup(self.saver.close)
+
+    def test_coalesce(self):
+        path = Path(self.tmp.name) / "a" / "x.zlabel"
+        sizes = []
+        for i in range(50):
+            self.saver.submit(path, lambda i=i: str(i).encode(), on_written=sizes.append)
+        self.assertTrue(self.saver.pending(path))
+        self.saver.flush(path)
+        self.assertFalse(self.saver.pending(path))
+        self.assertEqual(path.read_text(), "49")
+        self.assertEqual((self.saver.requests, self.saver.writes, sizes), (50, 1, [2]))
+        self.assertEqual(list(path.parent.iterdir()), [path])
+
+        # a failed write is logged, the ones after it still happen
+        self.saver.submit(path, lambda: 1 / 0)  # type: ignore
+        self.saver.submit(Path(self.tmp.name) / "y", lambda: b"y")
+        self.saver.flush()
+        self.assertEqual((path.read_text(), self.saver.writes), ("49", 2))
+
+    def test_shards(self):
+        shards = AnnotationShards(f"{self.tmp.name}/shards", saver=self.saver)
+        anno = Annotation.new("1.jpg", 10, 10, None, "a1", OrderedDict())
+        shards.save(anno)
+        # pending counts as stored, loading waits for the write
+        self.assertTrue(shards.contains("a1"))
+        self.assertFalse(shards.path("a1").exists())
+        # the snapshot taken by save is written, not the later edit
+        anno.add_result(Result.new(ResultType.RECTANGLE, [Label.new("x")], w=5, h=5))
+        self.assertEqual(len(shards.load("a1").results), 0)
+        shards.save(anno)
+        shards.remove("a1")
+        self.saver.flush()
+        self.assertFalse(shards.contains("a1"))
+
+    def test_snapshot_copies_results(self):
+        shards = AnnotationShards(f"{self.tmp.name}/shards", saver=self.saver)
+        cat = Label.new("cat")
+        anno = Annotation.new("1.jpg", 10, 10, None, "a1", OrderedDict({cat.id: cat}))
+        anno.add_result(Result.new(ResultType.POLYGON, [cat], w=5, points=[(1, 1)]))
+        shards.save(anno)
+        # edits in place after the save don't reach the pending write
+        r = anno.crt_result
+        r.w, r.note = 9, "later"  # type: ignore[union-attr]
+        r.points.append((2, 2))  # type: ignore[union-attr]
+        cat.color = "#ffffff"
+        saved = shards.load("a1").crt_result  # type: ignore[union-attr]
+        self.assertEqual((saved.w, saved.note, saved.points), (5, "", [(1, 1)]))  # type: ignore
+        self.assertEqual(saved.labels[0].color, "#000000")  # type: ignore[union-attr]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+import os
+import unittest
+from typing import Any, Dict
+
+from qtpy.QtCore import Qt
+from qtpy.QtWidgets import QApplication
+
+from zlabel.utils.api_helper import SamApiHelper, SyncUnavailable
+from zlabel.utils.project import Annotation, Project, Task
+from zlabel.widgets.zworker import ZGetTasksWorker
+from zlabel_sam.server import StandInServer
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+app = QApplication.instance() or QApplication([])
+
+
+def task(i: int, finished=False, filename=""):
+    return Task(id=i, anno_id=f"t{i}", filename=filename or f"{i}.jpg", labels=[], finished=finished)
+
+
+class TestMergeTasks(unittest.TestCase):
+    def setUp(self):
+        self.proj = Project.new()
+        for i in range(3):
+            self.proj.add_task(task(i))
+        self.proj.key_task = "t1"
+        self.anno = Annotation.new("1.jpg", 10, 10, None, "t1", OrderedDict())
+        self.proj.tasks["t1"].anno = self.anno
+
+    def test_merge_keeps_loaded_annotations(self):
+        added, updated, gone = self.proj.merge_tasks(
+            [task(1, finished=True), task(2), task(3)], ["t0", "t9"]
+        )
+        self.assertEqual([t.anno_id for t in added], ["t3"])
+        self.assertEqual([t.anno_id for t in updated], ["t1"])
+        self.assertEqual(gone, ["t0"])
+        self.assertEqual(list(self.proj.tasks), ["t1", "t2", "t3"])
+        self.assertTrue(self.proj.tasks["t1"].finished)
+        self.assertIs(self.proj.tasks["t1"].anno, self.anno)
+        self.assertEqual(self.proj.key_task, "t1")
+
+    def test_merge_limit_and_removed_key(self):
+        added, _, _ = self.proj.merge_tasks([task(3), task(4)], ["t1"], limit=3)
+        self.assertEqual([t.anno_id for t in added], ["t3"])
+        self.assertEqual(self.proj.key_task, "t0")
+
+
+class TestTaskListing(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(users={"u": "p"})
+        for i in range(7):
+            self.server.put_task(task(i).model_dump())
+        self.api = SamApiHelper("u", "p", self.server.start())
+        self.addCleanup(self.server.stop)
+        self.api.login()
+
+    def requests(self) -> int:
+        return self.server.stats[("GET /get_tasks", 200)]
+
+    def test_pages(self):
+        meta: Dict[str, Any] = {}
+        tasks = list(self.api.iter_tasks(finished=0, page_size=3, meta=meta))
+        self.assertEqual([t["anno_id"] for t in tasks], [f"t{i}" for i in range(7)])
+        self.assertEqual(self.requests(), 3)
+        # the trailer of the last page
+        self.assertEqual(meta, {"next_cursor": None, "sync_cursor": str(self.server.seq)})
+        tasks = list(self.api.iter_tasks(num=4, finished=0, page_size=3))
+        self.assertEqual(len(tasks), 4)
+
+    def test_plain_list(self):
+        self.server.stream_tasks = False
+        meta: Dict[str, Any] = {}
+        tasks = list(self.api.iter_tasks(finished=0, page_size=3, meta=meta))
+        self.assertEqual(len(tasks), 7)
+        self.assertEqual(self.requests(), 1)
+        self.assertEqual(meta, {})
+
+    def test_worker_pages(self):
+        worker = ZGetTasksWorker(self.api, 0, finished=0, page_size=3)
+        pages, done = [], []
+        direct = Qt.ConnectionType.DirectConnection
+        worker.emitter.page.connect(lambda page: pages.append(page), direct)
+        worker.emitter.success.connect(lambda n, cursor: done.append((n, cursor)), direct)
+        worker.run()
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertTrue(all(isinstance(t, Task) for page in pages for t in page))
+        self.assertEqual(done, [(7, str(self.server.seq))])
+
+
+class TestTaskChanges(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(users={"u": "p"})
+        for i in range(3):
+            self.server.put_task(task(i).model_dump())
+        self.api = SamApiHelper("u", "p", self.server.start())
+        self.addCleanup(self.server.stop)
+        self.api.login()
+        self.since = str(self.server.seq)
+
+    def test_changes_since(self):
+        self.server.put_task(task(1, finished=True).model_dump())
+        self.server.put_task(task(3).model_dump())
+        self.server.remove_task("t0")
+        meta: Dict[str, Any] = {}
+        changes = list(self.api.iter_task_changes(self.since, finished=0, page_size=2, meta=meta))
+        # t1 is finished, no longer in the unfinished listing
+        self.assertEqual(
+            [(d["op"], d.get("anno_id") or d["task"]["anno_id"]) for d in changes],
+            [("remove", "t1"), ("upsert", "t3"), ("remove", "t0")],
+        )
+        self.assertEqual(meta["sync_cursor"], str(self.server.seq))
+        self.assertEqual(list(self.api.iter_task_changes(meta["sync_cursor"], finished=0)), [])
+
+    def test_unknown_cursor(self):
+        with self.assertRaises(SyncUnavailable):
+            list(self.api.iter_task_changes(str(self.server.seq + 1)))
+        self.server.unsupported["get_task_changes"] = 404
+        with self.assertRaises(SyncUnavailable):
+            list(self.api.iter_task_changes(self.since))
+
+    def run_worker(self, since: str) -> Dict[str, list]:
+        worker = ZGetTasksWorker(self.api, 0, finished=0, page_size=2, since=since)
+        signals: Dict[str, list] = {"page": [], "success": [], "changes": [], "synced": []}
+        direct = Qt.ConnectionType.DirectConnection
+        worker.emitter.page.connect(lambda page: signals["page"].append(page), direct)
+        worker.emitter.success.connect(lambda *args: signals["success"].append(args), direct)
+        worker.emitter.changes.connect(lambda *args: signals["changes"].append(args), direct)
+        worker.emitter.synced.connect(lambda *args: signals["synced"].append(args), direct)
+        worker.run()
+        return signals
+
+    def test_worker_sync(self):
+        self.server.put_task(task(3).model_dump())
+        signals = self.run_worker(self.since)
+        self.assertEqual(signals["page"], [])
+        ((upserts, removed),) = signals["changes"]
+        self.assertEqual(([t.anno_id for t in upserts], removed), (["t3"], []))
+        self.assertEqual(signals["synced"], [(1, str(self.server.seq))])
+
+    def test_worker_falls_back_to_listing(self):
+        signals = self.run_worker(str(self.server.seq + 1))
+        self.assertEqual((signals["changes"], signals["synced"]), ([], []))
+        self.assertEqual([len(page) for page in signals["page"]], [2, 1])
+        self.assertEqual(signals["success"], [(3, str(self.server.seq))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import tempfile
+import time
+import unittest
+
+from zlabel.utils.upload_queue import UploadQueue
+
+
+class TestUploadQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = f"{self.tmp.name}/upload_queue.json"
+
+    def test_merge_and_persist(self):
+        queue = UploadQueue(self.path)
+        queue.put("a", "annos/a.zlabel")
+        queue.put("b", "annos/b.zlabel")
+        queue.put("a", "annos/a.zlabel")
+        self.assertEqual(len(queue), 2)
+        queue = UploadQueue(self.path)
+        self.assertEqual([it.anno_id for it in queue.due()], ["a", "b"])
+
+    def test_backoff(self):
+        queue = UploadQueue(self.path, base_delay=10, max_delay=100)
+        queue.put("a", "annos/a.zlabel")
+        for attempts in range(1, 6):
+            queue.failed(["a"], "offline", now=1000)
+            item = queue.due(ignore_backoff=True)[0]
+            delay = min(10 * 2 ** (attempts - 1), 100)
+            self.assertEqual(item.attempts, attempts)
+            self.assertTrue(1000 + delay * 0.8 <= item.next_try <= 1000 + delay * 1.2)
+        self.assertEqual(queue.due(now=1000), [])
+
+    def test_done_keeps_newer_content(self):
+        queue = UploadQueue(self.path)
+        queue.put("a", "annos/a.zlabel")
+        queue.put("b", "annos/b.zlabel")
+        started_at = time.time()
+        time.sleep(0.01)
+        # edited again while the flush was uploading
+        queue.put("a", "annos/a.zlabel")
+        queue.done(["a", "b"], started_at)
+        self.assertEqual(len(queue), 1)
+        item = queue.due()[0]
+        self.assertEqual(item.anno_id, "a")
+        self.assertGreater(item.updated_at, started_at)
+        queue = UploadQueue(self.path)
+        self.assertEqual([it.anno_id for it in queue.due()], ["a"])
+        queue.done(["a"])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(len(UploadQueue(self.path)), 0)
+
+if __name__ == "__main__":
+    unittest.main()
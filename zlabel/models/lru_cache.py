@@ -27,7 +27,66 @@ class LruCache:
             if len(self._cache) > self.maxsize:
                 self._cache.popitem(last=False)
 
+    def pop(self, key):
+        """Remove key from cache, returns its value or None."""
+        with self.lock:
+            return self._cache.pop(key, None)
+
     def find(self, key):
         """Returns True if key is in cache, False otherwise."""
         with self.lock:
             return key in self._cache
+
+
+class SizedLruCache:
+    """Thread-safe LRU cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int, sizeof=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda v: getattr(v, "nbytes", 0))
+        self.lock = threading.Lock()
+        self.nbytes = 0
+        self._cache = OrderedDict()
+
+    def get(self, key):
+        """Get value from cache. Returns None if key is not present."""
+        with self.lock:
+            if key not in self._cache:
+                return None
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+
+    def put(self, key, value):
+        """Put value into cache, evicting the oldest items until it fits the budget.
+
+        Values larger than the whole budget are not cached.
+        """
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self._cache:
+                self.nbytes -= self._cache.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._cache[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, s) = self._cache.popitem(last=False)
+                self.nbytes -= s
+
+    def pop(self, key):
+        """Remove key from cache, returns its value or None."""
+        with self.lock:
+            if key not in self._cache:
+                return None
+            value, size = self._cache.pop(key)
+            self.nbytes -= size
+            return value
+
+    def find(self, key):
+        """Returns True if key is in cache, False otherwise."""
+        with self.lock:
+            return key in self._cache
+
+    def __len__(self):
+        with self.lock:
+            return len(self._cache)
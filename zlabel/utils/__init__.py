@@ -1,6 +1,7 @@
 from .enums import AutoMode, SettingsKey, ClickMode, ContourMode, DrawMode, MapMode, StatusMode
 from .logger import ZLogger
-from .api_helper import AlistApiHelper, SamApiHelper
+from .auth import AuthManager
+from .api_helper import AlistApiHelper, SamApiHelper, SyncUnavailable
 from .project import (
     Label,
     Task,
@@ -10,6 +11,22 @@ from .project import (
     ResultStep,
     Annotation,
     User,
+    LABEL_REFS,
     id_md5,
     id_uuid4,
 )
+from .disk_cache import DiskCache
+from .image_cache import ImageCache, CacheStats
+from .anno_cache import AnnotationCache
+from .anno_delta import DeltaUploader, AckStore, diff_annotation, apply_patch
+from .upload_queue import UploadQueue, PendingUpload
+from .model_router import ModelRouter, Endpoint
+from .offline_pack import OfflinePack
+from .anno_codec import dump_anno, load_anno, read_anno, read_anno_json, save_anno
+from .save_service import SaveService, write_atomic
+from .anno_shards import AnnotationShards
+from .json_stream import JsonStream
+from .project_journal import ProjectJournal
+from .project_db import ProjectDB
+from .result_store import ResultColumns
+from .replicate import ReplicatedUploader, Target, TargetResult, UploadOutcome
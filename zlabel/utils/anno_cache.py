@@ -0,0 +1,66 @@
+import os
+import threading
+from pathlib import Path
+
+from zlabel.models.lru_cache import LruCache
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.project import Annotation
+
+
+class AnnotationCache(object):
+    """Local cache of remote ``.zlabel`` files.
+
+    The raw json is kept under ``cache_dir`` so it survives restarts, annotations
+    parsed off the UI thread are kept in memory until they are taken.
+    """
+
+    def __init__(self, cache_dir: str, maxsize: int = 64) -> None:
+        self.logger = ZLogger("AnnotationCache")
+        self.cache_dir = Path(cache_dir)
+        self.memory = LruCache(maxsize)
+        self._lock = threading.Lock()
+
+    def path(self, anno_id: str) -> Path:
+        return self.cache_dir / f"{anno_id}.zlabel"
+
+    def contains(self, anno_id: str) -> bool:
+        return self.memory.find(anno_id) or self.path(anno_id).exists()
+
+    def get_text(self, anno_id: str) -> str | None:
+        try:
+            return self.path(anno_id).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def put_text(self, anno_id: str, text: str):
+        path = self.path(anno_id)
+        tmp = path.with_name(f"{path.name}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            self.logger.warning(f"Write cache of {anno_id=} failed, {e=}")
+
+    def put(self, anno_id: str, text: str, anno: Annotation | None = None):
+        self.put_text(anno_id, text)
+        if anno is not None:
+            self.memory.put(anno_id, anno)
+
+    def take(self, anno_id: str) -> Annotation | None:
+        """Hand a parsed annotation over to the caller, parsing the cached json if needed.
+
+        The entry is consumed: once taken, the project owns the annotation and the
+        cached copy would only go stale.
+        """
+        with self._lock:
+            anno = self.memory.pop(anno_id)
+            text = self.get_text(anno_id) if anno is None else None
+            self.path(anno_id).unlink(missing_ok=True)
+        if anno is not None or text is None:
+            return anno
+        try:
+            return Annotation.model_validate_json(text)
+        except Exception as e:
+            self.logger.warning(f"Validate cached {anno_id=} failed, {e=}")
+            return None
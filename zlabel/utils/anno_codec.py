@@ -0,0 +1,156 @@
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from zlabel.utils.project import LABEL_REFS, Annotation, Label
+from zlabel.utils.result_store import FLOAT_FIELDS, ResultColumns
+from zlabel.utils.save_service import write_atomic
+
+ANNO_FORMATS = ("json", "binary")
+
+MAGIC = b"ZLB\x01"
+# magic, length of the json header
+PREFIX = struct.Struct("<4sI")
+
+
+def encode_binary(anno: Annotation) -> bytes:
+    """
+    The annotation as a small json header followed by its results as numpy columns.
+
+    The columns are those of ``ResultColumns``. The header holds the fields of the
+    annotation, the ids of the results and the rare fields: notes, origins other than
+    manual and labels after the first. Coordinates are float64, so a round trip is
+    lossless, labels are indexes into a table of the label refs ``Annotation`` writes
+    to json. The file is several times smaller than indented json and quicker to write,
+    reading it is a little slower than json, which pydantic-core parses without python,
+    see ``test/bench_anno_format.py``.
+    """
+    columns = ResultColumns.from_annotation(anno)
+    points = columns.sparse("points")
+    counts = np.zeros(len(columns), dtype=np.uint32)
+    counts[list(points)] = [len(p) for p in points.values()]
+    coords = np.asarray(
+        [p for row_points in points.values() for p in row_points], dtype=np.float64
+    ).reshape(-1, 2)
+    floats = np.stack([columns.column(k) for k in FLOAT_FIELDS]) if len(columns) else np.empty(0)
+
+    header = anno.model_dump(mode="json", exclude={"results"})
+    header["columns"] = {
+        "ids": columns.ids,
+        "points": len(coords),
+        "refs": [
+            label.id if anno.owns(label) else label.model_dump(mode="json")
+            for label in columns.labels
+        ],
+        "origins": columns.origins,
+        "more_labels": columns.sparse("more_labels"),
+        "notes": columns.sparse("note"),
+    }
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # pad so the float64 columns are aligned
+    head += b" " * (-(PREFIX.size + len(head)) % 8)
+    return b"".join(
+        (
+            PREFIX.pack(MAGIC, len(head)),
+            head,
+            floats.astype(np.float64).tobytes(),
+            coords.tobytes(),
+            counts.tobytes(),
+            columns.column("label").tobytes(),
+            columns.column("origin").tobytes(),
+            columns.column("type").tobytes(),
+        )
+    )
+
+
+def decode_binary(data: bytes) -> Annotation:
+    magic, size = PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a binary annotation, {magic=}")
+    offset = PREFIX.size
+    d = json.loads(data[offset : offset + size])
+    offset += size
+    header = d.pop("columns")
+    ids: List[str] = header["ids"]
+    n = len(ids)
+
+    def take(dtype, count: int) -> np.ndarray:
+        nonlocal offset
+        a = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += a.nbytes
+        return a
+
+    floats = take(np.float64, len(FLOAT_FIELDS) * n).reshape(len(FLOAT_FIELDS), n)
+    coords = take(np.float64, 2 * header["points"]).reshape(-1, 2).tolist()
+    counts = take(np.uint32, n)
+    columns: Dict[str, Any] = dict(zip(FLOAT_FIELDS, floats))
+    columns["label"] = take(np.int32, n)
+    columns["origin"] = take(np.uint16, n)
+    columns["type"] = take(np.int8, n)
+
+    points: Dict[int, Any] = {}
+    start = 0
+    for row in np.flatnonzero(counts).tolist():
+        end = start + int(counts[row])
+        points[row] = coords[start:end]
+        start = end
+
+    # validated once, results share them as they would after interning
+    labels = {k: Label.model_validate(v) for k, v in d["labels"].items()}
+    d["labels"] = labels
+    refs = [
+        labels.get(ref) or Label(id=ref, name="UNKNOWN")
+        if type(ref) is str
+        else Label.model_validate(ref)
+        for ref in header["refs"]
+    ]
+    sparse = {
+        "more_labels": {int(k): v for k, v in header["more_labels"].items()},
+        "note": {int(k): v for k, v in header["notes"].items()},
+        "points": points,
+    }
+    d["results"] = ResultColumns.from_columns(
+        ids, columns, refs, header["origins"], sparse
+    ).to_results()
+    return Annotation.model_validate(d)
+
+
+def is_binary(data: bytes) -> bool:
+    return data[: len(MAGIC)] == MAGIC
+
+
+def dump_anno(anno: Annotation, anno_format: str = "json", indent: int | None = None) -> bytes:
+    if anno_format == "binary":
+        return encode_binary(anno)
+    return anno.model_dump_json(indent=indent, context=LABEL_REFS).encode("utf-8")
+
+
+def load_anno(data: bytes) -> Annotation:
+    """An annotation in either format"""
+    if is_binary(data):
+        return decode_binary(data)
+    return Annotation.model_validate_json(data)
+
+
+def anno_json(data: bytes) -> str:
+    """
+    The json text of an annotation in either format, the one the server takes: labels
+    are inline in every result, not the ids local files refer to them by.
+    """
+    return load_anno(data).model_dump_json()
+
+
+def save_anno(anno: Annotation, path: str | Path, anno_format: str = "json"):
+    """Write a ``.zlabel`` file, json is indented as ``Annotation.save_json`` does"""
+    write_atomic(path, dump_anno(anno, anno_format, indent=4))
+
+
+def read_anno(path: str | Path) -> Annotation:
+    return load_anno(Path(path).read_bytes())
+
+
+def read_anno_json(path: str | Path) -> str:
+    return anno_json(Path(path).read_bytes())
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from zlabel.utils.anno_codec import read_anno_json
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.project import Annotation
+
+
+def diff_annotation(base: Annotation, new: Annotation) -> Dict[str, Any]:
+    """
+    Compact patch that turns base into new:
+        added/modified: full dumps of the changed results
+        removed: ids of the removed results
+        fields: annotation level fields that changed
+        order: result ids, only if applying the patch would not keep the order of new
+    """
+    old_results = {k: r.model_dump(mode="json") for k, r in base.results.items()}
+    added: List[Dict[str, Any]] = []
+    modified: List[Dict[str, Any]] = []
+    for k, r in new.results.items():
+        d = r.model_dump(mode="json")
+        old = old_results.pop(k, None)
+        if old is None:
+            added.append(d)
+        elif old != d:
+            modified.append(d)
+    removed = list(old_results.keys())
+
+    old_fields = base.model_dump(mode="json", exclude={"results"})
+    new_fields = new.model_dump(mode="json", exclude={"results"})
+    fields = {k: v for k, v in new_fields.items() if old_fields.get(k) != v}
+
+    patch: Dict[str, Any] = {
+        "id": new.id,
+        "added": added,
+        "removed": removed,
+        "modified": modified,
+        "fields": fields,
+    }
+    removed_set = set(removed)
+    order = [k for k in base.results if k not in removed_set] + [d["id"] for d in added]
+    if order != list(new.results.keys()):
+        patch["order"] = list(new.results.keys())
+    return patch
+
+
+def is_empty_patch(patch: Dict[str, Any]) -> bool:
+    return not any(patch.get(k) for k in ("added", "removed", "modified", "fields", "order"))
+
+
+def apply_patch(base: Annotation, patch: Dict[str, Any]) -> Annotation:
+    data = base.model_dump(mode="json")
+    data.update(patch.get("fields", {}))
+    results: Dict[str, Any] = data["results"]
+    for id_ in patch.get("removed", []):
+        results.pop(id_, None)
+    for d in patch.get("modified", []) + patch.get("added", []):
+        results[d["id"]] = d
+    if "order" in patch:
+        results = {k: results[k] for k in patch["order"]}
+    data["results"] = results
+    return Annotation.model_validate(data)
+
+
+@dataclass
+class AckedAnnotation(object):
+    rev: int | None
+    anno: Annotation
+
+
+class AckStore(object):
+    """The last version of every annotation the server acknowledged, with its revision"""
+
+    def __init__(self, root: str) -> None:
+        self.logger = ZLogger("AckStore")
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def path(self, anno_id: str) -> Path:
+        return self.root / f"{anno_id}.json"
+
+    def get(self, anno_id: str) -> AckedAnnotation | None:
+        try:
+            with self._lock:
+                d = json.loads(self.path(anno_id).read_text(encoding="utf-8"))
+            return AckedAnnotation(d["rev"], Annotation.model_validate(d["anno"]))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Load acked {anno_id=} failed, {e=}")
+            return None
+
+    def put(self, anno_id: str, rev: int | None, anno_json: str):
+        path = self.path(anno_id)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(f'{{"rev": {json.dumps(rev)}, "anno": {anno_json}}}', encoding="utf-8")
+            os.replace(tmp, path)
+
+    def remove(self, anno_id: str):
+        with self._lock:
+            self.path(anno_id).unlink(missing_ok=True)
+
+
+class DeltaUploader(object):
+    """
+    Upload annotations as patches against the last acknowledged revision,
+    fall back to a full upload if there is none or the revisions don't match.
+    """
+
+    def __init__(self, api, acked_dir: str) -> None:
+        self.logger = ZLogger("DeltaUploader")
+        self.api = api
+        self.store = AckStore(acked_dir)
+
+    def upload(self, filename: str) -> bool:
+        # the server takes json, binary files are converted
+        text = read_anno_json(filename)
+        anno = Annotation.model_validate_json(text)
+        acked = self.store.get(anno.id)
+        if acked is not None and acked.rev is not None:
+            patch = diff_annotation(acked.anno, anno)
+            if is_empty_patch(patch):
+                self.logger.info(f"{anno.id=} unchanged since rev {acked.rev}, skip upload")
+                return True
+            ok, rev = self.api.patch_zlabel(filename, acked.rev, patch)
+            if ok:
+                self.store.put(anno.id, rev, text)
+                return True
+            self.logger.info(f"Patch of {anno.id=} against rev {acked.rev} refused, full upload")
+        ok, rev = self.api.save_zlabel_rev(filename, text.encode("utf-8"))
+        if ok:
+            self.store.put(anno.id, rev, text)
+        return ok
+
+    def upload_many(self, filenames: List[str]) -> Dict[str, bool]:
+        """
+        Upload several annotations in one request, returns the outcome per file.
+        Refused patches are retried as full uploads in a second request,
+        servers without the batch endpoint are served one file at a time.
+        """
+        results: Dict[str, bool] = {}
+        texts: Dict[str, Tuple[str, str]] = {}
+        payloads: List[Dict[str, Any]] = []
+        for filename in filenames:
+            try:
+                text = read_anno_json(filename)
+            except FileNotFoundError:
+                self.logger.warning(f"{filename=} is gone, nothing to upload")
+                results[filename] = True
+                continue
+            anno = Annotation.model_validate_json(text)
+            texts[filename] = (anno.id, text)
+            acked = self.store.get(anno.id)
+            if acked is not None and acked.rev is not None:
+                patch = diff_annotation(acked.anno, anno)
+                if is_empty_patch(patch):
+                    results[filename] = True
+                    continue
+                payloads.append({"filename": filename, "base_rev": acked.rev, "patch": patch})
+            else:
+                payloads.append({"filename": filename, "zlabel": text})
+
+        while payloads:
+            resp = self.api.save_zlabels(payloads)
+            if resp is None:
+                for payload in payloads:
+                    results[payload["filename"]] = self.upload(payload["filename"])
+                break
+            retry = []
+            for payload, r in zip(payloads, resp):
+                filename = payload["filename"]
+                anno_id, text = texts[filename]
+                if r["status"]:
+                    self.store.put(anno_id, r.get("rev", None), text)
+                    results[filename] = True
+                elif "patch" in payload:
+                    retry.append({"filename": filename, "zlabel": text})
+                else:
+                    results[filename] = False
+            payloads = retry
+        return results
@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List
+
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.anno_codec import dump_anno, load_anno
+from zlabel.utils.project import Annotation
+from zlabel.utils.save_service import SaveService, write_atomic
+
+
+class AnnotationShards(object):
+    """One file per annotation under ``shard_dir``, loaded when its task is opened.
+
+    Loaded annotations are tracked least recently used first with their approximate
+    size, ``over_budget`` names the ones to put back on disk to stay within
+    ``budget_bytes``. Shards are written in ``anno_format`` and read in either format.
+    With ``saver`` they are written in the background, a burst of edits writes once.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str,
+        budget_bytes: int = 64 * 1024 * 1024,
+        anno_format: str = "json",
+        saver: SaveService | None = None,
+    ) -> None:
+        self.logger = ZLogger("AnnotationShards")
+        self.shard_dir = Path(shard_dir)
+        self.budget_bytes = budget_bytes
+        self.anno_format = anno_format
+        self.saver = saver
+
+        self._lock = threading.Lock()
+        # anno id -> size of its shard, least recently used first
+        self._resident: OrderedDict[str, int] = OrderedDict()
+        self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def path(self, anno_id: str) -> Path:
+        return self.shard_dir / f"{anno_id}.zlabel"
+
+    def contains(self, anno_id: str) -> bool:
+        path = self.path(anno_id)
+        return (self.saver is not None and self.saver.pending(path)) or path.exists()
+
+    def load(self, anno_id: str) -> Annotation | None:
+        if self.saver is not None:
+            self.saver.flush(self.path(anno_id))
+        try:
+            data = self.path(anno_id).read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            anno = load_anno(data)
+        except Exception as e:
+            self.logger.warning(f"Validate shard of {anno_id=} failed, {e=}")
+            return None
+        self.touch(anno_id, len(data))
+        return anno
+
+    def save(self, anno: Annotation):
+        path = self.path(anno.id)
+        if self.saver is not None:
+            snapshot, anno_format = anno.snapshot(), self.anno_format
+            with self._lock:
+                size = self._resident.get(anno.id, 0)
+            self.touch(anno.id, size)
+            self.saver.submit(
+                path,
+                lambda: dump_anno(snapshot, anno_format),
+                on_written=lambda n: self._resize(anno.id, n),
+            )
+            return
+        data = dump_anno(anno, self.anno_format)
+        try:
+            write_atomic(path, data)
+        except OSError as e:
+            self.logger.warning(f"Write shard of {anno.id=} failed, {e=}")
+            return
+        self.touch(anno.id, len(data))
+
+    def remove(self, anno_id: str):
+        self.forget(anno_id)
+        if self.saver is not None:
+            self.saver.cancel(self.path(anno_id))
+        self.path(anno_id).unlink(missing_ok=True)
+
+    def touch(self, anno_id: str, size: int):
+        """Mark anno_id as loaded and just used"""
+        with self._lock:
+            self._nbytes += size - self._resident.pop(anno_id, 0)
+            self._resident[anno_id] = size
+
+    def _resize(self, anno_id: str, size: int):
+        # the size of a background write, if the annotation wasn't forgotten meanwhile
+        with self._lock:
+            if anno_id in self._resident:
+                self._nbytes += size - self._resident[anno_id]
+                self._resident[anno_id] = size
+
+    def forget(self, anno_id: str):
+        """anno_id is no longer in memory"""
+        with self._lock:
+            self._nbytes -= self._resident.pop(anno_id, 0)
+
+    def over_budget(self, keep: Iterable[str] = ()) -> List[str]:
+        """Least recently used annotations to evict until the rest fits the budget"""
+        keep = set(keep)
+        with self._lock:
+            nbytes = self._nbytes
+            ids = []
+            for anno_id, size in self._resident.items():
+                if nbytes <= self.budget_bytes:
+                    break
+                if anno_id in keep:
+                    continue
+                ids.append(anno_id)
+                nbytes -= size
+        return ids
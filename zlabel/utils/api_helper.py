@@ -1,14 +1,42 @@
 import copy
+import hashlib
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Tuple
 import numpy as np
 import requests
 import json
 from io import BytesIO
 from PIL import Image
 
+from zlabel.utils.anno_codec import read_anno_json
+from zlabel.utils.auth import AuthManager
+from zlabel.utils.disk_cache import DiskCache
 from zlabel.utils.logger import ZLogger
+from zlabel.utils.model_router import Endpoint, ModelRouter
+from zlabel.utils.project import id_md5
+from zlabel.utils.replicate import ReplicatedUploader, Target, TargetResult, UploadOutcome
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SyncUnavailable(RuntimeError):
+    """The server has no incremental sync, or no longer knows the cursor"""
 
 
 class AlistApiHelper(object):
@@ -25,6 +53,16 @@ class AlistApiHelper(object):
         self.password = ""
         self.user_token = ""
         self.headers = {"User-Agent": "ZLabel/1.0.0"}
+        # every saved file goes to all of these, formatted with username, filename and name
+        self.upload_paths = [
+            "/labelspace/{username}/{filename}",
+            "/datasets/seeds_data/exported_pngs_label/{name}",
+        ]
+        # destinations that must acknowledge a save, 0 for all of them
+        self.upload_quorum = 0
+        self.uploader = ReplicatedUploader(check=self._alist_ok)
+        # destination path -> md5 of the content last uploaded there
+        self._uploaded: Dict[str, str] = {}
 
     def login(self, username: str, password: str):
         self.username = username
@@ -74,35 +112,52 @@ class AlistApiHelper(object):
         url = self.get_img_url(name)
         return self.get_image_by_api(url)
 
-    def upload_file(self, filename: str):
+    def upload_file(self, filename: str) -> UploadOutcome:
+        """Upload filename to every path of upload_paths at once, see ReplicatedUploader"""
         url = f"{self.host}/api/fs/put"
-        fs = open(filename, "r", encoding="utf-8")
-        data = fs.read().encode("utf-8")
-        fs.close()
+        if Path(filename).suffix == ".zlabel":
+            # exported as the server takes it, labels inline and never binary
+            data = read_anno_json(filename).encode("utf-8")
+        else:
+            with open(filename, "rb") as f:
+                data = f.read()
+        digest = hashlib.md5(data).hexdigest()
+        paths = [
+            p.format(username=self.username, filename=filename, name=Path(filename).name)
+            for p in self.upload_paths
+        ]
+        # alist has no partial update, but identical content needs no upload at all
+        skipped = [TargetResult(p, True) for p in paths if self._uploaded.get(p, None) == digest]
+        targets = [
+            Target(
+                url,
+                {
+                    "Authorization": self.user_token,
+                    "User-Agent": "ZLabel/1.0.0",
+                    "Content-Type": "text/plain",
+                    "File-Path": path,
+                },
+                path,
+            )
+            for path in paths
+            if self._uploaded.get(path, None) != digest
+        ]
+        quorum = len(paths) if self.upload_quorum <= 0 else min(self.upload_quorum, len(paths))
+        results = skipped
+        if targets:
+            outcome = self.uploader.upload(data, targets, max(1, quorum - len(skipped)))
+            for r in outcome.results:
+                if r.ok:
+                    self._uploaded[r.name] = digest
+                elif not r.pending:
+                    self.logger.error(f"Upload {filename} to {r.name} failed, {r.msg}")
+            results = skipped + outcome.results
+        return UploadOutcome(results, quorum)
 
-        headers = {
-            "Authorization": self.user_token,
-            "User-Agent": "ZLabel/1.0.0",
-            "Content-Type": "text/plain",
-            # "Content-Length": f"{length}",
-            "File-Path": "",
-        }
-        resp = None
-        msg = []
-        for path in [
-            f"/labelspace/{self.username}/{filename}",
-            f"/datasets/seeds_data/exported_pngs_label/{Path(filename).name}",
-        ]:
-            headers["File-Path"] = path
-            try:
-                resp = requests.put(url, data=data, headers=headers)
-                if resp.status_code == 200:
-                    if resp.json()["message"] == "success":
-                        msg.append("success")
-            except Exception as e:
-                self.logger.error(f"Upload file failed, {e=}, {resp=}")
-                msg.append(resp.text if resp else str(e))
-        return ", ".join(msg)
+    @staticmethod
+    def _alist_ok(resp: requests.Response) -> bool:
+        # alist answers 200 with the actual status in the body
+        return resp.status_code == 200 and resp.json().get("message") == "success"
 
     def get_anno_by_api(self, url: str, token: str | None = None):
         token = token or self.user_token
@@ -144,6 +199,25 @@ class SamApiHelper(object):
         self.headers = {
             "User-Agent": "ZLabel/1.0.0",
         }
+        # shared token, a 401 makes it log in again in the background
+        self.auth: AuthManager | None = None
+        self.hooks = {"response": self._on_response}
+        # earlier responses with their validators, repeat fetches are revalidated against them
+        self.image_store: DiskCache | None = None
+        self.anno_store: DiskCache | None = None
+        # several model servers to spread predictions over, see ModelRouter
+        self.router: ModelRouter | None = None
+        self.predict_timeout = (5, 60)
+        # duplicate predictions slower than this percentile of recent latencies, 0 to disable
+        self.hedge_percentile = 0.0
+        self._hedge_pool: ThreadPoolExecutor | None = None
+        # image downloads: chunk size, resumes after a dropped connection, (connect, read) timeout
+        self.chunk_size = 1024 * 1024
+        self.download_retries = 3
+        self.timeout = (10, 60)
+        # name -> download in progress, callers of the same name wait for it
+        self._downloads: Dict[str, Future] = {}
+        self._downloads_lock = threading.Lock()
 
     def predict_v0(
         self,
@@ -200,12 +274,91 @@ class SamApiHelper(object):
             "mode": mode,
             "image_name": image_name,
         }
-        url = f"{self.sam_api}/predict"
-        resp = requests.post(url, data=data)
-        if resp.status_code == 200:
-            return resp.json()
-        self.logger.warning(f"Predict Failed, {resp.text=}")
-        return {"anno_id": anno_id, "status": False, "msg": resp.text}
+        if self.router is None or len(self.router) == 0:
+            resp = requests.post(f"{self.sam_api}/predict", data=data)
+            if resp.status_code == 200:
+                return resp.json()
+            self.logger.warning(f"Predict Failed, {resp.text=}")
+            return {"anno_id": anno_id, "status": False, "msg": resp.text}
+
+        # fail over to the next best endpoint on connection errors and 5xx
+        tried: List[Endpoint] = []
+        msg = "no model server"
+        while (ep := self.router.choose(image_name, exclude=tried)) is not None:
+            tried.append(ep)
+            resp = self._predict_hedged(ep, data, tried)
+            if resp is None:
+                msg = f"{ep.url} failed"
+                continue
+            if resp.status_code == 200:
+                return resp.json()
+            msg = resp.text
+            break
+        self.logger.warning(f"Predict Failed, {msg=}")
+        return {"anno_id": anno_id, "status": False, "msg": msg}
+
+    def _send_predict(self, ep: Endpoint, data: Dict[str, Any]) -> requests.Response | None:
+        """One prediction request accounted in the router, None if ep failed"""
+        assert self.router is not None
+        self.router.begin(ep)
+        t0 = time.perf_counter()
+        try:
+            resp = requests.post(f"{ep.url}/predict", data=data, timeout=self.predict_timeout)
+        except requests.RequestException as e:
+            self.logger.warning(f"Predict on {ep.url} failed, {e=}")
+            self.router.end(ep, None)
+            return None
+        if resp.status_code >= 500:
+            self.router.end(ep, None)
+            return None
+        self.router.end(ep, time.perf_counter() - t0)
+        return resp
+
+    def _predict_hedged(
+        self, ep: Endpoint, data: Dict[str, Any], tried: List[Endpoint]
+    ) -> requests.Response | None:
+        """
+        Predict on ep. Past hedge_percentile of the recent latencies the same request
+        also goes to the next best endpoint, or over a second connection to ep, and the
+        first answer wins. A request in flight can't be interrupted, the loser is
+        abandoned and its answer dropped.
+        """
+        assert self.router is not None
+        delay = None
+        if self.hedge_percentile > 0:
+            delay = self.router.hedge_delay(self.hedge_percentile)
+        if delay is None:
+            self.router.record()
+            return self._send_predict(ep, data)
+
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(8, thread_name_prefix="hedge")
+        primary = self._hedge_pool.submit(self._send_predict, ep, data)
+        try:
+            resp = primary.result(timeout=delay)
+            self.router.record()
+            return resp
+        except FutureTimeout:
+            pass
+        other = self.router.choose(exclude=tried)
+        if other is None or not other.healthy:
+            other = ep
+        else:
+            tried.append(other)
+        hedge = self._hedge_pool.submit(self._send_predict, other, data)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                resp = f.result()
+                if resp is None:
+                    continue
+                self.router.record(hedged=True, won=f is hedge)
+                for loser in pending:
+                    loser.add_done_callback(lambda f: f.result() and f.result().close())
+                return resp
+        self.router.record(hedged=True)
+        return None
 
     def preupload_image(self, anno_id: str, image: Image.Image):
         img = BytesIO()
@@ -219,66 +372,491 @@ class SamApiHelper(object):
             print(f"Uploaded image Failed, {e=}")
 
     def login(self, username: str = "", password: str = "") -> str | None:
+        """With an AuthManager a valid token is reused and concurrent logins share one request"""
         if username:
             self.username = username
         if password:
             self.password = password
+        if self.auth is not None:
+            return self.auth.get()
+        result = self.request_token()
+        if result is None:
+            return None
+        self.set_token(result[0])
+        return self.user_token
+
+    def request_token(self) -> Tuple[str, float | None] | None:
+        """Log in, the token and its lifetime in seconds if the server tells it"""
         url = f"{self.sam_api}/login"
         resp = requests.post(
-            url, data={"username": self.username, "password": self.password}, headers=self.headers
+            url,
+            data={"username": self.username, "password": self.password},
+            headers={"User-Agent": self.headers["User-Agent"]},
         )
-        if resp.status_code == 200:
-            self.user_token = resp.json()["token"]
-            self.headers["Authorization"] = self.user_token
-            return self.user_token
-        else:
+        if resp.status_code != 200:
             self.logger.error(f"Login failed, {resp.text=}")
             return None
+        d = resp.json()
+        return d["token"], d.get("expires_in", None)
 
-    def get_image(self, name: str):
+    def set_token(self, token: str):
+        self.user_token = token
+        self.headers["Authorization"] = token
+
+    def set_auth(self, auth: AuthManager):
+        self.auth = auth
+        auth.listeners.append(self.set_token)
+        if token := auth.token:
+            self.set_token(token)
+
+    def _on_response(self, resp: requests.Response, *args, **kwargs):
+        """A 401 renews the token and sends the request again, once, with the new one"""
+        if resp.status_code != 401 or self.auth is None:
+            return resp
+        refused = resp.request.headers.get("Authorization", "")
+        self.auth.invalidate(refused)  # type: ignore
+        # the background login or one started here, shared with other refused requests
+        token = self.auth.get()
+        if not token or token == refused:
+            return resp
+        retry = resp.request.copy()
+        retry.headers["Authorization"] = token
+        # without this hook, a second 401 is returned as it is
+        retry.hooks = {"response": []}
+        with requests.Session() as s:
+            new = s.send(retry, **kwargs)
+        resp.close()
+        return new
+
+    def get_image_bytes(self, name: str) -> bytes | None:
+        path = self.download_image(name)
+        if path is None:
+            return None
+        data = path.read_bytes()
+        if self.image_store is None:
+            path.unlink(missing_ok=True)
+        return data
+
+    def download_image(self, name: str) -> Path | None:
+        """
+        Stream the image to a file and return its path, in the image store if there is one.
+
+        The download goes to ``partial/<md5>.part`` in chunks. A dropped connection is
+        resumed with a Range request, guarded by If-Range so a changed image starts
+        over, also across restarts. The stored copy is revalidated first, a 304 returns it.
+        Only one download of a name runs at a time, callers arriving meanwhile share it.
+        """
+        while True:
+            with self._downloads_lock:
+                flight = self._downloads.get(name, None)
+                leader = flight is None
+                if leader:
+                    flight = self._downloads[name] = Future()
+            if leader:
+                break
+            path = flight.result()
+            # without a store the file is the caller's to delete, download another one
+            if path is None or self.image_store is not None:
+                return path
+        path = None
+        try:
+            path = self._download_image(name)
+        finally:
+            with self._downloads_lock:
+                del self._downloads[name]
+            flight.set_result(path)
+        return path
+
+    def _download_image(self, name: str) -> Path | None:
         url = f"{self.sam_api}/get_image/{name}"
-        resp = requests.get(url, headers=self.headers)
-        if resp.status_code == 200:
-            return Image.open(BytesIO(resp.content))
+        store = self.image_store
+        headers = copy.deepcopy(self.headers)
+        cached = self._cached_path(store, name)
+        if cached is not None:
+            meta, path = cached
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+            if len(headers) == len(self.headers):
+                # no validators to revalidate with, images don't change under their name
+                return path
+
+        root = store.cache_dir if store is not None else Path(tempfile.gettempdir()) / "zlabel"
+        part = root / "partial" / f"{id_md5(name)}.part"
+        part_meta = part.with_name(f"{part.name}.json")
+        part.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            validators: Dict[str, Any] = json.loads(part_meta.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            validators = {}
+            part.unlink(missing_ok=True)
+
+        for attempt in range(self.download_retries + 1):
+            offset = part.stat().st_size if part.exists() else 0
+            h = dict(headers)
+            if_range = validators.get("etag", None) or validators.get("last_modified", None)
+            if offset > 0 and if_range:
+                h["Range"] = f"bytes={offset}-"
+                h["If-Range"] = if_range
+            try:
+                with requests.get(
+                    url, headers=h, stream=True, timeout=self.timeout, hooks=self.hooks
+                ) as resp:
+                    if resp.status_code == 304 and cached is not None:
+                        return cached[1]
+                    if resp.status_code == 206:
+                        mode = "ab"
+                    elif resp.status_code == 200:
+                        mode = "wb"
+                        validators = {
+                            "etag": resp.headers.get("ETag", None),
+                            "last_modified": resp.headers.get("Last-Modified", None),
+                            "sha256": resp.headers.get("X-Content-SHA256", None),
+                            "size": int(resp.headers.get("Content-Length", -1)),
+                        }
+                        part_meta.write_text(json.dumps(validators), encoding="utf-8")
+                    elif resp.status_code == 416:
+                        part.unlink(missing_ok=True)
+                        continue
+                    else:
+                        self.logger.error(f"Get image failed, {resp.text=}")
+                        return None
+                    with open(part, mode) as f:
+                        for chunk in resp.iter_content(self.chunk_size):
+                            f.write(chunk)
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                self.logger.warning(f"Download of {name=} interrupted, {attempt=}, {e=}")
+                continue
+            size = validators.get("size", -1)
+            if size < 0 or part.stat().st_size >= size:
+                break
+            self.logger.warning(f"Download of {name=} ended early, {attempt=}")
         else:
-            self.logger.error(f"Get image failed, {resp.text=}")
+            # the partial file stays for the next try
+            return None
+
+        digest = file_hash(part)
+        expected = validators.get("sha256", None)
+        part_meta.unlink(missing_ok=True)
+        if expected and expected != digest:
+            self.logger.error(f"Get image {name=} failed, content hash mismatch")
+            part.unlink(missing_ok=True)
+            return None
+        if store is None:
+            return part
+        meta = {
+            "etag": validators.get("etag", None),
+            "last_modified": validators.get("last_modified", None),
+            "sha256": digest,
+            "size": part.stat().st_size,
+        }
+        return store.put_file(name, part, meta)
+
+    def get_image(self, name: str):
+        data = self.get_image_bytes(name)
+        if data is None:
+            return None
+        return Image.open(BytesIO(data))
+
+    def get_thumbnail(self, name: str, size: int) -> Tuple[bytes, Tuple[int, int]] | None:
+        """
+        Downscaled image, at most size pixels a side, with the (height, width) of the
+        full image. None if the server has no thumbnails.
+        """
+        url = f"{self.sam_api}/get_thumbnail/{name}"
+        resp = requests.get(url, params={"size": size}, headers=self.headers, hooks=self.hooks)
+        if resp.status_code != 200:
+            if resp.status_code not in (404, 405):
+                self.logger.error(f"Get thumbnail failed, {resp.text=}")
             return None
+        try:
+            full = (int(resp.headers["X-Image-Height"]), int(resp.headers["X-Image-Width"]))
+        except (KeyError, ValueError):
+            self.logger.error(f"Thumbnail of {name=} without the full image size")
+            return None
+        return resp.content, full
 
     def get_zlabel(self, name: str):
         url = f"{self.sam_api}/get_zlabel/{name}"
-        resp = requests.get(url, headers=self.headers)
+        data = self._get_validated(url, name, self.anno_store, "anno")
+        if data is None:
+            return None
+        return data.decode("utf-8")
+
+    def get_zlabels(self, names: List[str]) -> Dict[str, str | None] | None:
+        """
+        Get the annotations of a whole page of tasks in one request.
+        Missing annotations map to None, servers without the batch endpoint
+        are served one by one.
+        The etags of cached copies are sent along, the server lists the unchanged
+        ones in "not_modified" instead of sending them again.
+        """
+        url = f"{self.sam_api}/get_zlabels"
+        cached = {name: self._cached(self.anno_store, name) for name in names}
+        etags = {name: c[0]["etag"] for name, c in cached.items() if c and c[0].get("etag")}
+        try:
+            resp = requests.post(
+                url, json={"names": names, "etags": etags}, headers=self.headers, hooks=self.hooks
+            )
+        except Exception as e:
+            self.logger.error(f"Get annos failed, {e=}")
+            return None
         if resp.status_code == 200:
-            return resp.text
+            d = resp.json()
+            zlabels: Dict[str, str | None] = dict(d["zlabels"])
+            for name in d.get("not_modified", []):
+                c = cached.get(name, None)
+                if c is not None:
+                    zlabels[name] = c[1].decode("utf-8")
+            if self.anno_store is not None:
+                # etags of the annotations sent in this response
+                for name, etag in d.get("etags", {}).items():
+                    text = d["zlabels"].get(name, None)
+                    if text is None:
+                        continue
+                    data = text.encode("utf-8")
+                    self.anno_store.put(name, data, {"etag": etag, "sha256": content_hash(data)})
+            return {name: zlabels.get(name, None) for name in names}
+        elif resp.status_code in (404, 405):
+            return {name: self.get_zlabel(name) for name in names}
         else:
-            self.logger.error(f"Get anno failed, {resp.text=}")
+            self.logger.error(f"Get annos failed, {resp.text=}")
+            return None
+
+    @staticmethod
+    def _cached(store: DiskCache | None, name: str) -> Tuple[Dict[str, Any], bytes] | None:
+        """Validators and bytes of a stored response, if the bytes still match their hash"""
+        if store is None:
+            return None
+        meta = store.get_meta(name)
+        if meta is None:
+            return None
+        data = store.get(name)
+        if data is None or content_hash(data) != meta.get("sha256", None):
             return None
+        return meta, data
+
+    @staticmethod
+    def _cached_path(store: DiskCache | None, name: str) -> Tuple[Dict[str, Any], Path] | None:
+        """
+        Validators and path of a stored file, if it still has the size it was stored with.
+        Its hash was checked when it arrived, reading it all again on every use is too slow.
+        """
+        if store is None:
+            return None
+        meta = store.get_meta(name)
+        if meta is None:
+            return None
+        path = store.get_path(name)
+        if path is None or path.stat().st_size != meta.get("size", None):
+            return None
+        return meta, path
+
+    def _get_validated(
+        self, url: str, name: str, store: DiskCache | None, what: str
+    ) -> bytes | None:
+        """
+        GET with If-None-Match / If-Modified-Since from the stored copy of name,
+        a 304 reuses the stored bytes. Bodies are checked against X-Content-SHA256
+        when the server sends it.
+        """
+        headers = copy.deepcopy(self.headers)
+        cached = self._cached(store, name)
+        if cached is not None:
+            meta, _ = cached
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        resp = requests.get(url, headers=headers, hooks=self.hooks)
+        if resp.status_code == 304 and cached is not None:
+            return cached[1]
+        if resp.status_code != 200:
+            self.logger.error(f"Get {what} failed, {resp.text=}")
+            return None
+        data = resp.content
+        digest = content_hash(data)
+        expected = resp.headers.get("X-Content-SHA256", None)
+        if expected and expected != digest:
+            self.logger.error(f"Get {what} {name=} failed, content hash mismatch")
+            return None
+        if store is not None:
+            meta = {
+                "etag": resp.headers.get("ETag", None),
+                "last_modified": resp.headers.get("Last-Modified", None),
+                "sha256": digest,
+            }
+            store.put(name, data, meta)
+        return data
 
     def get_tasks(self, num: int = 50, finished: int = 1):
         """
             finished: -1: all, 0: unfinished, 1: finished
         """
         url = f"{self.sam_api}/get_tasks?num={num}&finished={finished}"
-        resp = requests.get(url, headers=self.headers)
+        resp = requests.get(url, headers=self.headers, hooks=self.hooks)
         if resp.status_code == 200:
             return resp.json()
         else:
             self.logger.error(f"Get tasks failed, {resp.text=}")
 
+    def iter_tasks(
+        self,
+        num: int = 0,
+        finished: int = 1,
+        page_size: int = 1000,
+        meta: Dict[str, Any] | None = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream tasks page by page, following the server's cursor.
+            num: max number of tasks, 0 for all
+            finished: -1: all, 0: unfinished, 1: finished
+            meta: filled with the trailer of the last page, e.g. the server's sync_cursor
+
+        Each page is NDJSON, one task per line and a trailing {"next_cursor": ...}.
+        Servers answering with a plain json list are read in one go.
+        """
+        params: Dict[str, Any] = {
+            # older servers ignore everything but num and finished
+            "num": num if num > 0 else 0x3F3F3F,
+            "finished": finished,
+            "stream": 1,
+            "page_size": page_size,
+        }
+        count = 0
+        for t in self._iter_pages(f"{self.sam_api}/get_tasks", params, meta):
+            yield t
+            count += 1
+            if 0 < num <= count:
+                return
+
+    def iter_task_changes(
+        self,
+        since: str,
+        finished: int = 1,
+        page_size: int = 1000,
+        meta: Dict[str, Any] | None = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the tasks created, changed or finished since the sync cursor `since`:
+            {"op": "upsert", "task": {...}}
+            {"op": "remove", "anno_id": ...}, the task is gone or no longer matches `finished`
+        meta["sync_cursor"] is the cursor to pass next time.
+        Raises SyncUnavailable if the server can't serve changes since that cursor.
+        """
+        params: Dict[str, Any] = {
+            "since": since,
+            "finished": finished,
+            "page_size": page_size,
+        }
+        url = f"{self.sam_api}/get_task_changes"
+        yield from self._iter_pages(url, params, meta, unavailable=(404, 405, 410))
+
+    def _iter_pages(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        meta: Dict[str, Any] | None,
+        unavailable: Tuple[int, ...] = (),
+    ) -> Iterator[Dict[str, Any]]:
+        headers = copy.deepcopy(self.headers)
+        headers["Accept"] = "application/x-ndjson"
+        cursor: str | None = None
+        while True:
+            if cursor is not None:
+                params["cursor"] = cursor
+            with requests.get(
+                url, params=params, headers=headers, stream=True, hooks=self.hooks
+            ) as resp:
+                if resp.status_code in unavailable:
+                    raise SyncUnavailable(f"{url} answered {resp.status_code}")
+                if resp.status_code != 200:
+                    self.logger.error(f"Get {url} failed, {resp.text=}")
+                    raise RuntimeError(f"Get {url} failed, {resp.status_code=}")
+                if "ndjson" not in resp.headers.get("Content-Type", ""):
+                    for t in resp.json():
+                        yield t
+                    return
+                cursor = None
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    d = json.loads(line)
+                    if "next_cursor" in d:
+                        cursor = d["next_cursor"]
+                        if meta is not None:
+                            meta.update(d)
+                        continue
+                    yield d
+            if not cursor:
+                return
+
     def save_zlabel(self, filename: str):
+        data = read_anno_json(filename).encode("utf-8")
+        ok, _ = self.save_zlabel_rev(filename, data)
+        return ok or None
+
+    def save_zlabel_rev(self, filename: str, data: bytes) -> Tuple[bool, int | None]:
+        """
+        Upload the whole annotation, returns (success, revision acknowledged by the server)
+        """
         url = f"{self.sam_api}/save_zlabel"
-        fs = open(filename, "r", encoding="utf-8")
-        data = fs.read().encode("utf-8")
-        fs.close()
         form = {
             "username": self.username,
             "zlabel": data,
             "filename": filename,
         }
-        resp = requests.put(url, data=form, headers=self.headers)
+        resp = requests.put(url, data=form, headers=self.headers, hooks=self.hooks)
         if resp.status_code == 200:
             self.logger.info(resp.text)
             d = resp.json()
             if d[0]["status"]:
-                return True
+                return True, d[0].get("rev", None)
         else:
             self.logger.error(f"Save anno failed, {resp.text=}")
+        return False, None
+
+    def patch_zlabel(
+        self, filename: str, base_rev: int, patch: Dict[str, Any]
+    ) -> Tuple[bool, int | None]:
+        """
+        Upload only the changed results against base_rev, returns (success, new revision).
+        Fails if the server is at another revision or has no patch endpoint.
+        """
+        url = f"{self.sam_api}/patch_zlabel"
+        body = {
+            "username": self.username,
+            "filename": filename,
+            "base_rev": base_rev,
+            "patch": patch,
+        }
+        resp = requests.put(url, json=body, headers=self.headers, hooks=self.hooks)
+        if resp.status_code == 200:
+            d = resp.json()
+            if d["status"]:
+                return True, d.get("rev", None)
+        elif resp.status_code == 409:
+            self.logger.warning(f"Patch conflict, {resp.text=}")
+        elif resp.status_code not in (404, 405):
+            self.logger.error(f"Patch anno failed, {resp.text=}")
+        return False, None
+
+    def save_zlabels(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]] | None:
+        """
+        Upload several annotations in one request.
+        items: {"filename", "zlabel"} for full uploads, {"filename", "base_rev", "patch"} for patches
+        Returns one {"status", "rev"} per item, None if the server has no batch endpoint.
+        """
+        url = f"{self.sam_api}/save_zlabels"
+        body = {"username": self.username, "items": items}
+        resp = requests.put(url, json=body, headers=self.headers, hooks=self.hooks)
+        if resp.status_code == 200:
+            return resp.json()["results"]
+        if resp.status_code in (404, 405):
+            return None
+        raise RuntimeError(f"Save annos failed, {resp.status_code=}, {resp.text=}")
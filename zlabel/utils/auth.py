@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from zlabel.utils.logger import ZLogger
+
+
+class AuthManager(object):
+    """The session token shared by every worker.
+
+    The token is persisted, so a restart reuses it instead of logging in. Only one
+    login runs at a time, callers arriving meanwhile wait for its result. A background
+    thread renews the token ``refresh_margin`` of its lifetime before it expires, so
+    requests find a valid one instead of waiting on a login.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Tuple[str, float | None] | None],
+        path: str | None = None,
+        key: str = "",
+        default_ttl: float = 12 * 3600,
+        refresh_margin: float = 0.2,
+        login_timeout: float = 30.0,
+    ) -> None:
+        """
+        fetch: logs in, returns the token and its lifetime in seconds (None if unknown),
+            or None if the login failed
+        key: e.g. server and user name, a persisted token of another key is not reused
+        """
+        self.logger = ZLogger("AuthManager")
+        self.fetch = fetch
+        self.path = Path(path) if path else None
+        self.key = key
+        self.default_ttl = default_ttl
+        self.refresh_margin = refresh_margin
+        self.login_timeout = login_timeout
+        # called with every new token
+        self.listeners: List[Callable[[str], None]] = []
+        self.logins = 0
+
+        self._cond = threading.Condition()
+        self._token = ""
+        self._issued_at = 0.0
+        self._expires_at = 0.0
+        self._logging_in = False
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._load()
+
+    @property
+    def token(self) -> str:
+        """The current token, empty if there is none or it expired"""
+        with self._cond:
+            return self._token if time.time() < self._expires_at else ""
+
+    @property
+    def refresh_at(self) -> float:
+        with self._cond:
+            return self._expires_at - self.refresh_margin * (self._expires_at - self._issued_at)
+
+    def get(self) -> str | None:
+        """A valid token, logging in only if there is none"""
+        token = self.token
+        return token if token else self.login()
+
+    def login(self) -> str | None:
+        """Log in, or wait for the login already running and share its result"""
+        with self._cond:
+            if self._logging_in:
+                self._cond.wait_for(lambda: not self._logging_in, self.login_timeout)
+                return self._token or None
+            self._logging_in = True
+        try:
+            result = self.fetch()
+        except Exception as e:
+            self.logger.error(f"Login failed, {e=}")
+            result = None
+        with self._cond:
+            self._logging_in = False
+            self.logins += 1
+            if result is not None:
+                token, ttl = result
+                self._token = token
+                self._issued_at = time.time()
+                self._expires_at = self._issued_at + (ttl or self.default_ttl)
+            self._cond.notify_all()
+        if result is None:
+            return None
+        self._save()
+        for listener in self.listeners:
+            listener(result[0])
+        self._wake.set()
+        return result[0]
+
+    def invalidate(self, token: str):
+        """The server refused token, a new one is fetched in the background"""
+        with self._cond:
+            if not token or token != self._token:
+                return
+            self._token = ""
+            self._expires_at = 0.0
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+        self.logger.info("Token refused, logging in again")
+        self._wake.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name="AuthManager", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+
+    def _run(self, stop: threading.Event):
+        retry = 5.0
+        while not stop.is_set():
+            if self._expires_at > 0:
+                delay = max(0.0, self.refresh_at - time.time())
+            else:
+                # nothing to renew before the first login, unless it was invalidated
+                delay = None if not self.logins else 0.0
+            self._wake.wait(delay)
+            self._wake.clear()
+            if stop.is_set():
+                break
+            if self._expires_at > 0 and time.time() < self.refresh_at:
+                continue
+            if self.login() is None:
+                stop.wait(retry)
+                retry = min(retry * 2, 300.0)
+            else:
+                retry = 5.0
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            d = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            self.logger.warning(f"Read token {self.path} failed, {e=}")
+            return
+        if d.get("key") != self.key or time.time() >= d.get("expires_at", 0):
+            return
+        self._token = d["token"]
+        self._issued_at = d["issued_at"]
+        self._expires_at = d["expires_at"]
+
+    def _save(self):
+        if self.path is None:
+            return
+        with self._cond:
+            d = {
+                "key": self.key,
+                "token": self._token,
+                "issued_at": self._issued_at,
+                "expires_at": self._expires_at,
+            }
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(d, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.logger.warning(f"Write token {self.path} failed, {e=}")
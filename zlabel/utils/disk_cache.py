@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict
+
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.project import id_md5
+
+
+class DiskCache(object):
+    """Bytes under ``cache_dir``, bounded by ``max_bytes``, least recently used evicted first.
+
+    An entry may carry a small json sidecar (``<file>.meta``), e.g. the http
+    validators of the response it came from. It goes away with the entry.
+    """
+
+    META_SUFFIX = ".meta"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2048 * 1024 * 1024) -> None:
+        self.logger = ZLogger("DiskCache")
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # file name -> size, oldest first
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._nbytes = 0
+        self._scan()
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def path(self, name: str) -> Path:
+        return self.cache_dir / f"{id_md5(name)}{Path(name).suffix}"
+
+    def meta_path(self, name: str) -> Path:
+        path = self.path(name)
+        return path.with_name(f"{path.name}{self.META_SUFFIX}")
+
+    def contains(self, name: str) -> bool:
+        with self._lock:
+            return self.path(name).name in self._files
+
+    def get(self, name: str) -> bytes | None:
+        path = self.get_path(name)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except OSError as e:
+            self.logger.warning(f"Read cached {name=} failed, {e=}")
+            self.remove(name)
+            return None
+
+    def get_path(self, name: str) -> Path | None:
+        """Path of the entry, marked as used, for readers that don't need the bytes in memory"""
+        path = self.path(name)
+        with self._lock:
+            if path.name not in self._files:
+                return None
+            self._files.move_to_end(path.name)
+        try:
+            os.utime(path)
+        except OSError as e:
+            self.logger.warning(f"Touch cached {name=} failed, {e=}")
+            self.remove(name)
+            return None
+        return path
+
+    def put(self, name: str, data: bytes, meta: Dict[str, Any] | None = None):
+        if len(data) > self.max_bytes:
+            return
+        path = self.path(name)
+        tmp = path.with_name(f"{path.name}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            self.logger.warning(f"Write cache of {name=} failed, {e=}")
+            return
+        # a sidecar left from other bytes is harmless, it carries their hash
+        if meta is not None:
+            self.put_meta(name, meta)
+        with self._lock:
+            self._nbytes -= self._files.pop(path.name, 0)
+            self._files[path.name] = len(data)
+            self._nbytes += len(data)
+        self._evict()
+
+    def put_file(self, name: str, src: Path, meta: Dict[str, Any] | None = None) -> Path | None:
+        """Move a finished file into the cache, src must be on the same filesystem"""
+        path = self.path(name)
+        try:
+            size = src.stat().st_size
+            if size > self.max_bytes:
+                return None
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            os.replace(src, path)
+        except OSError as e:
+            self.logger.warning(f"Move {src} into cache as {name=} failed, {e=}")
+            return None
+        if meta is not None:
+            self.put_meta(name, meta)
+        with self._lock:
+            self._nbytes -= self._files.pop(path.name, 0)
+            self._files[path.name] = size
+            self._nbytes += size
+        self._evict()
+        return path if path.exists() else None
+
+    def get_meta(self, name: str) -> Dict[str, Any] | None:
+        try:
+            return json.loads(self.meta_path(name).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Read meta of {name=} failed, {e=}")
+            return None
+
+    def put_meta(self, name: str, meta: Dict[str, Any]):
+        path = self.meta_path(name)
+        tmp = path.with_name(f"{path.name}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            self.logger.warning(f"Write meta of {name=} failed, {e=}")
+
+    def remove(self, name: str):
+        path = self.path(name)
+        with self._lock:
+            self._nbytes -= self._files.pop(path.name, 0)
+        path.unlink(missing_ok=True)
+        self.meta_path(name).unlink(missing_ok=True)
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            while self._nbytes > self.max_bytes and self._files:
+                fname, size = self._files.popitem(last=False)
+                self._nbytes -= size
+                evicted.append(fname)
+        for fname in evicted:
+            (self.cache_dir / fname).unlink(missing_ok=True)
+            (self.cache_dir / f"{fname}{self.META_SUFFIX}").unlink(missing_ok=True)
+
+    def _scan(self):
+        if not self.cache_dir.exists():
+            return
+        files = []
+        metas = []
+        for p in self.cache_dir.iterdir():
+            if not p.is_file():
+                continue
+            if p.name.endswith(".tmp"):
+                p.unlink(missing_ok=True)
+                continue
+            if p.name.endswith(self.META_SUFFIX):
+                metas.append(p)
+                continue
+            st = p.stat()
+            files.append((st.st_mtime, p.name, st.st_size))
+        for _, fname, size in sorted(files):
+            self._files[fname] = size
+            self._nbytes += size
+        for p in metas:
+            if p.name[: -len(self.META_SUFFIX)] not in self._files:
+                p.unlink(missing_ok=True)
+        self._evict()
@@ -60,9 +60,22 @@ class SettingsKey(Enum):
     COLOR = "global/color"
     FETCH_FINISHED = "global/fetchfinished"
     FETCH_NUM = "global/fetchnum"
+    CACHE_MEMORY_MB = "global/cachememorymb"
+    CACHE_DISK_MB = "global/cachediskmb"
+    PREFETCH_RADIUS = "global/prefetchradius"
+    PREFETCH_THREADS = "global/prefetchthreads"
+    PREFETCH_BUDGET_MB = "global/prefetchbudgetmb"
+    ANNO_PAGE_SIZE = "global/annopagesize"
+    UPLOAD_BATCH_SIZE = "global/uploadbatchsize"
+    TASKS_PAGE_SIZE = "global/taskspagesize"
+    PREVIEW_SIZE = "global/previewsize"
+    HEDGE_PERCENTILE = "global/hedgepercentile"
+    ANNO_MEMORY_MB = "global/annomemorymb"
+    PROJECT_BACKEND = "global/projectbackend"
 
     TASKS = "project/tasks"
     PROJ_NAME = "project/name"
     PROJ_DESCRIP = "project/description"
     PROJ_SAM = "project/samEnabled"
     PROJ_CV = "project/cvEnabled"
+    PROJ_ANNO_FORMAT = "project/annoFormat"
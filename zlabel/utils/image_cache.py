@@ -0,0 +1,150 @@
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+from zlabel.models.lru_cache import SizedLruCache
+from zlabel.utils.disk_cache import DiskCache
+from zlabel.utils.logger import ZLogger
+
+
+@dataclass
+class CacheStats(object):
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ImageCache(object):
+    """Two-tier image cache.
+
+    memory: LRU of decoded arrays, bounded by ``max_memory_bytes``
+    disk: original encoded bytes under ``cache_dir``, bounded by ``max_disk_bytes``
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_memory_bytes: int = 512 * 1024 * 1024,
+        max_disk_bytes: int = 2048 * 1024 * 1024,
+    ) -> None:
+        self.logger = ZLogger("ImageCache")
+        self.memory = SizedLruCache(max_memory_bytes)
+        self.disk = DiskCache(cache_dir, max_disk_bytes)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def decode(data: bytes) -> NDArray[np.uint8]:
+        return np.asarray(Image.open(BytesIO(data)), dtype=np.uint8)
+
+    @staticmethod
+    def decode_file(path: str | Path) -> NDArray[np.uint8]:
+        """
+        Decode straight from the file. Opened by path, PIL memory-maps uncompressed
+        images instead of reading them, so the peak is about the decoded size.
+        """
+        with Image.open(path) as image:
+            return np.asarray(image, dtype=np.uint8)
+
+    @staticmethod
+    def decode_preview(data: bytes, size: int) -> Tuple[NDArray[np.uint8], Tuple[int, int]] | None:
+        """
+        Downscaled decode of a JPEG, at most size pixels a side, with the (height, width)
+        of the full image. None for other formats, they don't decode any faster downscaled.
+        """
+        image = Image.open(BytesIO(data))
+        if image.format != "JPEG":
+            return None
+        full = (image.height, image.width)
+        # the decoder skips to 1/2, 1/4 or 1/8 scale instead of decoding every pixel
+        image.draft(image.mode, (size, size))
+        image.thumbnail((size, size))
+        return np.asarray(image, dtype=np.uint8), full
+
+    @property
+    def cache_dir(self):
+        return self.disk.cache_dir
+
+    @property
+    def max_disk_bytes(self):
+        return self.disk.max_bytes
+
+    @property
+    def memory_bytes(self):
+        return self.memory.nbytes
+
+    @property
+    def disk_bytes(self):
+        return self.disk.nbytes
+
+    def disk_path(self, name: str) -> Path:
+        return self.disk.path(name)
+
+    def peek(self, name: str, count_hit: bool = False) -> NDArray[np.uint8] | None:
+        """
+        Memory tier only, does not touch the statistics unless count_hit, then a hit counts
+        and a miss is left to the ``get`` that follows.
+        """
+        image = self.memory.get(name)
+        if image is not None and count_hit:
+            self._count("memory_hits")
+        return image
+
+    def get(self, name: str) -> NDArray[np.uint8] | None:
+        """
+        Memory tier, then the disk tier as it is: images don't change under their name,
+        so a stored copy is not revalidated.
+        """
+        image = self.memory.get(name)
+        if image is not None:
+            self._count("memory_hits")
+            return image
+        path = self.disk.get_path(name)
+        if path is not None:
+            try:
+                image = self.decode_file(path)
+            except Exception as e:
+                self.logger.warning(f"Decode cached {name=} failed, dropping it, {e=}")
+                self.remove(name)
+            else:
+                self.memory.put(name, image)
+                self._count("disk_hits")
+                return image
+        self._count("misses")
+        return None
+
+    def get_bytes(self, name: str) -> bytes | None:
+        return self.disk.get(name)
+
+    def put(self, name: str, data: bytes) -> NDArray[np.uint8]:
+        """Store the encoded bytes on disk and the decoded array in memory"""
+        image = self.decode(data)
+        self.memory.put(name, image)
+        self.put_bytes(name, data)
+        return image
+
+    def put_bytes(self, name: str, data: bytes):
+        self.disk.put(name, data)
+
+    def remove(self, name: str):
+        self.memory.pop(name)
+        self.disk.remove(name)
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
@@ -0,0 +1,110 @@
+import json
+import re
+from typing import Any, Iterator, TextIO
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonStream(object):
+    """Read a json document value by value, holding a chunk of it instead of all of it.
+
+    ``items`` walks an object and ``elements`` an array without decoding them as a whole,
+    so a member can be decoded with ``value`` or walked in turn. Each value is decoded by
+    ``json``'s C scanner, only the largest single value has to fit in memory.
+
+        for key in stream.items():
+            if key == "tasks":
+                for anno_id in stream.items():
+                    task = stream.value()
+            else:
+                meta[key] = stream.value()
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = 64 * 1024) -> None:
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        # the C scanner behind JSONDecoder.raw_decode, without its checks
+        self._scan = json.JSONDecoder().scan_once
+
+    def value(self) -> Any:
+        """Decode the value at the current position"""
+        self._peek()
+        size = self._chunk_size
+        while True:
+            try:
+                v, end = self._scan(self._buf, self._pos)
+                # a number may go on in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return v
+            except StopIteration:
+                if self._eof:
+                    raise json.JSONDecodeError("Expecting value", self._buf, self._pos) from None
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # grow the reads, a large value is decoded again after each one
+            self._read(size)
+            size *= 2
+
+    def items(self) -> Iterator[str]:
+        """Keys of the object at the current position, read each value before the next key"""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key, got {key!r}")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def elements(self) -> Iterator[int]:
+        """Indexes of the array at the current position, read each element before the next"""
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        i = 0
+        while True:
+            yield i
+            i += 1
+            if self._expect(",]") == "]":
+                return
+
+    def _read(self, size: int) -> bool:
+        if self._eof:
+            return False
+        # drop what was decoded, the buffer holds about one chunk besides the current value
+        self._buf = self._buf[self._pos :]
+        self._pos = 0
+        data = self._f.read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data
+        return True
+
+    def _peek(self) -> str:
+        """Next character that isn't whitespace, empty at the end"""
+        if self._pos < len(self._buf) and self._buf[self._pos] not in " \t\n\r":
+            return self._buf[self._pos]
+        while True:
+            self._pos = WHITESPACE.match(self._buf, self._pos).end()  # type: ignore[union-attr]
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read(self._chunk_size):
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if not c or c not in chars:
+            raise ValueError(f"Expected one of {chars!r}, got {c or 'the end'!r}")
+        self._pos += 1
+        return c
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Sequence
+
+import requests
+
+from zlabel.models.lru_cache import LruCache
+from zlabel.utils.logger import ZLogger
+
+
+@dataclass(eq=False)
+class Endpoint(object):
+    url: str
+    healthy: bool = True
+    # requests sent and not answered yet
+    outstanding: int = 0
+    # moving average of the latency in seconds, None until the first answer
+    latency: float | None = None
+    served: int = 0
+    failures: int = 0
+    down_since: float = 0.0
+
+    @property
+    def score(self) -> float:
+        # untried endpoints go first, so every endpoint gets measured
+        return (self.latency or 0.0) * (1 + self.outstanding)
+
+
+@dataclass
+class HedgeStats(object):
+    requests: int = 0
+    # requests duplicated to a second endpoint because the first one was slow
+    hedged: int = 0
+    # hedged requests the duplicate answered first
+    wins: int = 0
+
+    @property
+    def win_rate(self):
+        return self.wins / self.hedged if self.hedged else 0.0
+
+
+class ModelRouter(object):
+    """Picks the model server for each prediction.
+
+    The endpoint with the lowest ``latency * (1 + outstanding)`` wins, endpoints that
+    failed are skipped until a health check finds them up again. An image stays pinned
+    to the endpoint that served it while that one is healthy, so its embedding stays
+    cached on one server instead of being computed on all of them.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        alpha: float = 0.3,
+        pin_size: int = 4096,
+        health_interval: float = 10.0,
+        health_timeout: float = 2.0,
+    ) -> None:
+        self.logger = ZLogger("ModelRouter")
+        self.endpoints = [Endpoint(url.rstrip("/")) for url in urls]
+        self.alpha = alpha
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        # image name -> url
+        self.pins = LruCache(pin_size)
+        # recent latencies of all endpoints, for the hedging delay
+        self.latencies: Deque[float] = deque(maxlen=256)
+        self.hedge_stats = HedgeStats()
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def choose(self, image_name: str = "", exclude: Sequence[Endpoint] = ()) -> Endpoint | None:
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep not in exclude]
+            if not candidates:
+                return None
+            pinned = self.pins.get(image_name) if image_name else None
+            for ep in candidates:
+                if ep.url == pinned and ep.healthy:
+                    return ep
+            healthy = [ep for ep in candidates if ep.healthy]
+            if healthy:
+                ep = min(healthy, key=lambda ep: ep.score)
+            else:
+                # all of them failed, the one down the longest is the most likely back
+                ep = min(candidates, key=lambda ep: ep.down_since)
+            if image_name:
+                self.pins.put(image_name, ep.url)
+            return ep
+
+    def begin(self, ep: Endpoint):
+        with self._lock:
+            ep.outstanding += 1
+
+    def end(self, ep: Endpoint, latency: float | None):
+        """latency: seconds until the answer, None if the request failed"""
+        with self._lock:
+            ep.outstanding = max(0, ep.outstanding - 1)
+            if latency is None:
+                ep.failures += 1
+                if ep.healthy:
+                    ep.healthy = False
+                    ep.down_since = time.time()
+                    self.logger.warning(f"{ep.url} is down, failing over")
+                return
+            ep.served += 1
+            ep.healthy = True
+            self.latencies.append(latency)
+            if ep.latency is None:
+                ep.latency = latency
+            else:
+                ep.latency = self.alpha * latency + (1 - self.alpha) * ep.latency
+
+    def hedge_delay(self, percentile: float, min_samples: int = 20) -> float | None:
+        """The given percentile of recent latencies, None until there are enough of them"""
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            latencies = sorted(self.latencies)
+        i = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[i]
+
+    def record(self, hedged: bool = False, won: bool = False):
+        with self._lock:
+            self.hedge_stats.requests += 1
+            self.hedge_stats.hedged += hedged
+            self.hedge_stats.wins += won
+
+    def check(self, ep: Endpoint) -> bool:
+        """Any http answer means the server is up, servers without /health answer 404"""
+        try:
+            requests.get(f"{ep.url}/health", timeout=self.health_timeout)
+            up = True
+        except requests.RequestException:
+            up = False
+        with self._lock:
+            if up and not ep.healthy:
+                self.logger.info(f"{ep.url} is up again")
+            elif not up and ep.healthy:
+                ep.down_since = time.time()
+            ep.healthy = up
+        return up
+
+    def check_all(self) -> List[bool]:
+        return [self.check(ep) for ep in self.endpoints]
+
+    def start(self):
+        """Health check the endpoints in the background, pointless with a single one"""
+        if self._thread is not None or len(self.endpoints) < 2:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name="ModelRouter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(self.health_interval):
+            self.check_all()
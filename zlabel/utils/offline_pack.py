@@ -0,0 +1,221 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, List, Tuple
+
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.project import Annotation, Task
+
+if TYPE_CHECKING:
+    from zlabel.utils.api_helper import SamApiHelper
+
+
+MAGIC = b"ZLPACK01"
+# offset and size of the index, magic
+TRAILER = struct.Struct("<QQ8s")
+
+
+class PackWriter(object):
+    """Appends entries to a new pack, the index is written on ``close``"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, Tuple[int, int, str]] = {}
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(MAGIC)
+
+    def add(self, key: str, data: bytes):
+        offset = self._file.tell()
+        self._file.write(data)
+        self.entries[key] = (offset, len(data), hashlib.sha256(data).hexdigest())
+
+    def add_file(self, key: str, src: Path, chunk_size: int = 1024 * 1024):
+        offset = self._file.tell()
+        h = hashlib.sha256()
+        with open(src, "rb") as f:
+            while chunk := f.read(chunk_size):
+                h.update(chunk)
+                self._file.write(chunk)
+        self.entries[key] = (offset, self._file.tell() - offset, h.hexdigest())
+
+    def close(self, meta: Dict):
+        index = json.dumps({**meta, "entries": self.entries}).encode("utf-8")
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(TRAILER.pack(offset, len(index), MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class OfflinePack(object):
+    """Images and ``.zlabel`` files of a batch of tasks in one file, to label without network.
+
+    Layout: ``MAGIC``, the entries back to back, a json index and a fixed size trailer
+    pointing at it. The file is mmapped and an entry is read with a single slice, there
+    is no per file lookup or open.
+    """
+
+    SUFFIX = ".zpack"
+
+    def __init__(self, path: str | Path) -> None:
+        self.logger = ZLogger("OfflinePack")
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            offset, size, magic = TRAILER.unpack_from(self._mm, len(self._mm) - TRAILER.size)
+            if magic != MAGIC or self._mm[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not an offline pack")
+            index = json.loads(self._mm[offset : offset + size])
+        except Exception:
+            self._file.close()
+            raise
+        self.tasks = [Task.model_validate(t) for t in index["tasks"]]
+        self.suffix: str = index["suffix"]
+        # anno ids without an annotation on the server when the pack was built
+        self.missing: List[str] = index["missing"]
+        self._entries: Dict[str, List] = index["entries"]
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+        offset, size, _ = entry
+        return self._mm[offset : offset + size]
+
+    def has_image(self, filename: str) -> bool:
+        return f"image/{filename}" in self._entries
+
+    def image(self, filename: str) -> bytes | None:
+        return self.get(f"image/{filename}")
+
+    def has_zlabel(self, anno_id: str) -> bool:
+        return f"zlabel/{anno_id}" in self._entries
+
+    def zlabel(self, anno_id: str) -> str | None:
+        data = self.get(f"zlabel/{anno_id}")
+        return data.decode("utf-8") if data is not None else None
+
+    def annotation(self, anno_id: str) -> Annotation | None:
+        text = self.zlabel(anno_id)
+        if text is None:
+            return None
+        try:
+            return Annotation.model_validate_json(text)
+        except Exception as e:
+            self.logger.warning(f"Validate packed {anno_id=} failed, {e=}")
+            return None
+
+    def verify(self) -> List[str]:
+        """Keys of the entries whose bytes don't match their hash"""
+        bad = []
+        for key, (offset, size, sha256) in self._entries.items():
+            if hashlib.sha256(self._mm[offset : offset + size]).hexdigest() != sha256:
+                bad.append(key)
+        return bad
+
+    @classmethod
+    def build(
+        cls,
+        path: str | Path,
+        api: "SamApiHelper",
+        tasks: List[Task],
+        suffix: str = "zlabel",
+        threads: int = 8,
+        page_size: int = 50,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> Tuple["OfflinePack", List[Task]]:
+        """
+        Download the images and annotations of tasks in parallel into a new pack at path,
+        replacing an existing one only once it is complete.
+        Returns the pack and the tasks whose image could not be downloaded, they are left out.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        writer = PackWriter(tmp)
+        names = [f"{task.anno_id}.{suffix}" for task in tasks]
+        done, total = 0, len(tasks) + len(names)
+        packed: List[Task] = []
+        failed: List[Task] = []
+        missing: List[str] = []
+        try:
+            with ThreadPoolExecutor(max(1, threads)) as pool:
+                futures = {pool.submit(api.download_image, task.filename): task for task in tasks}
+                for i in range(0, len(names), page_size):
+                    futures[pool.submit(api.get_zlabels, names[i : i + page_size])] = i
+                for fut in as_completed(futures):
+                    what = futures[fut]
+                    if isinstance(what, Task):
+                        done += 1
+                        if cls._add_image(writer, api, what, fut):
+                            packed.append(what)
+                        else:
+                            failed.append(what)
+                    else:
+                        page = names[what : what + page_size]
+                        done += len(page)
+                        zlabels = fut.result()
+                        if zlabels is None:
+                            raise RuntimeError("Get annos failed")
+                        for name, text in zlabels.items():
+                            anno_id = name[: -len(suffix) - 1]
+                            if text is None:
+                                missing.append(anno_id)
+                            else:
+                                writer.add(f"zlabel/{anno_id}", text.encode("utf-8"))
+                    if progress is not None:
+                        progress(done, total)
+            order = {task.anno_id: i for i, task in enumerate(tasks)}
+            packed.sort(key=lambda task: order[task.anno_id])
+            writer.close(
+                {
+                    "suffix": suffix,
+                    "tasks": [task.model_dump(mode="json") for task in packed],
+                    "missing": missing,
+                }
+            )
+        except BaseException:
+            writer.abort()
+            raise
+        os.replace(tmp, path)
+        return cls(path), failed
+
+    @staticmethod
+    def _add_image(writer: PackWriter, api: "SamApiHelper", task: Task, fut) -> bool:
+        try:
+            src = fut.result()
+        except Exception as e:
+            api.logger.warning(f"Download {task.filename} for the offline pack failed, {e=}")
+            return False
+        if src is None:
+            return False
+        try:
+            writer.add_file(f"image/{task.filename}", src)
+        finally:
+            # without an image store it is a temporary file
+            if api.image_store is None:
+                src.unlink(missing_ok=True)
+        return True
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, TypeVar, get_args
+
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class OrderedIndex(OrderedDict[K, V]):
+    """An OrderedDict that also finds the neighbours of a key in O(1).
+
+    Every key is linked to the keys before and after it, so picking the result to select
+    after a deletion doesn't need ``list(d.keys()).index(key)``. ``remove_many`` drops any
+    number of keys in one call. The links are built on the first neighbour lookup and kept
+    up to date from then on, so building one, as every validated annotation does, costs
+    no more than an OrderedDict. As a pydantic field it validates and serializes as a dict.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._prev: Dict[K, K | None] = {}
+        self._next: Dict[K, K | None] = {}
+        self._first: K | None = None
+        self._last: K | None = None
+        self._linked = False
+        super().__init__()
+        self.update(*args, **kwargs)
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_after_validator_function(
+            cls, handler.generate_schema(Dict[get_args(source) or (Any, Any)])  # type: ignore
+        )
+
+    # region neighbours
+    def prev_key(self, key: K) -> K | None:
+        self._ensure_links()
+        return self._prev[key]
+
+    def next_key(self, key: K) -> K | None:
+        self._ensure_links()
+        return self._next[key]
+
+    def first_key(self) -> K | None:
+        self._ensure_links()
+        return self._first
+
+    def last_key(self) -> K | None:
+        self._ensure_links()
+        return self._last
+
+    def remove_many(self, keys: Iterable[K]) -> List[K]:
+        """Remove every key present, returns the removed ones"""
+        removed = []
+        for key in keys:
+            if key in self:
+                del self[key]
+                removed.append(key)
+        return removed
+
+    # endregion
+
+    # region OrderedDict, the methods that bypass __setitem__ and __delitem__
+    def __setitem__(self, key: K, value: V) -> None:
+        if self._linked and key not in self:
+            self._link(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: K) -> None:
+        super().__delitem__(key)
+        if self._linked:
+            self._unlink(key)
+
+    def pop(self, key, default=_MISSING):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def popitem(self, last: bool = True):
+        if not self:
+            raise KeyError("dictionary is empty")
+        key = next(reversed(self)) if last else next(iter(self))
+        value = self[key]
+        del self[key]
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def clear(self) -> None:
+        super().clear()
+        self._prev.clear()
+        self._next.clear()
+        self._first = self._last = None
+
+    def move_to_end(self, key: K, last: bool = True) -> None:
+        super().move_to_end(key, last)
+        if not self._linked:
+            return
+        self._unlink(key)
+        if last:
+            self._link(key)
+        else:
+            self._prev[key] = None
+            self._next[key] = self._first
+            if self._first is not None:
+                self._prev[self._first] = key
+            self._first = key
+            if self._last is None:
+                self._last = key
+
+    def copy(self) -> "OrderedIndex[K, V]":
+        return self.__class__(self)
+
+    def __reduce__(self):
+        # the links are rebuilt from the items, not restored from __dict__
+        return self.__class__, (list(self.items()),)
+
+    # endregion
+
+    def _ensure_links(self):
+        if self._linked:
+            return
+        keys = list(self)
+        self._prev = dict(zip(keys, [None, *keys[:-1]]))
+        self._next = dict(zip(keys, [*keys[1:], None]))
+        self._first = keys[0] if keys else None
+        self._last = keys[-1] if keys else None
+        self._linked = True
+
+    def _link(self, key: K):
+        self._prev[key] = self._last
+        self._next[key] = None
+        if self._last is not None:
+            self._next[self._last] = key
+        else:
+            self._first = key
+        self._last = key
+
+    def _unlink(self, key: K):
+        prev, next_ = self._prev.pop(key), self._next.pop(key)
+        if prev is not None:
+            self._next[prev] = next_
+        else:
+            self._first = next_
+        if next_ is not None:
+            self._prev[next_] = prev
+        else:
+            self._last = prev
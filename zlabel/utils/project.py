@@ -2,15 +2,31 @@ from datetime import datetime
 from enum import Enum
 from functools import cached_property
 import hashlib
-from pathlib import Path
-from typing import Any, ClassVar, Dict, List, Optional, NamedTuple, Tuple
+from typing import Any, ClassVar, Dict, Iterable, List, Optional, NamedTuple, Tuple
 from collections import OrderedDict
-from typing_extensions import Literal
+from typing_extensions import Annotated, Literal
 from uuid import uuid4
 import uuid
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import (
+    BaseModel,
+    Field,
+    GetCoreSchemaHandler,
+    PrivateAttr,
+    SerializationInfo,
+    SerializerFunctionWrapHandler,
+    model_serializer,
+    model_validator,
+)
+from pydantic_core import core_schema
 from rich import print
 
+from zlabel.utils.ordered_index import OrderedIndex
+from zlabel.utils.save_service import write_atomic
+
+
+# serialization context of local files, results write the labels of their annotation as ids
+LABEL_REFS = {"label_refs": True}
+
 
 def id_uuid4(length=9) -> str:
     return uuid.uuid4().hex[:length]
@@ -70,6 +86,20 @@ class ResultType(Enum):
     POLYGON = 2
 
 
+class LabelRefs(object):
+    """
+    Labels of a result that may also be given as ids, the ``Annotation`` holding the result
+    resolves them to its labels. Ids are kept as strings by pydantic-core, without a python
+    call per result.
+    """
+
+    def __get_pydantic_core_schema__(
+        self, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        label = handler.generate_schema(Label)
+        return core_schema.list_schema(core_schema.union_schema([label, core_schema.str_schema()]))
+
+
 class Result(BaseModel):
     id: str
     type_id: ResultType
@@ -81,7 +111,7 @@ class Result(BaseModel):
     w: float = 0.0
     h: float = 0.0
     rotation: float = 0
-    labels: List[Label]
+    labels: Annotated[List[Label], LabelRefs()]
     points: List[Tuple[float, float]] = []
 
     @staticmethod
@@ -126,6 +156,14 @@ class Result(BaseModel):
 
 
 class Annotation(BaseModel):
+    """
+    Results refer to the labels of the annotation by id: in memory they share the Label
+    objects of ``labels``. Dumped with ``context=LABEL_REFS``, as local files are, a label
+    equal to the one in ``labels`` is written as its id. Labels not in ``labels`` stay
+    inline, as every label did in older files. Any other dump writes every label inline,
+    the format the server and other tools take.
+    """
+
     id: str
     created_by: User | None = None
     updated_by: User | None = None
@@ -139,18 +177,86 @@ class Annotation(BaseModel):
     original_height: float
     image_rotation: Optional[int] = 0
 
-    results: OrderedDict[str, Result] = OrderedDict()
-    labels: OrderedDict[str, Label] = OrderedDict()
+    # neighbours of a removed result or label are found without a scan
+    results: OrderedIndex[str, Result] = Field(default_factory=OrderedIndex)
+    labels: OrderedIndex[str, Label] = Field(default_factory=OrderedIndex)
 
     key_result: str | None = None
     key_label: str | None = None
 
+    @model_validator(mode="after")
+    def resolve_label_refs(self) -> "Annotation":
+        # results get the Label objects of the table, for ids and equal inline copies
+        table = self.labels
+        for r in self.results.values():
+            labels = r.labels
+            for i, label in enumerate(labels):
+                if type(label) is str:
+                    labels[i] = table.get(label) or Label(id=label, name="UNKNOWN")
+                else:
+                    own = table.get(label.id, None)
+                    # fields only, Label has no private attributes
+                    if own is not None and own is not label and own.__dict__ == label.__dict__:
+                        labels[i] = own
+        return self
+
+    @model_serializer(mode="wrap")
+    def write_label_refs(
+        self, handler: SerializerFunctionWrapHandler, info: SerializationInfo
+    ) -> Dict[str, Any]:
+        d = handler(self)
+        results = d.get("results", None)
+        if not results or not self.labels or not (info.context or {}).get("label_refs"):
+            return d
+        for k, r in self.results.items():
+            dumped = results.get(k, None)
+            if dumped is None or "labels" not in dumped:
+                continue
+            dumped["labels"] = [
+                label.id if self.owns(label) else v for label, v in zip(r.labels, dumped["labels"])
+            ]
+        return d
+
+    def owns(self, label: Label) -> bool:
+        """Whether label is, or equals, the label of the same id in ``labels``"""
+        own = self.labels.get(label.id, None)
+        # fields only, Label has no private attributes
+        return own is not None and (own is label or own.__dict__ == label.__dict__)
+
+    def intern(self, result: Result):
+        """Make result share the labels of the annotation it has an equal copy of"""
+        labels = result.labels
+        for i, label in enumerate(labels):
+            if self.owns(label):
+                labels[i] = self.labels[label.id]
+
+    def relabel(self, label_id: str):
+        """
+        Give every result the label label_id, one pass over the results. They share the
+        label object, so renaming or recolouring it later needs no pass.
+        """
+        label = self.labels[label_id]
+        for r in self.results.values():
+            r.labels = [label]
+
     def save_json(self, path: str):
-        p = Path(path)
-        if not p.parent.exists():
-            p.parent.mkdir(parents=True)
-        with open(p, "w", encoding="utf-8") as f:
-            f.write(self.model_dump_json(indent=4))
+        write_atomic(path, self.model_dump_json(indent=4, context=LABEL_REFS).encode("utf-8"))
+
+    def snapshot(self) -> "Annotation":
+        """
+        A copy to serialize on another thread while this one is edited. Results and labels
+        are edited in place, e.g. a note or a colour, so they are copied too, results share
+        the copies of the labels as they do here.
+        """
+        labels = OrderedIndex((k, label.model_copy()) for k, label in self.labels.items())
+        copies = {id(label): labels[k] for k, label in self.labels.items()}
+
+        def copy(r: Result) -> Result:
+            rl = [copies.get(id(label)) or label.model_copy() for label in r.labels]
+            return r.model_copy(update={"labels": rl, "points": list(r.points)})
+
+        results = OrderedIndex((k, copy(r)) for k, r in self.results.items())
+        return self.model_copy(update={"results": results, "labels": labels})
 
     def __eq__(self, v: "Annotation") -> bool:  # type: ignore[override]
         return (
@@ -168,21 +274,32 @@ class Annotation(BaseModel):
         return self.results.get(self.key_result, None)
 
     def add_result(self, result: Result):
+        self.intern(result)
         self.results[result.id] = result
         self.key_result = result.id
 
     def remove_result(self, id_: str | None):
         if id_ is None or id_ not in self.results:
             return False
-        last_keys = list(self.results.keys())
-        idx = last_keys.index(id_)
-        idx_new = min(idx - 1, idx + 1)
-        new_key = last_keys[idx_new] if idx_new >= 0 else None
-
+        new_key = self.results.prev_key(id_)
         self.results.pop(id_)
         self.key_result = new_key
         return True
 
+    def remove_results(self, ids: Iterable[str]) -> List[str]:
+        """Remove many results at once, the same as calling remove_result for each of ids"""
+        results = self.results
+        ids = [id_ for id_ in ids if id_ in results]
+        if not ids:
+            return []
+        gone = set(ids)
+        new_key = results.prev_key(ids[-1])
+        while new_key is not None and new_key in gone:
+            new_key = results.prev_key(new_key)
+        removed = results.remove_many(ids)
+        self.key_result = new_key
+        return removed
+
     def reset_results(self):
         self.results.clear()
         self.key_result = None
@@ -200,20 +317,11 @@ class Annotation(BaseModel):
     def remove_label(self, id_: str):
         if id_ not in self.labels:
             return False
-        last_keys = list(self.labels.keys())
-        idx = last_keys.index(id_)
-        idx_new = min(idx - 1, idx + 1)
-        new_key = last_keys[idx_new] if idx_new >= 0 else None
-
+        new_key = self.labels.prev_key(id_)
         self.labels.pop(id_)
         self.key_label = new_key
         return True
 
-    def set_color(self, color: str):
-        for k in self.results:
-            for label in self.results[k].labels:
-                label.color = color
-
     @staticmethod
     def new(
         image_path: str,
@@ -258,6 +366,10 @@ class Project(BaseModel):
     draft: Annotation | None = None
     tasks: OrderedDict[str, Task] = OrderedDict()
 
+    # cursor of the last task sync and the (num, finished) fetch it belongs to
+    sync_cursor: str | None = None
+    sync_filter: Tuple[int, int] | None = None
+
     # region functions
     @staticmethod
     def new(
@@ -277,8 +389,12 @@ class Project(BaseModel):
         return proj
 
     def save_json(self, path: str):
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(self.model_dump_json(indent=4, exclude={}))
+        data = self.model_dump_json(indent=4, exclude={}, context=LABEL_REFS)
+        write_atomic(path, data.encode("utf-8"))
+
+    def snapshot(self) -> "Project":
+        """A copy to serialize on another thread while this one is edited, tasks are shared"""
+        return self.model_copy(update={"tasks": OrderedDict(self.tasks)})
 
     def reset_task_key(self):
         if len(self.tasks) > 0:
@@ -290,6 +406,34 @@ class Project(BaseModel):
         self.tasks[task.anno_id] = task
         self.key_task = task.anno_id
 
+    def merge_tasks(
+        self, upserts: List[Task], removed: List[str], limit: int = 0
+    ) -> Tuple[List[Task], List[Task], List[str]]:
+        """
+        Merge synced changes into tasks, annotations already loaded are kept.
+            limit: max number of tasks, 0 for no limit
+        Returns (added, updated, removed) so views can patch only the changed rows.
+        """
+        gone = [id_ for id_ in removed if self.tasks.pop(id_, None) is not None]
+        added: List[Task] = []
+        updated: List[Task] = []
+        for task in upserts:
+            old = self.tasks.get(task.anno_id, None)
+            if old is None:
+                if 0 < limit <= len(self.tasks):
+                    continue
+                self.tasks[task.anno_id] = task
+                added.append(task)
+            elif old.model_dump() != task.model_dump():
+                old.id = task.id
+                old.filename = task.filename
+                old.labels = task.labels
+                old.finished = task.finished
+                updated.append(old)
+        if self.key_task not in self.tasks:
+            self.reset_task_key()
+        return added, updated, gone
+
     def add_annotation(self, anno: Annotation):
         self.tasks[anno.id].anno = anno
         self.key_task = anno.id
@@ -0,0 +1,324 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, List
+
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.project import Annotation, Project, Result, Task
+from zlabel.utils.project_journal import ProjectJournal
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tasks (
+    anno_id TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    finished INTEGER NOT NULL,
+    labels TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_pos ON tasks (pos);
+CREATE INDEX IF NOT EXISTS tasks_id ON tasks (id);
+CREATE INDEX IF NOT EXISTS tasks_filename ON tasks (filename);
+CREATE INDEX IF NOT EXISTS tasks_finished ON tasks (finished, pos);
+CREATE TABLE IF NOT EXISTS task_labels (
+    label TEXT NOT NULL,
+    anno_id TEXT NOT NULL,
+    PRIMARY KEY (label, anno_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS task_labels_anno ON task_labels (anno_id);
+CREATE TABLE IF NOT EXISTS annos (anno_id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS results (
+    anno_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (anno_id, id)
+);
+"""
+
+TASK_COLUMNS = "anno_id, id, filename, finished, labels"
+# keeps the position of a task or result that already exists, appends a new one
+UPSERT_TASK = """
+INSERT INTO tasks (anno_id, pos, id, filename, finished, labels)
+VALUES (?, (SELECT IFNULL(MAX(pos), 0) + 1 FROM tasks), ?, ?, ?, ?)
+ON CONFLICT (anno_id) DO UPDATE SET
+    id = excluded.id, filename = excluded.filename,
+    finished = excluded.finished, labels = excluded.labels
+"""
+UPSERT_RESULT = """
+INSERT INTO results (anno_id, id, pos, data)
+VALUES (?, ?, (SELECT IFNULL(MAX(pos), 0) + 1 FROM results WHERE anno_id = ?), ?)
+ON CONFLICT (anno_id, id) DO UPDATE SET data = excluded.data
+"""
+
+
+class ProjectDB(object):
+    """A project stored in SQLite, an alternative to ``ProjectJournal``.
+
+    Tasks are rows indexed by id, filename, finished and label, annotations and their
+    results are rows loaded when a task is opened, so a save writes only the changed
+    rows. The database runs in WAL mode: a crash loses at most the last transaction
+    and never corrupts the file. Besides the ``ProjectJournal`` interface there is a
+    small query API, see ``query_tasks``, and json import and export.
+    """
+
+    # no annotations are kept in memory beyond the loaded ones
+    shards = None
+
+    def __init__(self, path: str) -> None:
+        self.logger = ZLogger("ProjectDB")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # durable at checkpoints, WAL keeps the file consistent in between
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # region load
+    def exists(self) -> bool:
+        """Whether a project was written, e.g. before importing one"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM meta WHERE key = 'id'").fetchone()
+        return row is not None
+
+    def load(
+        self, on_tasks: Callable[[List[Task]], None] | None = None, page_size: int = 1000
+    ) -> Project | None:
+        """
+        The project with its tasks, annotations are loaded by ``load_anno``.
+        on_tasks gets the tasks page by page as they are read.
+        """
+        with self._lock:
+            meta = {k: json.loads(v) for k, v in self._conn.execute("SELECT key, value FROM meta")}
+            if "id" not in meta:
+                return None
+            proj = Project.model_validate(meta)
+            cursor = self._conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks ORDER BY pos")
+            while rows := cursor.fetchmany(page_size):
+                page = [self._task(row) for row in rows]
+                for task in page:
+                    proj.tasks[task.anno_id] = task
+                if on_tasks is not None:
+                    on_tasks(page)
+        return proj
+
+    def has_anno(self, anno_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM annos WHERE anno_id = ?", (anno_id,)).fetchone()
+        return row is not None
+
+    def load_anno(self, anno_id: str) -> Annotation | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM annos WHERE anno_id = ?", (anno_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            results = self._conn.execute(
+                "SELECT data FROM results WHERE anno_id = ? ORDER BY pos", (anno_id,)
+            ).fetchall()
+        d = json.loads(row[0])
+        d["results"] = {}
+        for (data,) in results:
+            r = json.loads(data)
+            d["results"][r["id"]] = r
+        try:
+            return Annotation.model_validate(d)
+        except Exception as e:
+            self.logger.warning(f"Validate annotation {anno_id=} failed, {e=}")
+            return None
+
+    # endregion
+
+    # region query
+    def query_tasks(
+        self,
+        finished: bool | None = None,
+        label: str | None = None,
+        filename: str | None = None,
+        limit: int = 0,
+    ) -> List[Task]:
+        """Tasks matching every given condition in project order, e.g. unfinished ones with label"""
+        sql = f"SELECT {', '.join('t.' + c for c in TASK_COLUMNS.split(', '))} FROM tasks t"
+        where: List[str] = []
+        args: List[Any] = []
+        if label is not None:
+            sql += " JOIN task_labels l ON l.anno_id = t.anno_id AND l.label = ?"
+            args.append(label)
+        if finished is not None:
+            where.append("t.finished = ?")
+            args.append(int(finished))
+        if filename is not None:
+            where.append("t.filename = ?")
+            args.append(filename)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY t.pos"
+        if limit > 0:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [self._task(row) for row in rows]
+
+    def task_by_id(self, id_: int) -> Task | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?", (id_,)
+            ).fetchone()
+        return self._task(row) if row is not None else None
+
+    def count_tasks(self, finished: bool | None = None) -> int:
+        with self._lock:
+            if finished is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM tasks WHERE finished = ?", (int(finished),)
+                ).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _task(row) -> Task:
+        anno_id, id_, filename, finished, labels = row
+        return Task(
+            id=id_,
+            anno_id=anno_id,
+            filename=filename,
+            labels=json.loads(labels),
+            finished=bool(finished),
+        )
+
+    # endregion
+
+    # region save
+    def rewrite(self, proj: Project):
+        """Replace the whole project, for changes that touch all of it"""
+        with self._lock, self._conn:
+            for table in ("meta", "tasks", "task_labels"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._put_meta(proj, full=True)
+            for task in proj.tasks.values():
+                self._put_task(task)
+                if task.anno is not None:
+                    self._put_anno(task.anno)
+            # annotations of removed tasks go with them
+            for table in ("annos", "results"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE anno_id NOT IN (SELECT anno_id FROM tasks)"
+                )
+
+    def put_meta(self, proj: Project):
+        with self._lock, self._conn:
+            self._put_meta(proj)
+
+    def put_task(self, task: Task):
+        with self._lock, self._conn:
+            self._put_task(task)
+
+    def remove_tasks(self, ids: List[str]):
+        if not ids:
+            return
+        args = [(id_,) for id_ in ids]
+        with self._lock, self._conn:
+            for table in ("tasks", "task_labels", "annos", "results"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE anno_id = ?", args)
+
+    def put_anno(self, anno: Annotation):
+        with self._lock, self._conn:
+            self._put_anno(anno)
+
+    def put_result(self, anno: Annotation, result: Result):
+        with self._lock, self._conn:
+            self._put_header(anno)
+            self._conn.execute(
+                UPSERT_RESULT, (anno.id, result.id, anno.id, result.model_dump_json())
+            )
+
+    def remove_result(self, anno: Annotation, id_: str):
+        with self._lock, self._conn:
+            self._put_header(anno)
+            self._conn.execute("DELETE FROM results WHERE anno_id = ? AND id = ?", (anno.id, id_))
+
+    def remove_results(self, anno: Annotation, ids: List[str]):
+        with self._lock, self._conn:
+            self._put_header(anno)
+            self._conn.executemany(
+                "DELETE FROM results WHERE anno_id = ? AND id = ?", [(anno.id, id_) for id_ in ids]
+            )
+
+    def _put_meta(self, proj: Project, full: bool = False):
+        keys = {"key_task", "sync_cursor", "sync_filter"}
+        if full:
+            keys |= {"id", "name", "description", "draft"}
+        d = proj.model_dump(mode="json", include=keys)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in d.items()],
+        )
+
+    def _put_task(self, task: Task):
+        self._conn.execute(
+            UPSERT_TASK,
+            (task.anno_id, task.id, task.filename, int(task.finished), json.dumps(task.labels)),
+        )
+        self._conn.execute("DELETE FROM task_labels WHERE anno_id = ?", (task.anno_id,))
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO task_labels (label, anno_id) VALUES (?, ?)",
+            [(label, task.anno_id) for label in task.labels],
+        )
+
+    def _put_header(self, anno: Annotation):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO annos (anno_id, data) VALUES (?, ?)",
+            (anno.id, anno.model_dump_json(exclude={"results"})),
+        )
+
+    def _put_anno(self, anno: Annotation):
+        self._put_header(anno)
+        self._conn.execute("DELETE FROM results WHERE anno_id = ?", (anno.id,))
+        self._conn.executemany(
+            "INSERT INTO results (anno_id, id, pos, data) VALUES (?, ?, ?, ?)",
+            [(anno.id, r.id, i, r.model_dump_json()) for i, r in enumerate(anno.results.values())],
+        )
+
+    # endregion
+
+    # region import/export
+    def import_project(
+        self, proj: Project, load_anno: Callable[[str], Annotation | None] | None = None
+    ):
+        """Replace the database with proj, load_anno gives annotations not loaded in proj"""
+        self.rewrite(proj)
+        if load_anno is None:
+            return
+        for task in proj.tasks.values():
+            if task.anno is None:
+                anno = load_anno(task.anno_id)
+                if anno is not None:
+                    self.put_anno(anno)
+
+    def import_json(self, path: str):
+        """Import a project.json, with the annotations it holds"""
+        self.import_project(ProjectJournal.read_snapshot(Path(path)))
+
+    def export_json(self, path: str):
+        """Write the project and every annotation as one json, importable by ``import_json``"""
+        proj = self.load()
+        if proj is None:
+            raise FileNotFoundError(f"No project in {self.path}")
+        for task in proj.tasks.values():
+            task.anno = self.load_anno(task.anno_id)
+        ProjectJournal.write_snapshot(Path(path), proj)
+
+    # endregion
+
+    def wait(self):
+        """Writes are synchronous, nothing runs in the background"""
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,396 @@
+import json
+import os
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, TextIO
+
+from pydantic import TypeAdapter
+
+from zlabel.utils.anno_shards import AnnotationShards
+from zlabel.utils.json_stream import JsonStream
+from zlabel.utils.logger import ZLogger
+from zlabel.utils.project import LABEL_REFS, Annotation, Project, Result, Task
+from zlabel.utils.save_service import write_atomic
+
+TASKS_ADAPTER = TypeAdapter(List[Task])
+RESULT_OPS = ("result", "remove_result", "remove_results")
+
+
+class Snapshot(Project):
+    """The snapshot file, a project with its loaded annotations"""
+
+    annos: Dict[str, Annotation] = {}
+
+
+class ProjectJournal(object):
+    """A project stored as a snapshot plus an append-only journal of changes.
+
+    A save appends one small json line per change, so it costs the size of the change
+    instead of the size of the project. Once the journal grows past ``compact_bytes``
+    it is rotated and a background thread folds it into a new snapshot. Records are
+    idempotent: replaying one again after a crash mid compaction is harmless.
+
+    The snapshot is the former ``project.json``, with the loaded annotations under
+    ``"annos"``, so it still validates as a ``Project``. With ``shards`` the snapshot
+    is only the task index: every annotation lives in its own shard and is loaded when
+    its task is opened, see ``load_anno``. Result edits are journaled like the rest and
+    the shards they touched are written when the journal is rotated, a whole annotation
+    (``put_anno``) is written to its shard at once.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compact_bytes: int = 4 * 1024 * 1024,
+        shards: AnnotationShards | None = None,
+    ) -> None:
+        self.logger = ZLogger("ProjectJournal")
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(f"{self.path.name}.journal")
+        # the journal being folded into the snapshot
+        self.rotated_path = self.path.with_name(f"{self.path.name}.journal.1")
+        self.compact_bytes = compact_bytes
+        self.shards = shards
+
+        self._lock = threading.Lock()
+        self._file: TextIO | None = None
+        self._compactor: threading.Thread | None = None
+        # annotations were moved out of the snapshot or journal into shards while loading
+        self._migrated = False
+        # annotations with result records in the journal that aren't in their shards yet
+        self._unsaved: Dict[str, Annotation] = {}
+
+    # region load
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(
+        self, on_tasks: Callable[[List[Task]], None] | None = None, page_size: int = 1000
+    ) -> Project | None:
+        """
+        Snapshot plus journal, None if there is no project yet.
+
+        With on_tasks the snapshot is streamed, on_tasks gets the tasks page by page while
+        it is parsed, before the journal is replayed on them.
+        """
+        if not self.path.exists():
+            return None
+        self.wait()
+        if on_tasks is None:
+            proj = self.read_snapshot(self.path)
+            self._migrated = self._to_shards(proj)
+        else:
+            proj = self.stream_snapshot(self.path, on_tasks, page_size)
+        for path in (self.rotated_path, self.journal_path):
+            self.replay(proj, path)
+        if self._migrated:
+            # annotations of a project saved without shards, from now on only the index
+            self.rewrite(proj)
+        return proj
+
+    def has_anno(self, anno_id: str) -> bool:
+        return self.shards is not None and self.shards.contains(anno_id)
+
+    def load_anno(self, anno_id: str) -> Annotation | None:
+        return self.shards.load(anno_id) if self.shards is not None else None
+
+    def _to_shards(self, proj: Project) -> bool:
+        if self.shards is None:
+            return False
+        moved = False
+        for task in proj.tasks.values():
+            if task.anno is not None:
+                self.shards.save(task.anno)
+                self.shards.forget(task.anno_id)
+                task.anno = None
+                moved = True
+        return moved
+
+    @staticmethod
+    def read_snapshot(path: Path) -> Project:
+        # parsed and validated in one pass by pydantic-core, without an intermediate dict
+        snapshot = Snapshot.model_validate_json(path.read_bytes())
+        proj = Project.model_construct(
+            snapshot.model_fields_set - {"annos"},
+            **{k: getattr(snapshot, k) for k in Project.model_fields},
+        )
+        for anno_id, anno in snapshot.annos.items():
+            task = proj.tasks.get(anno_id, None)
+            if task is not None:
+                task.anno = anno
+        return proj
+
+    def stream_snapshot(
+        self, path: Path, on_tasks: Callable[[List[Task]], None], page_size: int = 1000
+    ) -> Project:
+        """Parse the snapshot task by task, annotations go to the shards as they are parsed"""
+        meta: Dict[str, Any] = {}
+        tasks: OrderedDict[str, Task] = OrderedDict()
+        self._migrated = False
+        with open(path, "r", encoding="utf-8") as f:
+            stream = JsonStream(f)
+            for key in stream.items():
+                if key == "tasks":
+                    page: List[Any] = []
+                    for _ in stream.items():
+                        page.append(stream.value())
+                        if len(page) >= page_size:
+                            self._add_tasks(tasks, page, on_tasks)
+                            page = []
+                    if page:
+                        self._add_tasks(tasks, page, on_tasks)
+                elif key == "annos":
+                    for anno_id in stream.items():
+                        anno = Annotation.model_validate(stream.value())
+                        if self.shards is not None:
+                            self.shards.save(anno)
+                            self.shards.forget(anno_id)
+                            self._migrated = True
+                        elif anno_id in tasks:
+                            tasks[anno_id].anno = anno
+                else:
+                    meta[key] = stream.value()
+        proj = Project.model_validate(meta)
+        proj.tasks = tasks
+        return proj
+
+    @staticmethod
+    def _add_tasks(tasks: Dict[str, Task], page: List[Any], on_tasks: Callable[[List[Task]], None]):
+        # validated a page at a time, in one call into pydantic-core
+        validated = TASKS_ADAPTER.validate_python(page)
+        for task in validated:
+            tasks[task.anno_id] = task
+        on_tasks(validated)
+
+    @staticmethod
+    def write_snapshot(path: Path, proj: Project, annos: bool = True):
+        snapshot = Snapshot.model_construct(
+            proj.model_fields_set,
+            **{k: getattr(proj, k) for k in Project.model_fields},
+            annos={
+                anno_id: task.anno
+                for anno_id, task in proj.tasks.items()
+                if annos and task.anno is not None
+            },
+        )
+        data = snapshot.model_dump_json(
+            exclude=None if annos else {"annos"}, context=LABEL_REFS
+        ).encode("utf-8")
+        write_atomic(path, data, fsync=True)
+
+    def replay(self, proj: Project, path: Path, results: bool = True) -> int:
+        """
+        Apply the records of path to proj.
+
+        With shards the result records update the shards, unless results is False: the
+        compaction skips them, their shards were written when the journal was rotated.
+        """
+        if not path.exists():
+            return 0
+        n = 0
+        # shards loaded for result records, written once after the whole journal
+        edited: Dict[str, Annotation] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn by a crash while appending, nothing after it was written
+                    self.logger.warning(f"Journal {path} ends with a partial record")
+                    break
+                if results or self.shards is None or record["op"] not in RESULT_OPS:
+                    self.apply(proj, record, edited)
+                n += 1
+        if self.shards is not None:
+            for anno in edited.values():
+                self.shards.save(anno)
+                self.shards.forget(anno.id)
+                self._migrated = True
+        return n
+
+    def apply(
+        self, proj: Project, record: Dict[str, Any], edited: Dict[str, Annotation] | None = None
+    ):
+        """Apply one record, annotations loaded from shards are collected in edited"""
+        op = record["op"]
+        if op == "meta":
+            proj.key_task = record["key_task"]
+            proj.sync_cursor = record["sync_cursor"]
+            sync_filter = record["sync_filter"]
+            proj.sync_filter = tuple(sync_filter) if sync_filter is not None else None  # type: ignore
+        elif op == "task":
+            task = Task.model_validate(record["task"])
+            old = proj.tasks.get(task.anno_id, None)
+            if old is not None:
+                task.anno = old.anno
+            proj.tasks[task.anno_id] = task
+        elif op == "remove_tasks":
+            for anno_id in record["ids"]:
+                proj.tasks.pop(anno_id, None)
+        elif op == "anno":
+            anno = Annotation.model_validate(record["anno"])
+            task = proj.tasks.get(anno.id, None)
+            if task is None:
+                return
+            if self.shards is not None:
+                if edited is not None:
+                    # earlier result records are part of it
+                    edited.pop(anno.id, None)
+                self.shards.save(anno)
+                self.shards.forget(anno.id)
+                self._migrated = True
+            else:
+                task.anno = anno
+        elif op in RESULT_OPS:
+            task = proj.tasks.get(record["anno_id"], None)
+            if task is None:
+                return
+            anno = task.anno
+            if anno is None and edited is not None:
+                anno = edited.get(task.anno_id, None) or self.load_anno(task.anno_id)
+                if anno is not None:
+                    edited[anno.id] = anno
+            if anno is None:
+                return
+            if op == "result":
+                result = Result.model_validate(record["result"])
+                if result.id in anno.results:
+                    anno.results[result.id] = result
+                else:
+                    anno.add_result(result)
+            elif op == "remove_result":
+                anno.remove_result(record["id"])
+            else:
+                anno.remove_results(record["ids"])
+
+    # endregion
+
+    # region save
+    def rewrite(self, proj: Project):
+        """Write the whole project, for changes that touch all of it"""
+        with self._lock:
+            # a running compaction would overwrite the snapshot with an older state
+            self.wait()
+            if self.shards is not None:
+                for task in proj.tasks.values():
+                    if task.anno is not None:
+                        self.shards.save(task.anno)
+                self._unsaved.clear()
+            self.write_snapshot(self.path, proj, annos=self.shards is None)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.journal_path.unlink(missing_ok=True)
+            self.rotated_path.unlink(missing_ok=True)
+
+    def put_meta(self, proj: Project):
+        self.append(
+            {
+                "op": "meta",
+                "key_task": proj.key_task,
+                "sync_cursor": proj.sync_cursor,
+                "sync_filter": proj.sync_filter,
+            }
+        )
+
+    def put_task(self, task: Task):
+        self.append({"op": "task", "task": task.model_dump(mode="json")})
+
+    def remove_tasks(self, ids: List[str]):
+        if ids:
+            self.append({"op": "remove_tasks", "ids": ids})
+
+    def put_anno(self, anno: Annotation):
+        """The whole annotation, with shards it is written to its shard"""
+        if self.shards is not None:
+            with self._lock:
+                self._unsaved.pop(anno.id, None)
+            self.shards.save(anno)
+            return
+        self.append({"op": "anno", "anno": anno.model_dump(mode="json", context=LABEL_REFS)})
+
+    def put_result(self, anno: Annotation, result: Result):
+        self.put_edit(
+            anno, {"op": "result", "anno_id": anno.id, "result": result.model_dump(mode="json")}
+        )
+
+    def remove_result(self, anno: Annotation, id_: str):
+        self.put_edit(anno, {"op": "remove_result", "anno_id": anno.id, "id": id_})
+
+    def remove_results(self, anno: Annotation, ids: List[str]):
+        if ids:
+            self.put_edit(anno, {"op": "remove_results", "anno_id": anno.id, "ids": ids})
+
+    def put_edit(self, anno: Annotation, record: Dict[str, Any]):
+        if self.shards is not None:
+            # before the append, which may rotate the journal and write the unsaved shards
+            with self._lock:
+                self._unsaved[anno.id] = anno
+        self.append(record)
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.journal_path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            size = self._file.tell()
+        if size > self.compact_bytes:
+            self.compact()
+
+    # endregion
+
+    # region compaction
+    def compact(self):
+        """Fold the journal into the snapshot in the background"""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            # a rotated journal left by a crash is folded first, the current one next time
+            if not self.rotated_path.exists():
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                if not self.journal_path.exists():
+                    return
+                os.replace(self.journal_path, self.rotated_path)
+                if self.shards is not None:
+                    # the rotated result records are folded by writing their shards
+                    for anno in self._unsaved.values():
+                        self.shards.save(anno)
+                    self._unsaved.clear()
+            self._compactor = threading.Thread(
+                target=self._fold, name="ProjectJournal", daemon=True
+            )
+            self._compactor.start()
+
+    def wait(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _fold(self):
+        try:
+            if self.shards is not None and self.shards.saver is not None:
+                # the rotated journal is only dropped once the shards are on disk
+                self.shards.saver.flush()
+            proj = self.read_snapshot(self.path)
+            n = self.replay(proj, self.rotated_path, results=self.shards is None)
+            self.write_snapshot(self.path, proj, annos=self.shards is None)
+            self.rotated_path.unlink(missing_ok=True)
+            self.logger.debug(f"Folded {n} journal records into {self.path}")
+        except Exception as e:
+            # the rotated journal stays and is replayed on load
+            self.logger.error(f"Compact {self.path} failed, {e=}")
+
+    # endregion
@@ -0,0 +1,114 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from zlabel.utils.logger import ZLogger
+
+
+@dataclass
+class Target(object):
+    url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    # shown in the outcome, the url if empty
+    name: str = ""
+
+
+@dataclass
+class TargetResult(object):
+    name: str
+    ok: bool
+    status: int | None = None
+    msg: str = ""
+    # still uploading when the outcome was decided
+    pending: bool = False
+
+
+@dataclass
+class UploadOutcome(object):
+    results: List[TargetResult]
+    quorum: int
+
+    @property
+    def acked(self) -> int:
+        return sum(r.ok for r in self.results)
+
+    @property
+    def ok(self) -> bool:
+        return self.acked >= self.quorum
+
+    def __str__(self) -> str:
+        return ", ".join(f"{r.name}: {'success' if r.ok else r.msg}" for r in self.results)
+
+
+class ReplicatedUploader(object):
+    """Uploads one payload to several targets at the same time.
+
+    The payload is read once by the caller and shared by every request, connections are
+    kept in a pool per host. ``upload`` returns once ``quorum`` targets acknowledged, or
+    once that became impossible, the slower targets finish in the background.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout=(10, 60),
+        check: Callable[[requests.Response], bool] | None = None,
+    ) -> None:
+        """check: whether a response acknowledges the upload, any 2xx by default"""
+        self.logger = ZLogger("ReplicatedUploader")
+        self.timeout = timeout
+        self.check = check or (lambda resp: resp.ok)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="replicate")
+
+    def upload(
+        self, data: bytes, targets: Sequence[Target], quorum: int = 0, method: str = "PUT"
+    ) -> UploadOutcome:
+        """quorum: acknowledgements needed, 0 for all targets"""
+        quorum = len(targets) if quorum <= 0 else min(quorum, len(targets))
+        names = [t.name or t.url for t in targets]
+        results = [TargetResult(name, False, msg="pending", pending=True) for name in names]
+        futures: Dict[Future, int] = {
+            self.executor.submit(self._send, method, t, data, name): i
+            for i, (t, name) in enumerate(zip(targets, names))
+        }
+        pending = set(futures)
+        acked = failed = 0
+        while pending and acked < quorum and len(targets) - failed >= quorum:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                r = results[futures[f]] = f.result()
+                acked += r.ok
+                failed += not r.ok
+        for f in pending:
+            f.add_done_callback(self._log_late)
+        return UploadOutcome(results, quorum)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def _send(self, method: str, target: Target, data: bytes, name: str) -> TargetResult:
+        try:
+            resp = self.session.request(
+                method, target.url, data=data, headers=target.headers, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            return TargetResult(name, False, msg=f"{e=}")
+        try:
+            ok = self.check(resp)
+        except Exception as e:
+            ok = False
+            self.logger.warning(f"Check response of {name} failed, {e=}")
+        return TargetResult(name, ok, resp.status_code, "" if ok else resp.text)
+
+    def _log_late(self, f: Future):
+        r: TargetResult = f.result()
+        if not r.ok:
+            self.logger.warning(f"Upload to {r.name} failed after the quorum, {r.msg}")
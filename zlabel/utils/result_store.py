@@ -0,0 +1,417 @@
+from collections import OrderedDict
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from pydantic import TypeAdapter
+
+from zlabel.utils.project import Annotation, Label, Result, ResultType
+
+# numeric columns, float64 so values round trip exactly
+FLOAT_FIELDS = ("x", "y", "w", "h", "rotation", "score")
+SPARSE_FIELDS = ("more_labels", "note", "points")
+
+_get_floats = attrgetter(*FLOAT_FIELDS)
+_TYPE_VALUES = {t: t.value for t in ResultType}
+_RESULTS = TypeAdapter(List[Result])
+
+
+class ResultView(object):
+    """A row of a ``ResultColumns``, read and written like a ``Result``"""
+
+    __slots__ = ("_store", "id")
+
+    def __init__(self, store: "ResultColumns", id_: str) -> None:
+        self._store = store
+        self.id = id_
+
+    @property
+    def row(self) -> int:
+        return self._store._rows[self.id]
+
+    @property
+    def type_id(self) -> ResultType:
+        return ResultType(int(self._store._type[self.row]))
+
+    @type_id.setter
+    def type_id(self, v: ResultType):
+        self._store._type[self.row] = v.value
+
+    @property
+    def origin(self) -> str:
+        return self._store.origins[self._store._origin[self.row]]
+
+    @origin.setter
+    def origin(self, v: str):
+        self._store._origin[self.row] = self._store._intern_origin(v)
+
+    @property
+    def labels(self) -> List[Label]:
+        return self._store._labels_of(self.row)
+
+    @labels.setter
+    def labels(self, v: List[Label]):
+        self._store._set_labels(self.row, v)
+
+    @property
+    def note(self) -> str:
+        return self._store._sparse["note"].get(self.id, "")
+
+    @note.setter
+    def note(self, v: str):
+        self._store._set_sparse("note", self.id, v)
+
+    @property
+    def points(self) -> List[Tuple[float, float]]:
+        return self._store._sparse["points"].get(self.id, [])
+
+    @points.setter
+    def points(self, v: List[Tuple[float, float]]):
+        self._store._set_sparse("points", self.id, [tuple(p) for p in v])
+
+    def to_result(self) -> Result:
+        return self._store.result(self.id)
+
+    def __repr__(self) -> str:
+        return f"ResultView({self.to_result()!r})"
+
+
+def _float_column(name: str):
+    def get(self: ResultView) -> float:
+        return float(self._store._floats[name][self.row])
+
+    def set(self: ResultView, v: float):
+        self._store._floats[name][self.row] = v
+
+    return property(get, set)
+
+
+for _name in FLOAT_FIELDS:
+    setattr(ResultView, _name, _float_column(_name))
+
+
+class ResultColumns(object):
+    """Results of an annotation as numpy columns, for operations over all of them at once.
+
+    Every numeric field is one array and labels are indexes into ``labels``, so a result
+    takes about 60 bytes plus its id instead of a few pydantic objects. Rows keep the order
+    of the results and ``store[id]`` is a ``ResultView`` of one. Notes, polygon points and
+    labels after the first are rare and stored sparsely. ``Annotation.results`` stays the
+    source of truth, build the columns with ``from_annotation`` and turn them back into
+    results with ``to_results``. The binary ``.zlabel`` format is these columns.
+    """
+
+    def __init__(self, labels: Iterable[Label] = (), capacity: int = 16) -> None:
+        self.labels: List[Label] = []
+        # (id, name, color) -> index, a label differing from another of its id gets its own
+        self._label_index: Dict[Tuple[Any, ...], int] = {}
+        for label in labels:
+            self._intern_label(label)
+        self.origins: List[str] = ["manual"]
+
+        self._n = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._type = np.zeros(capacity, dtype=np.int8)
+        self._origin = np.zeros(capacity, dtype=np.uint16)
+        # index of the first label, -1 if none
+        self._label = np.full(capacity, -1, dtype=np.int32)
+        self._floats: Dict[str, NDArray[np.float64]] = {
+            k: np.zeros(capacity, dtype=np.float64) for k in FLOAT_FIELDS
+        }
+        # field -> id -> value, only for results that have one
+        self._sparse: Dict[str, Dict[str, Any]] = {k: {} for k in SPARSE_FIELDS}
+
+    @staticmethod
+    def from_results(results: Iterable[Result], labels: Iterable[Label] = ()) -> "ResultColumns":
+        """Build the columns at once, a field of every result is one array"""
+        results = list(results)
+        store = ResultColumns(labels, capacity=0)
+        ids = [r.id for r in results]
+        rows = {id_: row for row, id_ in enumerate(ids)}
+        if len(rows) < len(ids):
+            # a later result overwrites the row of its id
+            store = ResultColumns(labels, capacity=max(16, len(results)))
+            for r in results:
+                store.add(r)
+            return store
+        n = len(ids)
+        store._n, store._ids, store._rows = n, ids, rows
+        # one row of floats per result, each column contiguous
+        floats = np.array([_get_floats(r) for r in results], dtype=np.float64)
+        floats = floats.reshape(n, len(FLOAT_FIELDS))
+        floats = np.ascontiguousarray(floats.T)
+        store._floats = dict(zip(FLOAT_FIELDS, floats))
+        types: List[int] = []
+        origins: List[int] = []
+        firsts: List[int] = []
+        more, note, points = (store._sparse[k] for k in SPARSE_FIELDS)
+        # results of an annotation share label objects, each is interned once
+        indexes: Dict[int, int] = {}
+        for r in results:
+            types.append(_TYPE_VALUES[r.type_id])
+            origins.append(store._intern_origin(r.origin))
+            labels_ = r.labels
+            if labels_:
+                row_labels = []
+                for label in labels_:
+                    i = indexes.get(id(label), None)
+                    if i is None:
+                        i = indexes[id(label)] = store._intern_label(label)
+                    row_labels.append(i)
+                firsts.append(row_labels[0])
+                if len(row_labels) > 1:
+                    more[r.id] = row_labels[1:]
+            else:
+                firsts.append(-1)
+            if r.note:
+                note[r.id] = r.note
+            if r.points:
+                points[r.id] = [tuple(p) for p in r.points]
+        store._type = np.array(types, dtype=np.int8)
+        store._origin = np.array(origins, dtype=np.uint16)
+        store._label = np.array(firsts, dtype=np.int32)
+        return store
+
+    @staticmethod
+    def from_annotation(anno: Annotation) -> "ResultColumns":
+        return ResultColumns.from_results(anno.results.values(), anno.labels.values())
+
+    @staticmethod
+    def from_columns(
+        ids: List[str],
+        columns: Dict[str, NDArray],
+        labels: List[Label],
+        origins: List[str],
+        sparse: Dict[str, Dict[int, Any]],
+    ) -> "ResultColumns":
+        """
+        The inverse of ``column`` and ``sparse``, columns are copied.
+            labels, origins: the tables label and origin index into, kept as they are
+        """
+        store = ResultColumns(capacity=0)
+        store.labels = list(labels)
+        store.origins = list(origins)
+        store._n = len(ids)
+        store._ids = list(ids)
+        store._rows = {id_: row for row, id_ in enumerate(ids)}
+        store._type = np.array(columns["type"], dtype=np.int8)
+        store._origin = np.array(columns["origin"], dtype=np.uint16)
+        store._label = np.array(columns["label"], dtype=np.int32)
+        store._floats = {k: np.array(columns[k], dtype=np.float64) for k in FLOAT_FIELDS}
+        store._sparse = {k: {ids[row]: v for row, v in sparse[k].items()} for k in SPARSE_FIELDS}
+        return store
+
+    # region access
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, id_: str) -> bool:
+        return id_ in self._rows
+
+    def __iter__(self) -> Iterator[ResultView]:
+        return (ResultView(self, id_) for id_ in list(self._ids))
+
+    def __getitem__(self, id_: str) -> ResultView:
+        if id_ not in self._rows:
+            raise KeyError(id_)
+        return ResultView(self, id_)
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the columns, ids and sparse fields excluded"""
+        n = self._type.nbytes + self._origin.nbytes + self._label.nbytes
+        return n + sum(a.nbytes for a in self._floats.values())
+
+    def column(self, name: str) -> NDArray:
+        """A read only view of a column: a float field, type, origin or label"""
+        if name in self._floats:
+            a = self._floats[name]
+        else:
+            a = {"type": self._type, "origin": self._origin, "label": self._label}[name]
+        v = a[: self._n]
+        v.flags.writeable = False
+        return v
+
+    def sparse(self, name: str) -> Dict[int, Any]:
+        """Row -> value of a sparse field, more_labels, note or points, in row order"""
+        rows = self._rows
+        return dict(sorted((rows[id_], v) for id_, v in self._sparse[name].items()))
+
+    def result(self, id_: str) -> Result:
+        row = self._rows[id_]
+        return Result(
+            id=id_,
+            type_id=ResultType(int(self._type[row])),
+            origin=self.origins[self._origin[row]],
+            note=self._sparse["note"].get(id_, ""),
+            labels=self._labels_of(row),
+            points=list(self._sparse["points"].get(id_, [])),
+            **{k: float(a[row]) for k, a in self._floats.items()},
+        )
+
+    def to_results(self) -> "OrderedDict[str, Result]":
+        # a column as a list at once, numpy scalars one by one are slow, and every result
+        # validated in one pydantic-core call, a Result(...) each is slower
+        n = self._n
+        columns = {k: a[:n].tolist() for k, a in self._floats.items()}
+        columns["type_id"] = self._type[:n].tolist()
+        columns["origin"] = [self.origins[i] for i in self._origin[:n].tolist()]
+        more, note, points = (self._sparse[k] for k in SPARSE_FIELDS)
+        labels = self.labels
+        columns["labels"] = [
+            [labels[i] for i in (first, *more.get(id_, ()))] if first >= 0 else []
+            for id_, first in zip(self._ids, self._label[:n].tolist())
+        ]
+        columns["note"] = [note.get(id_, "") for id_ in self._ids]
+        columns["points"] = [points.get(id_, []) for id_ in self._ids]
+        columns["id"] = self._ids
+        keys = list(columns)
+        rows = [dict(zip(keys, row)) for row in zip(*columns.values())]
+        return OrderedDict(zip(self._ids, _RESULTS.validate_python(rows)))
+
+    # endregion
+
+    # region edit
+    def add(self, result: Result):
+        """Append result, or overwrite the row of the same id"""
+        row = self._rows.get(result.id, None)
+        if row is None:
+            if self._n == len(self._type):
+                self._grow()
+            row = self._n
+            self._n += 1
+            self._ids.append(result.id)
+            self._rows[result.id] = row
+        self._type[row] = result.type_id.value
+        self._origin[row] = self._intern_origin(result.origin)
+        for k, a in self._floats.items():
+            a[row] = getattr(result, k)
+        self._set_labels(row, result.labels)
+        self._set_sparse("note", result.id, result.note)
+        self._set_sparse("points", result.id, [tuple(p) for p in result.points])
+
+    def remove(self, ids: Iterable[str]):
+        """Remove every result of ids in one pass, keeping the order of the rest"""
+        rows = [self._rows[id_] for id_ in ids if id_ in self._rows]
+        if not rows:
+            return
+        keep = np.ones(self._n, dtype=bool)
+        keep[rows] = False
+        n = int(keep.sum())
+        for a in (self._type, self._origin, self._label, *self._floats.values()):
+            a[:n] = a[: self._n][keep]
+        for row in rows:
+            for d in self._sparse.values():
+                d.pop(self._ids[row], None)
+        self._ids = [id_ for id_, k in zip(self._ids, keep.tolist()) if k]
+        self._rows = {id_: i for i, id_ in enumerate(self._ids)}
+        self._n = n
+
+    def _grow(self):
+        capacity = max(16, len(self._type) * 2)
+        self._type = np.resize(self._type, capacity)
+        self._origin = np.resize(self._origin, capacity)
+        self._label = np.resize(self._label, capacity)
+        self._floats = {k: np.resize(a, capacity) for k, a in self._floats.items()}
+
+    def _intern_label(self, label: Label) -> int:
+        # fields only, Label has no private attributes
+        key = tuple(label.__dict__.values())
+        i = self._label_index.get(key, None)
+        if i is None:
+            i = self._label_index[key] = len(self.labels)
+            self.labels.append(label)
+        return i
+
+    def _intern_origin(self, origin: str) -> int:
+        try:
+            return self.origins.index(origin)
+        except ValueError:
+            self.origins.append(origin)
+            return len(self.origins) - 1
+
+    def _labels_of(self, row: int) -> List[Label]:
+        first = self._label[row]
+        if first < 0:
+            return []
+        more = self._sparse["more_labels"].get(self._ids[row], [])
+        return [self.labels[i] for i in (first, *more)]
+
+    def _set_labels(self, row: int, labels: List[Label]):
+        indexes = [self._intern_label(label) for label in labels]
+        self._label[row] = indexes[0] if indexes else -1
+        self._set_sparse("more_labels", self._ids[row], indexes[1:])
+
+    def _set_sparse(self, name: str, id_: str, v: Any):
+        if v:
+            self._sparse[name][id_] = v
+        else:
+            self._sparse[name].pop(id_, None)
+
+    # endregion
+
+    # region vectorised
+    def mask(self, ids: Iterable[str] | None = None) -> NDArray[np.bool_]:
+        """Rows of ids, every row if None"""
+        if ids is None:
+            return np.ones(self._n, dtype=bool)
+        m = np.zeros(self._n, dtype=bool)
+        m[[self._rows[id_] for id_ in ids if id_ in self._rows]] = True
+        return m
+
+    def select(self, mask: NDArray[np.bool_]) -> List[str]:
+        return [self._ids[i] for i in np.flatnonzero(mask)]
+
+    def hit_test(self, x: float, y: float) -> List[str]:
+        """Results whose box contains the point, rotation ignored, topmost last"""
+        x0, y0, x1, y1 = self._extents()
+        return self.select((x0 <= x) & (x <= x1) & (y0 <= y) & (y <= y1))
+
+    def in_rect(self, x0: float, y0: float, x1: float, y1: float) -> List[str]:
+        """Results whose box lies inside the rectangle, e.g. a rubber band selection"""
+        bx0, by0, bx1, by1 = self._extents()
+        return self.select((bx0 >= x0) & (bx1 <= x1) & (by0 >= y0) & (by1 <= y1))
+
+    def relabel(self, label: Label, ids: Iterable[str] | None = None):
+        m = self.mask(ids)
+        self._label[: self._n][m] = self._intern_label(label)
+        for id_ in self.select(m):
+            self._sparse["more_labels"].pop(id_, None)
+
+    def translate(self, dx: float, dy: float, ids: Iterable[str] | None = None):
+        m = self.mask(ids)
+        self._floats["x"][: self._n][m] += dx
+        self._floats["y"][: self._n][m] += dy
+        points = self._sparse["points"]
+        for id_ in self.select(m):
+            if id_ in points:
+                points[id_] = [(px + dx, py + dy) for px, py in points[id_]]
+
+    def label_counts(self) -> Dict[str, int]:
+        """Results per label id, by their first label"""
+        labels = self._label[: self._n]
+        counts = np.bincount(labels[labels >= 0], minlength=len(self.labels))
+        by_id: Dict[str, int] = {}
+        for label, c in zip(self.labels, counts.tolist()):
+            if c:
+                by_id[label.id] = by_id.get(label.id, 0) + c
+        return by_id
+
+    def boxes(self) -> NDArray[np.float64]:
+        """(n, 4) array of x, y, w, h"""
+        return np.stack([self._floats[k][: self._n] for k in ("x", "y", "w", "h")], axis=1)
+
+    def _extents(self) -> Tuple[NDArray[np.float64], ...]:
+        """x0, y0, x1, y1 of every box, w and h may be negative"""
+        xs, ys = self._floats["x"][: self._n], self._floats["y"][: self._n]
+        ws, hs = self._floats["w"][: self._n], self._floats["h"][: self._n]
+        x1, y1 = xs + ws, ys + hs
+        return np.minimum(xs, x1), np.minimum(ys, y1), np.maximum(xs, x1), np.maximum(ys, y1)
+
+    # endregion
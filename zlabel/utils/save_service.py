@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from zlabel.utils.logger import ZLogger
+
+
+def write_atomic(path: str | Path, data: bytes, fsync: bool = False):
+    """Write data next to path and rename it over path, a crash leaves the old or new file"""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f"{p.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, p)
+
+
+class SaveService(object):
+    """Serialize and write files on a background thread, bursts of saves coalesced.
+
+    ``submit`` takes the path and a function returning its bytes. The function runs on
+    the save thread, so it should close over a snapshot of the state, not the live
+    objects, see ``Annotation.snapshot``. A request waits ``delay`` seconds for later
+    ones: requests for a path already waiting replace it and keep its place, so pressing
+    Next repeatedly writes once. Writes are atomic, see ``write_atomic``.
+    """
+
+    def __init__(self, delay: float = 0.2, fsync: bool = False) -> None:
+        self.logger = ZLogger("SaveService")
+        self.delay = delay
+        self.fsync = fsync
+        self.requests = 0
+        self.writes = 0
+
+        self._cond = threading.Condition()
+        # path -> (serialize, due), in the order of the first request
+        self._pending: OrderedDict[str, Tuple[Callable[[], bytes], float]] = OrderedDict()
+        self._writing: str | None = None
+        self._callbacks: Dict[str, Callable[[int], None]] = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="SaveService", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        path: str | Path,
+        serialize: Callable[[], bytes],
+        on_written: Callable[[int], None] | None = None,
+    ):
+        """Write the bytes of serialize to path, on_written gets their size"""
+        key = str(path)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SaveService is closed")
+            self.requests += 1
+            _, due = self._pending.get(key, (None, time.monotonic() + self.delay))
+            self._pending[key] = (serialize, due)
+            if on_written is not None:
+                self._callbacks[key] = on_written
+            else:
+                self._callbacks.pop(key, None)
+            self._cond.notify_all()
+
+    def pending(self, path: str | Path) -> bool:
+        """Whether path has a write waiting or in progress"""
+        key = str(path)
+        with self._cond:
+            return key in self._pending or self._writing == key
+
+    def cancel(self, path: str | Path):
+        """Drop the waiting write of path, one in progress still completes"""
+        key = str(path)
+        with self._cond:
+            self._pending.pop(key, None)
+            self._callbacks.pop(key, None)
+            while self._writing == key:
+                self._cond.wait()
+
+    def flush(self, path: str | Path | None = None):
+        """Write path, or everything waiting, now and return once it is written"""
+        key = str(path) if path is not None else None
+        with self._cond:
+            for k, (serialize, _) in self._pending.items():
+                if key is None or k == key:
+                    self._pending[k] = (serialize, 0.0)
+            self._cond.notify_all()
+            while (key is None and (self._pending or self._writing)) or (
+                key is not None and (key in self._pending or self._writing == key)
+            ):
+                self._cond.wait()
+
+    def close(self):
+        """Write everything waiting and stop the save thread"""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending:
+                        # the first requested, unless another one is flushed
+                        key = min(self._pending, key=lambda k: self._pending[k][1])
+                        serialize, due = self._pending[key]
+                        wait = due - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    elif self._closed:
+                        return
+                    else:
+                        self._cond.wait()
+                del self._pending[key]
+                on_written = self._callbacks.pop(key, None)
+                self._writing = key
+            try:
+                data = serialize()
+                write_atomic(key, data, self.fsync)
+                self.writes += 1
+                if on_written is not None:
+                    on_written(len(data))
+            except Exception as e:
+                self.logger.warning(f"Save {key} failed, {e=}")
+            finally:
+                with self._cond:
+                    self._writing = None
+                    self._cond.notify_all()
@@ -0,0 +1,126 @@
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List
+
+from zlabel.utils.logger import ZLogger
+
+
+@dataclass
+class PendingUpload(object):
+    anno_id: str
+    filename: str
+    enqueued_at: float
+    updated_at: float = 0.0
+    attempts: int = 0
+    next_try: float = 0.0
+    last_error: str = ""
+
+
+class UploadQueue(object):
+    """
+    Persistent queue of annotation uploads.
+    One entry per annotation, the file is read when it is flushed, so repeated
+    saves of the same annotation merge into a single upload.
+    """
+
+    def __init__(self, path: str, base_delay: float = 2.0, max_delay: float = 300.0) -> None:
+        self.logger = ZLogger("UploadQueue")
+        self.path = Path(path)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._items: Dict[str, PendingUpload] = {}
+        self._load()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def __contains__(self, anno_id: str):
+        with self._lock:
+            return anno_id in self._items
+
+    def put(self, anno_id: str, filename: str):
+        with self._lock:
+            now = time.time()
+            item = self._items.get(anno_id, None)
+            if item is None:
+                self._items[anno_id] = PendingUpload(anno_id, filename, now, now)
+            else:
+                # keep the backoff of a pending upload, only its content changed
+                item.filename = filename
+                item.updated_at = now
+            self._save()
+
+    def due(self, limit: int = 0, now: float | None = None, ignore_backoff=False) -> List[PendingUpload]:
+        """Uploads ready to be retried, oldest first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            items = [
+                PendingUpload(**asdict(it))
+                for it in self._items.values()
+                if ignore_backoff or it.next_try <= now
+            ]
+        items.sort(key=lambda it: it.enqueued_at)
+        return items[:limit] if limit > 0 else items
+
+    def next_due(self) -> float | None:
+        with self._lock:
+            if not self._items:
+                return None
+            return min(it.next_try for it in self._items.values())
+
+    def done(self, anno_ids: List[str], started_at: float | None = None):
+        """
+        Remove uploaded entries. Entries put again after started_at (the time the
+        flush read them) stay, their newer content still has to go.
+        """
+        with self._lock:
+            for anno_id in anno_ids:
+                item = self._items.get(anno_id, None)
+                if item is None:
+                    continue
+                if started_at is not None and item.updated_at > started_at:
+                    continue
+                self._items.pop(anno_id)
+            self._save()
+
+    def failed(self, anno_ids: List[str], error: str, now: float | None = None):
+        """Exponential backoff with jitter"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for anno_id in anno_ids:
+                item = self._items.get(anno_id, None)
+                if item is None:
+                    continue
+                item.attempts += 1
+                delay = min(self.base_delay * 2 ** (item.attempts - 1), self.max_delay)
+                item.next_try = now + delay * random.uniform(0.8, 1.2)
+                item.last_error = error
+            self._save()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for d in json.load(f):
+                    item = PendingUpload(**d)
+                    self._items[item.anno_id] = item
+        except Exception as e:
+            self.logger.error(f"Load upload queue {self.path} failed, {e=}")
+
+    def _save(self):
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([asdict(it) for it in self._items.values()], f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.logger.error(f"Save upload queue {self.path} failed, {e=}")
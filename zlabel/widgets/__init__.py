@@ -2,10 +2,14 @@ from zlabel.widgets.zsettings import ZSettings
 from zlabel.widgets.zworker import (
     SamWorkerResult,
     ZGetImageWorker,
+    ZGetPreviewWorker,
+    ZGetAnnosWorker,
     ZPreuploadImageWorker,
     ZSamPredictWorker,
-    ZUploadFileWorker,
+    ZFlushUploadsWorker,
     ZGetTasksWorker,
+    ZLoadProjectWorker,
+    ZBuildPackWorker,
 )
 from zlabel.widgets.zwidgets import (
     Toast,
@@ -17,6 +21,7 @@ from zlabel.widgets.zwidgets import (
 )
 from zlabel.widgets.zundostack import ResultUndoMode, ZResultUndoCmd
 from zlabel.widgets.zthread import ZLoginThread
+from zlabel.widgets.zprefetcher import ZPrefetcher, ZPrefetchWorker
 from zlabel.widgets.dialog_about import DialogAbout
 from zlabel.widgets.dialog_settings import DialogSettings
 from zlabel.widgets.dialog_processing import DialogProcessing
@@ -2,7 +2,7 @@ import copy
 import functools as ftools
 import os
 from collections import OrderedDict
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import pyqtgraph as pg  # type: ignore
@@ -62,6 +62,9 @@ class Canvas(pg.PlotWidget):
 
         self.image_item = ZImageItem()
         self.current_image = None
+        # (height, width) the shown image stands for, larger than it while it is a preview
+        self.image_size: Tuple[int, int] | None = None
+        self.is_preview = False
         self.current_item: Rectangle | Circle | None = None
         self.selecting_rect: Rectangle | None = None
         self.rects: OrderedDict[str, Rectangle] = OrderedDict()
@@ -133,7 +136,11 @@ class Canvas(pg.PlotWidget):
     # endregion
 
     # region functions
-    def set_image(self, img: str | NDArray):
+    def set_image(self, img: str | NDArray, size: Tuple[int, int] | None = None):
+        """
+        size: (height, width) of the full image when img is a downscaled preview of it,
+            the preview is stretched over the full size so results keep their coordinates
+        """
         if isinstance(img, str):
             if os.path.exists(img):
                 self.current_image = np.asarray(Image.open(img), dtype=np.uint8)  # type: ignore
@@ -151,6 +158,12 @@ class Canvas(pg.PlotWidget):
                 axes=(1, 0),
             )  # type: ignore
         )
+        height, width = self.current_image.shape[:2]  # type: ignore
+        self.is_preview = size is not None and tuple(size) != (height, width)
+        if self.is_preview:
+            height, width = size  # type: ignore
+            self.image_item.setRect(QRectF(0, 0, width, height))
+        self.image_size = (height, width)
         self.image_item.setZValue(-10)
         self.addItem(self.image_item)
 
@@ -521,9 +534,8 @@ class Canvas(pg.PlotWidget):
         self.remove_items_by_ids(ids)
 
     def remove_items_by_ids(self, ids: List[str]):
-        keys = list(self.rects.keys())
-        for id_ in keys:
-            if id_ in ids:
+        for id_ in ids:
+            if id_ in self.rects:
                 self.remove_item(self.rects[id_])
 
     def clear_all_items(self):
@@ -2,7 +2,7 @@ from collections import OrderedDict
 import copy
 import functools
 import re
-from typing import List, Optional, TypeAlias, TypeVar, NewType
+from typing import List, Optional, Set, TypeAlias, TypeVar, NewType
 
 from qtpy.QtWidgets import (
     QCheckBox,
@@ -31,7 +31,7 @@ class ZDockAnnotationContent(QWidget, Ui_ZDockAnnotationContent):
         super().__init__(parent)
         self.setupUi(self)
 
-        self.items: List[str] = []
+        self.items: Set[str] = set()
         # self.sigItemCountChanged.connect(self.set_title)
 
     def keyPressEvent(self, event: QKeyEvent) -> None:
@@ -53,18 +53,27 @@ class ZDockAnnotationContent(QWidget, Ui_ZDockAnnotationContent):
                 return
 
     def remove_item(self, id_: str):
+        if id_ not in self.items:
+            return
         for row in range(self.listWidget.count()):
             if self.listWidget.item(row).text() == id_:
                 self.listWidget.takeItem(row)
+                self.items.discard(id_)
                 self.listWidget.setCurrentRow(row - 1)
                 self.sigItemCountChanged.emit(self.listWidget.count())
                 break
 
     def remove_items(self, ids: List[str]):
-        for row in range(self.listWidget.count()):
-            if self.listWidget.item(row).id_ in ids:  # type: ignore
+        ids_ = self.items.intersection(ids)
+        if not ids_:
+            return
+        # backwards, taking a row shifts the ones after it
+        for row in range(self.listWidget.count() - 1, -1, -1):
+            if self.listWidget.item(row).id_ in ids_:  # type: ignore
                 self.listWidget.takeItem(row)
+        self.items -= ids_
         self.listWidget.setCurrentRow(self.listWidget.count() - 1)
+        self.sigItemCountChanged.emit(self.listWidget.count())
 
     def add_item(self, id_: str):
         if id_ in self.items:
@@ -74,7 +83,7 @@ class ZDockAnnotationContent(QWidget, Ui_ZDockAnnotationContent):
         self.listWidget.addItem(item)
         self.listWidget.clearSelection()
         self.listWidget.setCurrentRow(self.listWidget.count() - 1)
-        self.items.append(id_)
+        self.items.add(id_)
         self.sigItemCountChanged.emit(self.listWidget.count())
 
     def add_items(self, ids: List[str]):
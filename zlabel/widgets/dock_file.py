@@ -1,7 +1,7 @@
 import functools
 import re
 import sys
-from typing import List, Optional, TypeAlias, TypeVar, NewType
+from typing import Dict, List, Optional, TypeAlias, TypeVar, NewType
 
 from qtpy.QtWidgets import (
     QCheckBox,
@@ -28,6 +28,8 @@ class ZDockFileContent(QWidget, Ui_ZDockFileContent):
         super().__init__(parent)
         self.setupUi(self)
         self.logger = ZLogger("ZDockFileContent")
+        # anno_id -> row
+        self._rows: Dict[str, int] = {}
         self.ledit_jump.setValidator(QIntValidator(1, 999999, self.ledit_jump))
         self.table_files.itemClicked.connect(lambda it: self.set_qlabels())
         self.table_files.itemClicked.connect(lambda it: self.sigItemClicked.emit(it.id_))
@@ -38,7 +40,8 @@ class ZDockFileContent(QWidget, Ui_ZDockFileContent):
         fetch_finished = 0
         try:
             if self.cbox_fetch_num.currentIndex() == self.cbox_fetch_num.count() - 1:
-                num = 0x3f3f3f
+                # all, the tasks are fetched page by page
+                num = 0
             else:
                 num = int(self.cbox_fetch_num.currentText())
             if self.ckbox_finished.checkState() == Qt.CheckState.Checked:
@@ -66,56 +69,80 @@ class ZDockFileContent(QWidget, Ui_ZDockFileContent):
         return self.table_files.item(row, 1).text()
 
     def set_row_by_txt(self, s: str | None):
-        if s is None:
+        if s is None or s not in self._rows:
             return
-        for row in range(self.table_files.rowCount()):
-            item: ZTableWidgetItem = self.table_files.item(row, 1)  # type: ignore
-            if item.id_ == s:
-                self.table_files.setCurrentCell(row, 0)
-                return
+        self.table_files.setCurrentCell(self._rows[s], 0)
 
     def set_file_list(self, tasks: List[Task] | None = None):
         if tasks is None:
             return
+        self.clear_file_list()
+        self.append_tasks(tasks)
+
+        self.table_files.setCurrentCell(0, 0)
+        self.set_qlabels()
+
+    def clear_file_list(self):
         self.table_files.clear()
         self.table_files.setHorizontalHeaderLabels(["id", "name"])
-        self.table_files.setRowCount(len(tasks))
-        row = 0
+        self.table_files.setRowCount(0)
+        self._rows.clear()
+
+    def append_tasks(self, tasks: List[Task]):
+        row = self.table_files.rowCount()
+        self.table_files.setRowCount(row + len(tasks))
         for task in tasks:
-            self.table_files.setItem(
-                row,
-                0,
-                ZTableWidgetItem(task.anno_id, task.anno_id, finished=task.finished),
-            )
-            self.table_files.setItem(
-                row,
-                1,
-                ZTableWidgetItem(task.anno_id, task.filename, finished=task.finished),
-            )
+            self.set_row(row, task)
             row += 1
+        self.label_all.setText(f"{self.table_files.rowCount()}")
 
-        self.table_files.setCurrentCell(0, 0)
+    def set_row(self, row: int, task: Task):
+        self.table_files.setItem(
+            row,
+            0,
+            ZTableWidgetItem(task.anno_id, task.anno_id, finished=task.finished),
+        )
+        self.table_files.setItem(
+            row,
+            1,
+            ZTableWidgetItem(task.anno_id, task.filename, finished=task.finished),
+        )
+        self._rows[task.anno_id] = row
+
+    def update_tasks(self, tasks: List[Task]):
+        """Refresh the rows of changed tasks in place"""
+        for task in tasks:
+            row = self._rows.get(task.anno_id, None)
+            if row is not None:
+                self.set_row(row, task)
+
+    def remove_tasks(self, anno_ids: List[str]):
+        rows = sorted((self._rows[id_] for id_ in anno_ids if id_ in self._rows), reverse=True)
+        if not rows:
+            return
+        for row in rows:
+            self.table_files.removeRow(row)
+        # rows below the first removed one moved up
+        for row in range(rows[-1], self.table_files.rowCount()):
+            item: ZTableWidgetItem = self.table_files.item(row, 1)  # type: ignore
+            self._rows[item.id_] = row
+        for id_ in anno_ids:
+            self._rows.pop(id_, None)
         self.set_qlabels()
 
     def set_item_finished(self, task: Task):
-        if task is None:
+        if task is None or task.anno_id not in self._rows:
             return
-        for row in range(self.table_files.rowCount()):
-            item: ZTableWidgetItem = self.table_files.item(row, 1)  # type: ignore
-            if item.id_ == task.anno_id:
-                item.set_finished()
-                self.table_files.item(row, 0).set_finished()  # type: ignore
-                return
+        row = self._rows[task.anno_id]
+        self.table_files.item(row, 1).set_finished()  # type: ignore
+        self.table_files.item(row, 0).set_finished()  # type: ignore
 
     def set_item_unfinished(self, task: Task):
-        if task is None:
+        if task is None or task.anno_id not in self._rows:
             return
-        for row in range(self.table_files.rowCount()):
-            item: ZTableWidgetItem = self.table_files.item(row, 1)  # type: ignore
-            if item.id_ == task.anno_id:
-                item.set_unfinished()
-                self.table_files.item(row, 0).set_unfinished()  # type: ignore
-                return
+        row = self._rows[task.anno_id]
+        self.table_files.item(row, 1).set_unfinished()  # type: ignore
+        self.table_files.item(row, 0).set_unfinished()  # type: ignore
 
     def set_qlabels(self):
         row = self.table_files.currentRow()
@@ -135,6 +162,23 @@ class ZDockFileContent(QWidget, Ui_ZDockFileContent):
     def getItem(self, row: int) -> ZTableWidgetItem:
         return self.table_files.item(row, 1)  # type: ignore
 
+    def get_neighbours(self, radius: int) -> List[ZTableWidgetItem]:
+        """Items within radius rows of the current one, nearest first, next before prev"""
+        row = self.currentRow()
+        items = []
+        for d in range(1, radius + 1):
+            for r in (row + d, row - d):
+                if 0 <= r < self.table_files.rowCount():
+                    items.append(self.getItem(r))
+        return items
+
+    def get_page(self, page_size: int) -> List[ZTableWidgetItem]:
+        """Items of the page of page_size rows that holds the current one"""
+        row = max(self.currentRow(), 0)
+        start = row - row % page_size
+        end = min(start + page_size, self.table_files.rowCount())
+        return [self.getItem(r) for r in range(start, end)]
+
     def get_current_task_name(self) -> str:
         row = self.currentRow()
         if row < 0 or row >= self.table_files.rowCount():
@@ -36,9 +36,7 @@ class ZDockLabelContent(QWidget, Ui_ZDockLabelContent):
             widget.set_label_color(color)
 
     def on_btn_delete_clicked(self, id_: str):
-        """
-        TODO: check if the label is used
-        """
+        """The main window tells if results still use the label"""
         row, item = self.find_item_by_id(id_)
         if row is not None:
             self.listw_labels.takeItem(row)
@@ -2,12 +2,14 @@ import copy
 import functools
 import json
 import os
+import time
 from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
 
 import numpy as np
 from PIL import Image
+from pydantic import TypeAdapter
 from qtpy.QtCore import (
     QPoint,
     QPointF,
@@ -16,20 +18,35 @@ from qtpy.QtCore import (
     Qt,
     QThreadPool,
     QTranslator,
+    QTimer,
     Signal,
     Slot,
 )
 from qtpy.QtGui import QSurfaceFormat, QUndoStack
 from qtpy.QtWidgets import QFileDialog, QMainWindow, QMessageBox
 
+from numpy.typing import NDArray
+
 from zlabel.utils import (
     SamApiHelper,
+    AuthManager,
+    AnnotationCache,
+    DeltaUploader,
+    DiskCache,
+    ImageCache,
+    ModelRouter,
+    OfflinePack,
+    AnnotationShards,
+    ProjectDB,
+    ProjectJournal,
+    UploadQueue,
     AutoMode,
     DrawMode,
     SettingsKey,
     StatusMode,
     ZLogger,
     Annotation,
+    LABEL_REFS,
     Label,
     Project,
     Result,
@@ -38,12 +55,18 @@ from zlabel.utils import (
     User,
     id_md5,
     id_uuid4,
+    SaveService,
+    ResultColumns,
+    dump_anno,
+    read_anno,
 )
 from zlabel.utils.enums import RgbMode
+from zlabel.utils.json_stream import JsonStream
 from zlabel.widgets import (
     ZSettings,
     DialogProcessing,
     ZLoginThread,
+    ZPrefetcher,
     ResultUndoMode,
     ZResultUndoCmd,
     Toast,
@@ -52,10 +75,14 @@ from zlabel.widgets import (
     ZTableWidgetItem,
     SamWorkerResult,
     ZGetImageWorker,
+    ZGetPreviewWorker,
+    ZGetAnnosWorker,
     ZGetTasksWorker,
+    ZLoadProjectWorker,
+    ZBuildPackWorker,
     ZPreuploadImageWorker,
     ZSamPredictWorker,
-    ZUploadFileWorker,
+    ZFlushUploadsWorker,
     DialogAbout,
     DialogSettings,
 )
@@ -66,6 +93,9 @@ sfmt = QSurfaceFormat()
 sfmt.setSwapInterval(0)
 QSurfaceFormat.setDefaultFormat(sfmt)
 
+# validates a whole tasks file in one pass from its bytes
+TASKS_ADAPTER = TypeAdapter(List[Task])
+
 
 class MainWindow(QMainWindow, Ui_MainWindow):
     sigSettingsChecked = Signal(bool)
@@ -90,10 +120,33 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.result_old = None
         self.undo_stack = QUndoStack(self)
         self.threadpool = QThreadPool()
+        # annotation files and shards are written in the background, see SaveService
+        self.saver = SaveService()
 
         self.anno_suffix = "zlabel"
         self.last_path = "."
-        self._image_cache: Dict[str, Image.Image] = {}
+        self.image_cache: ImageCache | None = None
+        self.anno_cache: AnnotationCache | None = None
+        self.prefetcher: ZPrefetcher | None = None
+        self.model_router: ModelRouter | None = None
+        self.auth: AuthManager | None = None
+        self.delta_uploader: DeltaUploader | None = None
+        self.upload_queue: UploadQueue | None = None
+        self.offline_pack: OfflinePack | None = None
+        self.journal: ProjectJournal | ProjectDB | None = None
+        self._flushing = False
+        self._tasks_paging = False
+        # tasks, key task and missing annotations before a refresh, put back if it fails
+        self._tasks_before: Tuple[OrderedDict[str, Task], str | None, set[str]] | None = None
+        self._tasks_filter: Tuple[int, int] = (0, 0)
+        # the project is being parsed by a ZLoadProjectWorker, tasks listed so far
+        self._project_loading = False
+        self._load_worker: ZLoadProjectWorker | None = None
+        self._listed_tasks: Dict[str, Task] = {}
+        self._annos_pending: set[str] = set()
+        self._annos_missing: set[str] = set()
+        self._shown_image = ""
+        self._preview_image = ""
         self.threshold = 100
         self.rgb_mode = RgbMode.RGB
 
@@ -101,6 +154,27 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.init_signals()
         self.load_settings()
 
+        self.timer_flush = QTimer(self)
+        self.timer_flush.timeout.connect(self.flush_uploads)
+        self.timer_flush.start(5000)
+
+    def closeEvent(self, event):
+        if self._load_worker is not None:
+            # the store stays open until the load stops reading it, a load still queued
+            # behind other workers never starts
+            self._load_worker.cancel()
+            if not self.threadpool.tryTake(self._load_worker):
+                self._load_worker.done.wait()
+            self._load_worker = None
+        if self.journal is not None:
+            # no project if the login never succeeded, only a placeholder while loading
+            if hasattr(self, "proj") and not self._project_loading:
+                self.journal.put_meta(self.proj)
+            # before the saver, a compaction still writes shards through it
+            self.journal.close()
+        self.saver.close()
+        super().closeEvent(event)
+
     # region functions
     def load_settings(self):
         self.dialog_processing.show()
@@ -118,12 +192,74 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # file exists and check passed
         self.user.name = self.settings.username
         # self.api_alist = AlistApiHelper(self.settings.host, self.settings.url_prefix)
-        self.api_predict = SamApiHelper(
-            self.settings.username, self.settings.password, self.settings.model_api
+        model_apis = self.settings.model_apis
+        self.api_predict = SamApiHelper(self.settings.username, self.settings.password, model_apis[0])
+        if self.model_router is not None:
+            self.model_router.stop()
+        self.model_router = ModelRouter(model_apis)
+        self.model_router.start()
+        self.api_predict.router = self.model_router
+        if self.auth is not None:
+            self.auth.stop()
+        self.auth = AuthManager(
+            self.api_predict.request_token,
+            self.settings.token_path,
+            key=f"{model_apis[0]}|{self.settings.username}",
+        )
+        self.api_predict.set_auth(self.auth)
+        self.auth.start()
+        self.api_predict.hedge_percentile = self.settings.hedge_percentile
+        self.image_cache = ImageCache(
+            self.settings.image_cache_dir,
+            self.settings.cache_memory_mb * 1024 * 1024,
+            self.settings.cache_disk_mb * 1024 * 1024,
+        )
+        self.api_predict.image_store = self.image_cache.disk
+        self.api_predict.anno_store = DiskCache(self.settings.anno_store_dir, 256 * 1024 * 1024)
+        self.anno_cache = AnnotationCache(self.settings.anno_cache_dir)
+        self.delta_uploader = DeltaUploader(self.api_predict, self.settings.acked_dir)
+        self.upload_queue = UploadQueue(self.settings.upload_queue_path)
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = self.open_project_store()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        self.prefetcher = ZPrefetcher(
+            self.api_predict,
+            self.image_cache,
+            radius=self.settings.prefetch_radius,
+            threads=self.settings.prefetch_threads,
+            budget_bytes=self.settings.prefetch_budget_mb * 1024 * 1024,
+            username=self.settings.username,
+            password=self.settings.password,
+            parent=self,
         )
+        self.open_offline_pack()
         self.login()
         self.set_loglevel(self.settings.log_level)
 
+    def open_project_store(self) -> ProjectJournal | ProjectDB:
+        journal = ProjectJournal(
+            self.settings.project_path,
+            shards=AnnotationShards(
+                self.settings.shard_dir,
+                self.settings.anno_memory_mb * 1024 * 1024,
+                self.settings.anno_format,
+                saver=self.saver,
+            ),
+        )
+        if self.settings.project_backend != "sqlite":
+            return journal
+        db = ProjectDB(self.settings.project_db_path)
+        if not db.exists() and journal.path.exists():
+            try:
+                db.import_project(journal.load(), journal.load_anno)  # type: ignore
+                self.logger.info(f"Imported {journal.path} into {db.path}")
+            except Exception as e:
+                self.logger.error(f"Import {journal.path} failed, {e=}")
+        journal.close()
+        return db
+
     def login(self):
         # TODO: use async or worker?
         self.login_thread = ZLoginThread(
@@ -155,9 +291,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.logger.info(f"Login success, {self.settings.username=}")
         self.dialog_settings.close()
 
+        if self.journal is not None and self.journal.exists():
+            # a large project takes a while to parse, its file list fills meanwhile
+            self.load_project()
+            return
         self.restore_project()
         # self.restore_annotations()
+        self.show_project()
 
+    def show_project(self, listed: bool = False):
+        """Show the loaded project, listed if its tasks are already in the file list"""
         self.actionSAM.setChecked(self.sam_enabled)
         self.actionOpenCV.setChecked(self.cv_enabled)
 
@@ -165,14 +308,16 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             tasks = list(self.proj.tasks.values())
             if self.proj.key_task is None:
                 self.proj.key_task = list(self.proj.tasks.keys())[0]
-            self.dockcnt_files.set_file_list(tasks)
+            if not listed:
+                self.dockcnt_files.set_file_list(tasks)
             self.dockcnt_files.set_row_by_txt(self.proj.key_task)
 
             if self.proj.crt_anno is None:
                 self.on_dock_files_item_clicked(self.proj.key_task)
-            labels = list(self.proj.crt_anno.labels.keys())  # type: ignore
-            if len(labels) > 0:
-                self.proj.crt_anno.key_label = labels[0]  # type: ignore
+            if self.proj.crt_anno is not None:
+                labels = list(self.proj.crt_anno.labels.keys())
+                if len(labels) > 0:
+                    self.proj.crt_anno.key_label = labels[0]
 
         if self.proj.crt_anno and self.proj.crt_anno.labels:
             self.dockcnt_labels.set_labels(
@@ -188,14 +333,75 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.dialog_processing.close()
 
     def refresh_tasks(self, tasks: List[Task]):
+        self._annos_missing.clear()
         self.proj.tasks.clear()
         for task in tasks:
             self.proj.add_task(task)
         self.proj.reset_task_key()
-        self.proj.save_json(self.settings.project_path)
+        # imported tasks don't belong to any sync cursor
+        self.proj.sync_cursor = None
+        self.proj.sync_filter = None
+        self.save_project()
         if self.user_token:
             self.on_login_success(self.user_token)
 
+    def load_project(self):
+        self._project_loading = True
+        self._listed_tasks.clear()
+        self._annos_missing.clear()
+        self.proj = Project.new(
+            name=self.settings.project_name, description=self.settings.project_description
+        )
+        self.dockcnt_files.clear_file_list()
+        worker = ZLoadProjectWorker(self.journal, self.settings.tasks_page_size)  # type: ignore
+        worker.emitter.page.connect(self.on_load_project_page)
+        worker.emitter.success.connect(self.on_load_project_success)
+        worker.emitter.fail.connect(self.on_load_project_failed)
+        self._load_worker = worker
+        self.threadpool.start(worker)
+
+    def on_load_project_page(self, tasks: List[Task]):
+        for task in tasks:
+            self._listed_tasks[task.anno_id] = task
+        self.dockcnt_files.append_tasks(tasks)
+        self.dockcnt_files.set_qlabels()
+
+    def on_load_project_success(self, proj: Project | None):
+        self._project_loading = False
+        self._load_worker = None
+        if proj is None:
+            self.create_project()
+            self.show_project()
+            return
+        self.proj = proj
+        # the journal was replayed after the pages were listed
+        listed = self._listed_tasks
+        gone = [id_ for id_ in listed if id_ not in proj.tasks]
+        added = [t for id_, t in proj.tasks.items() if id_ not in listed]
+        updated = [t for id_, t in proj.tasks.items() if id_ in listed and listed[id_] is not t]
+        self.dockcnt_files.remove_tasks(gone)
+        self.dockcnt_files.append_tasks(added)
+        self.dockcnt_files.update_tasks(updated)
+        self.dockcnt_files.set_qlabels()
+        self._listed_tasks = {}
+        self.show_project(listed=True)
+
+    def on_load_project_failed(self, msg: str):
+        self._project_loading = False
+        self._load_worker = None
+        self._listed_tasks = {}
+        button = QMessageBox.critical(
+            self,
+            "Error",
+            f"Load project Error! {msg}, create new and overwrite?",
+            QMessageBox.StandardButton.Ok,
+            QMessageBox.StandardButton.Cancel,
+        )
+        if button == QMessageBox.StandardButton.Ok:
+            self.dockcnt_files.clear_file_list()
+            self.create_project()
+        self.show_project()
+
     def load_tasks(self, path: str):
         if not os.path.exists(path):
             QMessageBox.critical(
@@ -205,8 +411,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 QMessageBox.StandardButton.Ok,
             )
             return
+        # parsed a page at a time, only one page of raw dicts is held besides the tasks
+        tasks: List[Task] = []
+        page: List[Any] = []
         with open(path, "r", encoding="utf-8") as f:
-            tasks = [Task.model_validate(t) for t in json.load(f)]
+            stream = JsonStream(f)
+            for _ in stream.elements():
+                page.append(stream.value())
+                if len(page) >= self.settings.tasks_page_size:
+                    tasks.extend(TASKS_ADAPTER.validate_python(page))
+                    page = []
+        tasks.extend(TASKS_ADAPTER.validate_python(page))
         # ^ use anno_id as key to simplify object get/set in files list
         QMessageBox.information(
             self,
@@ -217,30 +432,98 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         return tasks
 
     def load_tasks_remote(self):
+        """Sync the changes since the last fetch with the same filter, otherwise fetch everything"""
+        if self._project_loading:
+            self.show_toast("Project is still loading")
+            return
+        self._tasks_filter = (self.settings.fetch_num, self.settings.fetch_finished)
+        since = None
+        if self.proj.tasks and self.proj.sync_filter == self._tasks_filter:
+            since = self.proj.sync_cursor
         worker = ZGetTasksWorker(
             self.api_predict,
             self.settings.fetch_num,
             self.settings.fetch_finished,
             self.settings.username,
             self.settings.password,
+            page_size=self.settings.tasks_page_size,
+            since=since,
         )
+        self._tasks_paging = False
+        worker.emitter.page.connect(self.on_get_tasks_page)
         worker.emitter.success.connect(self.on_get_tasks_success)
+        worker.emitter.changes.connect(self.on_get_task_changes)
+        worker.emitter.synced.connect(self.on_get_tasks_synced)
         worker.emitter.fail.connect(self.on_get_tasks_failed)
         self.threadpool.start(worker)
 
-    def on_get_tasks_success(self, tasks: List[Task]):
-        self.refresh_tasks(tasks)
-
-        self.dockcnt_files.set_file_list(tasks)
-        self.dockcnt_files.set_row_by_txt(self.proj.key_task)
+    def begin_refresh_tasks(self):
+        # keep the work on the current task before its task list goes away
+        self.on_action_finish_triggered()
+        self._tasks_before = (self.proj.tasks, self.proj.key_task, set(self._annos_missing))
+        self._annos_missing.clear()
+        self.proj.tasks = OrderedDict()
+        self.proj.key_task = None
+        self.dockcnt_files.clear_file_list()
+
+    def on_get_tasks_page(self, tasks: List[Task]):
+        first = not self._tasks_paging
+        if first:
+            self._tasks_paging = True
+            self.begin_refresh_tasks()
+        for task in tasks:
+            self.proj.add_task(task)
+        self.dockcnt_files.append_tasks(tasks)
+        if first:
+            # the first page is enough to start labeling while the rest loads
+            self.proj.reset_task_key()
+            self.dockcnt_files.set_row_by_txt(self.proj.key_task)
+            self.dockcnt_files.set_qlabels()
+            if self.proj.key_task is not None:
+                self.on_dock_files_item_clicked(self.proj.key_task)
+        else:
+            self.proj.key_task = self.dockcnt_files.get_current_task_id() or None
+
+    def on_get_tasks_success(self, total: int, cursor: str | None):
+        if not self._tasks_paging:
+            self.begin_refresh_tasks()
+        self._tasks_paging = False
+        self._tasks_before = None
+        self.proj.sync_cursor = cursor
+        self.proj.sync_filter = self._tasks_filter if cursor is not None else None
+        self.save_project()
+        self.dockcnt_files.set_qlabels()
         QMessageBox.information(
             self,
             "Info",
-            f"Import {len(tasks)} Tasks Success!",
+            f"Import {total} Tasks Success!",
             QMessageBox.StandardButton.Ok,
         )
 
+    def on_get_task_changes(self, upserts: List[Task], removed: List[str]):
+        # the task being labeled stays, its work is not lost to a sync
+        removed = [id_ for id_ in removed if id_ != self.proj.key_task]
+        added, updated, gone = self.proj.merge_tasks(upserts, removed, limit=self._tasks_filter[0])
+        self._annos_missing.difference_update(gone)
+        self.dockcnt_files.append_tasks(added)
+        self.dockcnt_files.update_tasks(updated)
+        self.dockcnt_files.remove_tasks(gone)
+        self.dockcnt_files.set_row_by_txt(self.proj.key_task)
+        self.dockcnt_files.set_qlabels()
+        if self.journal is not None:
+            for task in added + updated:
+                self.journal.put_task(task)
+            self.journal.remove_tasks(gone)
+
+    def on_get_tasks_synced(self, total: int, cursor: str | None):
+        self.proj.sync_cursor = cursor
+        if self.journal is not None:
+            self.journal.put_meta(self.proj)
+        self.statusbar.showMessage(f"Synced {total} task changes")
+
     def on_get_tasks_failed(self, msg: str):
+        if self._tasks_paging:
+            self.restore_tasks_before()
         QMessageBox.critical(
             self,
             "Error",
@@ -248,49 +531,118 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.StandardButton.Ok,
         )
 
+    def restore_tasks_before(self):
+        """Put back the task list a failed refresh had started to replace"""
+        self._tasks_paging = False
+        if self._tasks_before is None:
+            return
+        self.on_action_finish_triggered()
+        self.proj.tasks, key_task, annos_missing = self._tasks_before
+        self._tasks_before = None
+        self._annos_missing = annos_missing
+        self.dockcnt_files.set_file_list(list(self.proj.tasks.values()))
+        self.proj.key_task = key_task
+        if self.proj.key_task not in self.proj.tasks:
+            self.proj.reset_task_key()
+        self.dockcnt_files.set_row_by_txt(self.proj.key_task)
+        self.dockcnt_files.set_qlabels()
+        if self.proj.key_task is not None:
+            self.on_dock_files_item_clicked(self.proj.key_task)
+
     def create_project(self):
         self.proj = Project.new(
             name=self.settings.project_name,
             description=self.settings.project_description,
         )
-        self.proj.save_json(self.settings.project_path)
+        self.save_project()
 
-    def try_set_image(self, image: Image.Image | None = None):
-        if self.proj.crt_task is None:
+    def save_project(self):
+        """Write the whole project, changes to parts of it go to the journal instead"""
+        if self._project_loading:
+            # the project is partial until it is loaded
+            return
+        if self.journal is not None:
+            self.journal.rewrite(self.proj)
+        else:
+            self.save_project_json()
+
+    def save_project_json(self):
+        proj = self.proj.snapshot()
+        self.saver.submit(
+            self.settings.project_path,
+            lambda: proj.model_dump_json(indent=4, context=LABEL_REFS).encode("utf-8"),
+        )
+
+    def try_set_image(self, image: NDArray[np.uint8] | None = None):
+        if self.proj.crt_task is None or self.image_cache is None:
             return
         if image is None:
             img_name = self.proj.crt_task.filename
-            if img_name not in self._image_cache:
+            image = self.image_cache.peek(img_name, count_hit=True)
+            if image is None:
+                # disk tier and network are both handled off the UI thread
                 worker = ZGetImageWorker(
                     self.api_predict,
                     img_name,
                     self.settings.username,
                     self.settings.password,
+                    cache=self.image_cache,
+                    pack=self.offline_pack,
                 )
-                worker.emitter.success.connect(self.cache_image)
                 worker.emitter.success.connect(self.on_try_set_image_get_success)
                 worker.emitter.fail.connect(self.on_get_image_fail)
                 self.dialog_processing.show()
+                packed = self.offline_pack is not None and self.offline_pack.has_image(img_name)
+                if self.settings.preview_size > 0 and not packed:
+                    preview = ZGetPreviewWorker(
+                        self.api_predict,
+                        img_name,
+                        self.settings.preview_size,
+                        self.settings.username,
+                        self.settings.password,
+                        cache=self.image_cache,
+                    )
+                    preview.emitter.success.connect(self.on_get_image_preview)
+                    self.threadpool.start(preview, 1)
                 self.threadpool.start(worker)
                 self.logger.info(f"getting {img_name}")
             else:
-                self.on_try_set_image_get_success(img_name, self._image_cache[img_name])
+                self.on_try_set_image_get_success(img_name, image)
+            self.logger.debug(f"Image cache: {self.image_cache.stats}")
         else:
-            self.on_try_set_image_get_success("", image)
+            self.on_try_set_image_get_success(self.proj.crt_task.filename, image)
 
-    def on_try_set_image_get_success(self, name: str, image: Image.Image):
-        if self.proj.crt_anno is None:
+    def on_try_set_image_get_success(self, name: str, image: NDArray[np.uint8]):
+        if self.proj.crt_task is None or self.proj.crt_task.filename != name:
             return
         # upload and set image to speed up prediction
         # TODO: add uploaded cache and ignore if an image is already uploaded
         # self.run_preupload_img_worker(image)
 
-        self.proj.crt_anno.original_height = image.height
-        self.proj.crt_anno.original_width = image.width
         self.canvas.clear_image()
-        self.canvas.set_image(np.asarray(image, dtype=np.uint8))
+        self.canvas.set_image(image)
+        self._shown_image = name
+        self._preview_image = ""
         self.canvas.set_rgb(self.rgb_mode)
-        self.dialog_processing.close()
+        # the annotation may still be on its way
+        if self.proj.crt_anno is not None:
+            self.proj.crt_anno.original_height = image.shape[0]
+            self.proj.crt_anno.original_width = image.shape[1]
+            self.dialog_processing.close()
+
+    def on_get_image_preview(self, name: str, image: NDArray[np.uint8], size: Tuple[int, int]):
+        if self.proj.crt_task is None or self.proj.crt_task.filename != name:
+            return
+        if self._shown_image == name:
+            # the full image won the race
+            return
+        self.canvas.clear_image()
+        self.canvas.set_image(image, size)
+        self._preview_image = name
+        self.canvas.set_rgb(self.rgb_mode)
+        if self.proj.crt_anno is not None:
+            self.proj.crt_anno.original_height, self.proj.crt_anno.original_width = size
+            self.dialog_processing.close()
 
     def on_get_image_fail(self, msg: str):
         self.dialog_processing.close()
@@ -306,6 +658,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.logger.error(f"Current annotation is None! {self.proj.crt_task=}")
             return
         self.proj.crt_anno.add_result(result)
+        if self.journal is not None:
+            self.journal.put_result(self.proj.crt_anno, result)
         self.canvas.create_item_by_result(result)
         self.dockcnt_info.set_info_by_result(result)
         self.dockcnt_anno.add_item(result.id)
@@ -329,18 +683,29 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.logger.debug(f"{id_=}, {self.current_anno.results.keys()=}")  # type: ignore
             return
         self.proj.crt_anno.remove_result(id_)
+        if self.journal is not None:
+            self.journal.remove_result(self.proj.crt_anno, id_)
         self.canvas.remove_items_by_ids([id_])
         self.dockcnt_anno.remove_item(id_)
 
     def remove_results(self, ids: List[str]):
-        for id_ in ids:
-            self.remove_result(id_)
+        if self.proj.crt_anno is None:
+            return
+        ids = self.proj.crt_anno.remove_results(ids)
+        if not ids:
+            return
+        if self.journal is not None:
+            self.journal.remove_results(self.proj.crt_anno, ids)
+        self.canvas.remove_items_by_ids(ids)
+        self.dockcnt_anno.remove_items(ids)
 
     def modify_result(self, result: Result):
         if self.proj.crt_anno is None or result.id not in self.proj.crt_anno.results:
             return
         self.logger.debug(f"{result=}\n{self.result_old=}")
         self.proj.crt_anno.results.update({result.id: result})
+        if self.journal is not None:
+            self.journal.put_result(self.proj.crt_anno, result)
         self.dockcnt_info.set_info_by_result(result)
         self.dockcnt_anno.set_row_by_text(result.id)
         self.canvas.set_item_state_by_result(result, update=False)
@@ -354,6 +719,23 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             anno.key_label = list(anno.labels.keys())[0]
         self.proj.key_task = anno.id
         self.proj.add_annotation(anno)
+        if self.journal is not None:
+            self.journal.put_anno(anno)
+        self.evict_annos()
+
+    def evict_annos(self):
+        """Drop the least recently used annotations from memory, they are kept in their shards"""
+        journal = self.journal
+        shards = journal.shards if journal is not None else None
+        if journal is None or shards is None:
+            return
+        for anno_id in shards.over_budget(keep=[self.proj.key_task]):
+            task = self.proj.tasks.get(anno_id, None)
+            if task is not None and task.anno is not None:
+                # its journaled result edits go to the shard with it
+                journal.put_anno(task.anno)
+                task.anno = None
+            shards.forget(anno_id)
 
     def check_label_ok(self):
         if self.proj.crt_label is None:
@@ -383,14 +765,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def restore_project(self):
         path = Path(self.settings.project_path)
-        if not path.exists():
+        if not (self.journal.exists() if self.journal is not None else path.exists()):
             if not path.parent.exists():
                 path.parent.mkdir(parents=True)
             self.create_project()
         else:
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    self.proj = Project.model_validate_json(f.read())
+                if self.journal is not None:
+                    self.proj = self.journal.load()  # type: ignore
+                else:
+                    with open(path, "r", encoding="utf-8") as f:
+                        self.proj = Project.model_validate_json(f.read())
             except Exception as e:
                 button = QMessageBox.critical(
                     self,
@@ -408,9 +793,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         annos = list(path.glob(f"*.{self.anno_suffix}"))
         for p in annos:
             try:
-                with open(p, "r", encoding="utf-8") as f:
-                    anno = Annotation.model_validate_json(f.read())
-                self.add_annotation(anno)
+                self.add_annotation(read_anno(p))
             except Exception as e:
                 self.logger.warning(f"validate {p=} failed with {e=}")
         self.proj.reset_task_key()
@@ -425,6 +808,214 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         )
         self.threadpool.start(self.preupload_worker)
 
+    def prefetch_neighbours(self):
+        if self.prefetcher is None:
+            return
+        items = self.dockcnt_files.get_neighbours(self.prefetcher.radius)
+        tasks = [self.proj.tasks[it.id_] for it in items if it.id_ in self.proj.tasks]
+        self.prefetcher.schedule([task.filename for task in tasks])
+        self.fetch_annos([task.anno_id for task in tasks])
+
+    def fetch_annos(self, anno_ids: List[str]):
+        """Fetch the remote annotations of anno_ids that are not known yet, in one request"""
+        if self.anno_cache is None:
+            return
+        ids = []
+        for anno_id in anno_ids:
+            task = self.proj.tasks.get(anno_id, None)
+            if (
+                task is None
+                or task.anno is not None
+                or anno_id in self._annos_pending
+                or anno_id in self._annos_missing
+                or (self.journal is not None and self.journal.has_anno(anno_id))
+                or self.anno_cache.contains(anno_id)
+                or (self.offline_pack is not None and self.offline_pack.has_zlabel(anno_id))
+            ):
+                continue
+            ids.append(anno_id)
+        if not ids:
+            return
+        self._annos_pending.update(ids)
+        worker = ZGetAnnosWorker(
+            self.api_predict,
+            ids,
+            self.anno_cache,
+            self.anno_suffix,
+            self.settings.username,
+            self.settings.password,
+        )
+        worker.emitter.success.connect(self.on_get_annos_success)
+        worker.emitter.fail.connect(self.on_get_annos_failed)
+        self.threadpool.start(worker)
+        self.logger.debug(f"getting {len(ids)} annos")
+
+    def on_get_annos_success(self, found: List[str], missing: List[str]):
+        self._annos_pending.difference_update(found)
+        self._annos_pending.difference_update(missing)
+        self._annos_missing.update(missing)
+        task = self.proj.crt_task
+        if task is not None and task.anno is None and task.anno_id in found + missing:
+            self.hydrate_crt_anno()
+
+    def on_get_annos_failed(self, anno_ids: List[str], msg: str):
+        self._annos_pending.difference_update(anno_ids)
+        self.logger.warning(msg)
+        task = self.proj.crt_task
+        if task is not None and task.anno is None and task.anno_id in anno_ids:
+            self.hydrate_crt_anno()
+
+    def hydrate_crt_anno(self):
+        """Set the annotation of the current task from the local cache, create it if not found"""
+        task = self.proj.crt_task
+        if task is None:
+            return
+        anno = self.journal.load_anno(task.anno_id) if self.journal else None
+        if anno is None and self.anno_cache is not None:
+            anno = self.anno_cache.take(task.anno_id)
+        if anno is None and self.offline_pack is not None:
+            anno = self.offline_pack.annotation(task.anno_id)
+        if anno is not None:
+            self.logger.info(f"Got anno from cache, added {task.anno_id}")
+        else:
+            labels = OrderedDict()
+            for name in task.labels:
+                label = Label(id=id_uuid4(), name=name, color=self.settings.color)
+                labels[label.id] = label
+            anno = Annotation.new(
+                image_path=task.filename,
+                width=0,
+                height=0,
+                create_user=self.user,
+                id_=task.anno_id,
+                labels=labels,
+            )
+            self.logger.warning(f"{task.anno_id=} not found in remote, created")
+        self.add_annotation(anno)
+        size = self.image_size
+        if size is not None:
+            anno.original_height, anno.original_width = size
+            self.dialog_processing.close()
+        self.show_crt_anno()
+
+    def show_crt_anno(self):
+        if self.proj.crt_anno is None:
+            self.canvas.clear_all_items()
+            self.dockcnt_anno.clear_items()
+            self.dockcnt_info.set_info_by_anno(None)
+            return
+        self.dockcnt_info.set_info_by_anno(self.proj.crt_anno)
+        self.dockcnt_anno.add_items_by_anno(self.proj.crt_anno)
+        self.dockcnt_anno.set_row_by_text(self.proj.key_result)
+        self.dockcnt_anno.set_title()
+        self.dockcnt_labels.set_labels(list(self.proj.crt_anno.labels.values()), self.proj.crt_anno.key_label)
+        self.dockcnt_labels.set_color(self.settings.color)
+
+        # clear items in canvas
+        self.canvas.update_by_anno(self.proj.crt_anno)
+
+    def flush_uploads(self):
+        """Upload what is due in the queue, in batches, one flush at a time"""
+        if self._flushing or self.upload_queue is None or self.delta_uploader is None:
+            return
+        next_due = self.upload_queue.next_due()
+        if next_due is None or next_due > time.time():
+            return
+        self._flushing = True
+        worker = ZFlushUploadsWorker(
+            self.api_predict,
+            self.upload_queue,
+            self.delta_uploader,
+            self.settings.upload_batch_size,
+            self.settings.username,
+            self.settings.password,
+            saver=self.saver,
+        )
+        worker.emitter.success.connect(self.show_toast)
+        worker.emitter.fail.connect(self.show_toast)
+        worker.emitter.finished.connect(self.on_flush_uploads_finished)
+        self.threadpool.start(worker)
+
+    def on_flush_uploads_finished(self):
+        self._flushing = False
+
+    def set_offline_pack(self, pack: OfflinePack | None):
+        if self.offline_pack is not None and self.offline_pack is not pack:
+            self.offline_pack.close()
+        self.offline_pack = pack
+        if self.prefetcher is not None:
+            self.prefetcher.pack = pack
+        if pack is not None:
+            self._annos_missing.update(pack.missing)
+
+    def open_offline_pack(self):
+        path = self.settings.offline_pack_path
+        if not os.path.exists(path):
+            self.set_offline_pack(None)
+            return
+        try:
+            pack = OfflinePack(path)
+            self.set_offline_pack(pack)
+            self.logger.info(f"Opened offline pack with {len(pack)} tasks")
+        except Exception as e:
+            self.logger.warning(f"Open offline pack {path} failed, {e=}")
+            self.set_offline_pack(None)
+
+    def build_offline_pack(self):
+        """Pack the unfinished tasks of the file list to label them without network"""
+        tasks = [task for task in self.proj.tasks.values() if not task.finished]
+        if not tasks:
+            self.show_toast("No unfinished tasks to pack")
+            return
+        # the old pack is replaced by the new file, it can't stay mapped meanwhile
+        self.set_offline_pack(None)
+        worker = ZBuildPackWorker(
+            self.api_predict,
+            self.settings.offline_pack_path,
+            tasks,
+            self.anno_suffix,
+            self.settings.prefetch_threads * 4,
+            self.settings.username,
+            self.settings.password,
+        )
+        worker.emitter.progress.connect(
+            lambda done, total: self.statusbar.showMessage(f"Offline pack {done}/{total}")
+        )
+        worker.emitter.success.connect(self.on_build_offline_pack_success)
+        worker.emitter.fail.connect(self.on_build_offline_pack_failed)
+        self.threadpool.start(worker)
+
+    def on_build_offline_pack_success(self, pack: OfflinePack, failed: List[Task]):
+        self.set_offline_pack(pack)
+        msg = f"Packed {len(pack)} tasks"
+        if failed:
+            msg += f", {len(failed)} images failed"
+        self.show_toast(msg)
+
+    def on_build_offline_pack_failed(self, msg: str):
+        self.logger.warning(msg)
+        self.show_toast(msg)
+        self.open_offline_pack()
+
+    def sync_offline_pack(self):
+        """Queue every finished annotation of the pack for upload, they go in batches"""
+        if self.offline_pack is None or self.upload_queue is None:
+            return
+        n = 0
+        for packed in self.offline_pack.tasks:
+            task = self.proj.tasks.get(packed.anno_id, None)
+            filename = f"{self.settings.project_dir}/annos/{packed.anno_id}.{self.anno_suffix}"
+            if task is None or not task.finished:
+                continue
+            # the queue entry is on disk at once, its file has to be as well
+            self.saver.flush(filename)
+            if not os.path.exists(filename):
+                continue
+            self.upload_queue.put(packed.anno_id, filename)
+            n += 1
+        self.show_toast(f"Syncing {n} annotations")
+        self.flush_uploads()
+
     def show_toast(self, msg: str):
         toast = Toast(msg, timeout=1000, parent=self)
         toast.show()
@@ -437,15 +1028,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         return [task.filename for task in self.proj.tasks.values()]
 
     @property
-    def current_image(self) -> Image.Image | None:
-        if self.proj.crt_task is not None:
-            img_name = self.proj.crt_task.filename
-            if img_name in self._image_cache:
-                return self._image_cache[img_name]
+    def current_image(self) -> NDArray[np.uint8] | None:
+        # the canvas keeps a reference, so it survives eviction from the memory tier
+        if self.proj.crt_task is not None and self.proj.crt_task.filename == self._shown_image:
+            return self.canvas.current_image
         return None
 
-    def cache_image(self, img_name: str, img: Image.Image):
-        self._image_cache[img_name] = img
+    @property
+    def image_size(self) -> Tuple[int, int] | None:
+        """(height, width) of the current task's image, known as soon as its preview is shown"""
+        if self.proj.crt_task is None:
+            return None
+        if self.proj.crt_task.filename in (self._shown_image, self._preview_image):
+            return self.canvas.image_size
+        return None
 
     @property
     def auto_mode(self):
@@ -521,7 +1117,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.on_dock_files_item_clicked(item.id_)
 
     def on_action_save_triggered(self):
-        self.proj.save_json(self.settings.project_path)
+        if self._project_loading:
+            return
+        if self.journal is None:
+            self.save_project_json()
+            return
+        self.journal.put_meta(self.proj)
+        if self.proj.crt_anno is not None:
+            self.journal.put_anno(self.proj.crt_anno)
 
     def on_action_undo_triggered(self):
         if self.undo_stack.canUndo():
@@ -548,21 +1151,21 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
         self.on_action_save_triggered()
         filename = f"{self.settings.project_dir}/annos/{self.proj.crt_anno.id}.{self.anno_suffix}"
-        self.proj.crt_anno.save_json(filename)
+        # a burst of Next presses writes the file once
+        anno, anno_format = self.proj.crt_anno.snapshot(), self.settings.anno_format
+        self.saver.submit(filename, lambda: dump_anno(anno, anno_format, indent=4))
 
         # if triggered by click, set task finished and upload
         if self.sender() == self.actionFinish:
             self.proj.crt_task.finished = True
             self.dockcnt_files.set_item_finished(self.proj.crt_task)
-            self.worker_upload = ZUploadFileWorker(
-                self.api_predict,
-                filename,
-                self.settings.username,
-                self.settings.password,
-            )
-            self.worker_upload.emitter.fail.connect(self.show_toast)
-            self.worker_upload.emitter.success.connect(self.show_toast)
-            self.threadpool.start(self.worker_upload)
+            if self.journal is not None:
+                self.journal.put_task(self.proj.crt_task)
+            if self.upload_queue is not None:
+                # a crash after the entry but before the delayed write would drop the upload
+                self.saver.flush(filename)
+                self.upload_queue.put(self.proj.crt_anno.id, filename)
+                self.flush_uploads()
 
     def on_action_cancel_triggered(self):
         self.canvas.clear_all_items()
@@ -571,9 +1174,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.dockcnt_info.set_info_by_anno(None)
         if self.proj.crt_anno:
             self.proj.crt_anno.reset_results()
+            if self.journal is not None:
+                self.journal.put_anno(self.proj.crt_anno)
         if self.proj.crt_task:
             self.proj.crt_task.finished = False
             self.dockcnt_files.set_item_unfinished(self.proj.crt_task)
+            if self.journal is not None:
+                self.journal.put_task(self.proj.crt_task)
 
     def on_action_SAM_triggered(self):
         self.sam_enabled = self.actionSAM.isChecked()
@@ -699,6 +1306,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
         label = Label(id=id_uuid4(), name=txt, color=self.settings.color)
         self.proj.crt_anno.add_label(label)
+        if self.journal is not None:
+            self.journal.put_anno(self.proj.crt_anno)
         self.dockcnt_labels.add_label(label)
 
     def on_dock_label_btn_dec_clicked(self):
@@ -707,30 +1316,40 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.dockcnt_labels.remove_label(row)
         if self.proj.crt_anno is not None:
             self.proj.crt_anno.remove_label(item.id_)
+            if self.journal is not None:
+                self.journal.put_anno(self.proj.crt_anno)
         else:
             self.logger.warning(f"Current anno is None, {self.proj.crt_task=}")
 
     def on_dock_label_listw_item_clicked(self, item: ZListWidgetItem):
         if self.proj.crt_anno:
             self.proj.crt_anno.key_label = item.id_
-            label = self.proj.crt_anno.labels[item.id_]
-            for r in self.proj.crt_anno.results.values():
-                r.labels = [label]
+            self.proj.crt_anno.relabel(item.id_)
+            # every result changed, the whole annotation is one record
+            if self.journal is not None:
+                self.journal.put_anno(self.proj.crt_anno)
         else:
             self.logger.warning(f"Current anno is None, {self.proj.crt_task=}")
 
     def on_dock_label_btn_del_clicked(self, id_: str):
         if self.proj.crt_anno:
+            used = ResultColumns.from_annotation(self.proj.crt_anno).label_counts().get(id_, 0)
+            if used:
+                self.show_toast(f"{used} results keep the deleted label")
             self.proj.crt_anno.remove_label(id_)
+            if self.journal is not None:
+                self.journal.put_anno(self.proj.crt_anno)
         else:
             self.logger.warning(f"Current anno is None, {self.proj.crt_task=}")
 
     def on_dock_label_item_color_changed(self, id_: str, color: str):
         if self.proj.crt_anno:
+            # the results share the label, this recolours them all
             self.proj.crt_anno.labels[id_].color = color
             if id_ == self.proj.crt_anno.key_label:
                 self.canvas.set_color(color)
-                self.proj.crt_anno.set_color(color)
+            if self.journal is not None:
+                self.journal.put_anno(self.proj.crt_anno)
             self.logger.debug(f"Labels color changed: {self.proj.crt_anno.labels=}")
         else:
             self.logger.warning(f"Current anno is None, {self.proj.crt_task=}")
@@ -744,13 +1363,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.logger.warning(f"Current Result is None, {self.proj.crt_anno=}")
             return
         self.proj.crt_result.note = s
+        if self.journal is not None:
+            self.journal.put_result(self.proj.crt_anno, self.proj.crt_result)  # type: ignore
 
     def on_dock_info_btn_del_clicked(self):
-        self.canvas.remove_selected_items()
-        if self.proj.crt_anno:
-            self.proj.crt_anno.remove_result(self.proj.crt_anno.key_result)
-        else:
+        if self.proj.crt_anno is None:
             self.logger.warning(f"Current anno is None, {self.proj.crt_task=}")
+            return
+        # both remove through the undo stack, which journals them
+        if self.canvas.selected_items:
+            self.canvas.remove_selected_items()
+        elif self.proj.crt_result is not None:
+            self.add_result_undo_cmd([self.proj.crt_result], ResultUndoMode.REMOVE)
 
     # endregion
 
@@ -779,6 +1403,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     # region DockFiles
     ##### DockFiles #####
     def on_dock_files_item_clicked(self, task_id: str):
+        if self._project_loading:
+            self.show_toast("Project is still loading")
+            return
         # save first
         self.on_action_finish_triggered()
 
@@ -788,49 +1415,32 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.logger.warning(f"Current task is None, {self.proj.tasks=}")
             return
 
-        # if the current anno is None:
-        # 1. try to fetch from remote
-        # 2. if not existed in remote, create
-        if self.proj.crt_anno is None:
-            task = self.proj.tasks[task_id]
-            labels = OrderedDict()
-            for name in task.labels:
-                label = Label(id=id_uuid4(), name=name, color=self.settings.color)
-                labels[label.id] = label
-            try:
-                name = f"{task.anno_id}.{self.anno_suffix}"
-                anno_json = self.api_predict.get_zlabel(name=name)
-                if anno_json is None:
-                    raise Exception(f"Response of {name} is None")
-                anno = Annotation.model_validate_json(anno_json)
-                self.add_annotation(anno)
-                self.logger.info(f"Got anno from remote, added {name}")
-            except Exception as e:
-                self.add_annotation(
-                    Annotation.new(
-                        image_path=task.filename,
-                        width=0,
-                        height=0,
-                        create_user=self.user,
-                        id_=task.anno_id,
-                        labels=labels,
-                    )
-                )
-                self.logger.warning(f"{task.anno_id=} not found in remote, created, {e=}")
-
         self.try_set_image()
 
-        # update ui
-        # ^ hereafter, self.proj.crt_anno won't be None
-        self.dockcnt_info.set_info_by_anno(self.proj.crt_anno)
-        self.dockcnt_anno.add_items_by_anno(self.proj.crt_anno)
-        self.dockcnt_anno.set_row_by_text(self.proj.key_result)
-        self.dockcnt_anno.set_title()
-        self.dockcnt_labels.set_labels(list(self.proj.crt_anno.labels.values()), self.proj.crt_anno.key_label)  # type: ignore
-        self.dockcnt_labels.set_color(self.settings.color)
+        # if the current anno is None:
+        # 1. hydrate from the local cache
+        # 2. if unknown, fetch the whole page from remote without blocking the UI
+        # 3. if not existed in remote, create
+        task = self.proj.crt_task
+        if task.anno is None:
+            if (
+                task.anno_id in self._annos_missing
+                or (self.journal is not None and self.journal.has_anno(task.anno_id))
+                or (self.anno_cache is not None and self.anno_cache.contains(task.anno_id))
+                or (self.offline_pack is not None and self.offline_pack.has_zlabel(task.anno_id))
+            ):
+                self.hydrate_crt_anno()
+            else:
+                self.show_crt_anno()
+                self.dialog_processing.show()
+                page = self.dockcnt_files.get_page(self.settings.anno_page_size)
+                self.fetch_annos([task_id] + [it.id_ for it in page])
+                if task_id not in self._annos_pending:
+                    self.hydrate_crt_anno()
+        else:
+            self.show_crt_anno()
 
-        # clear items in canvas
-        self.canvas.update_by_anno(self.proj.crt_anno)
+        self.prefetch_neighbours()
 
     def on_dock_files_fetch_tasks(self, num: int, finished: int):
         self.settings.fetch_num = num
@@ -849,11 +1459,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
         results = [wr.result for wr in worker_results]
         self.proj.key_task = worker_results[0].anno_id
+        if self.model_router is not None:
+            self.logger.debug(f"{self.model_router.hedge_stats=}")
         # self.add_results(results)
         self.add_result_undo_cmd(results, ResultUndoMode.ADD)
 
     def on_canvas_point_created(self, point: QPointF):
-        if self.current_image is None or self.proj.crt_label is None or self.proj.key_task is None:
+        if self.image_size is None or self.proj.crt_label is None or self.proj.key_task is None:
             self.logger.warning(f"{self.proj.crt_label=}, {self.proj.key_task=}")
             return
 
@@ -891,8 +1503,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.run_sam_api_worker(worker)
 
     def on_canvas_rectangle_created(self, item_state: Dict[str, Any] | None):
-        if item_state is None or self.proj.key_task is None or self.current_image is None:
-            self.logger.warning(f"Wrong {item_state=} or {self.proj.key_task=} or current_image")
+        if item_state is None or self.proj.key_task is None or self.image_size is None:
+            self.logger.warning(f"Wrong {item_state=} or {self.proj.key_task=} or no image")
             return
         self.logger.debug(f"Rectangle Created: {item_state=}")
         if not self.proj.crt_label:
@@ -1062,6 +1674,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.actionZoom_out.triggered.connect(self.on_action_zoom_out_triggered)
 
         self.action_import_task.triggered.connect(self.on_action_import_task_triggered)
+        self.actionOffline_pack.triggered.connect(self.build_offline_pack)
+        self.actionSync_offline_pack.triggered.connect(self.sync_offline_pack)
 
         self.actionR.triggered.connect(self.on_action_rgb_triggered)
         self.actionG.triggered.connect(self.on_action_rgb_triggered)
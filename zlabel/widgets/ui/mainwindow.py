@@ -185,6 +185,10 @@ class Ui_MainWindow(object):
         icon24 = QIcon()
         icon24.addFile(u":/icon/icons/afferent-three.svg", QSize(), QIcon.Normal, QIcon.Off)
         self.action_import_task.setIcon(icon24)
+        self.actionOffline_pack = QAction(MainWindow)
+        self.actionOffline_pack.setObjectName(u"actionOffline_pack")
+        self.actionSync_offline_pack = QAction(MainWindow)
+        self.actionSync_offline_pack.setObjectName(u"actionSync_offline_pack")
         self.actionTo_LabelMe = QAction(MainWindow)
         self.actionTo_LabelMe.setObjectName(u"actionTo_LabelMe")
         icon25 = QIcon()
@@ -398,6 +402,8 @@ class Ui_MainWindow(object):
         self.menubar.addAction(self.menuAbout.menuAction())
         self.menuFile.addAction(self.action_import_task)
         self.menuFile.addAction(self.actionExport)
+        self.menuFile.addAction(self.actionOffline_pack)
+        self.menuFile.addAction(self.actionSync_offline_pack)
         self.menuFile.addSeparator()
         self.menuFile.addAction(self.actionPrev)
         self.menuFile.addAction(self.actionNext)
@@ -661,6 +667,14 @@ class Ui_MainWindow(object):
         self.actionExport.setStatusTip(QCoreApplication.translate("MainWindow", u"Convert ISAT jsons to COCO json.", None))
 #endif // QT_CONFIG(statustip)
         self.action_import_task.setText(QCoreApplication.translate("MainWindow", u"Import", None))
+        self.actionOffline_pack.setText(QCoreApplication.translate("MainWindow", u"Offline Pack", None))
+#if QT_CONFIG(statustip)
+        self.actionOffline_pack.setStatusTip(QCoreApplication.translate("MainWindow", u"Download the unfinished tasks to label them offline.", None))
+#endif // QT_CONFIG(statustip)
+        self.actionSync_offline_pack.setText(QCoreApplication.translate("MainWindow", u"Sync Offline Pack", None))
+#if QT_CONFIG(statustip)
+        self.actionSync_offline_pack.setStatusTip(QCoreApplication.translate("MainWindow", u"Upload the annotations finished offline.", None))
+#endif // QT_CONFIG(statustip)
         self.actionTo_LabelMe.setText(QCoreApplication.translate("MainWindow", u"To LabelMe", None))
 #if QT_CONFIG(tooltip)
         self.actionTo_LabelMe.setToolTip(QCoreApplication.translate("MainWindow", u"Convert ISAT to LabelMe", None))
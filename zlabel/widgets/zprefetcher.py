@@ -0,0 +1,116 @@
+import threading
+from typing import List
+
+from qtpy.QtCore import QObject, QRunnable, QThreadPool
+
+from zlabel.utils import ImageCache, OfflinePack, SamApiHelper, ZLogger
+
+
+class ZPrefetchWorker(QRunnable):
+    def __init__(self, prefetcher: "ZPrefetcher", filename: str) -> None:
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.filename = filename
+
+    def run(self) -> None:
+        p = self.prefetcher
+        if not p.begin(self.filename):
+            return
+        try:
+            p.ensure_login()
+            self.fetch_image()
+        except Exception as e:
+            p.logger.warning(f"Prefetch {self.filename} failed, {e=}")
+        finally:
+            p.end(self.filename)
+
+    def fetch_image(self):
+        p = self.prefetcher
+        cache = p.image_cache
+        if cache.peek(self.filename) is not None:
+            return
+        data = p.pack.image(self.filename) if p.pack is not None else None
+        if data is not None:
+            if cache.memory_bytes < p.budget_bytes:
+                cache.memory.put(self.filename, ImageCache.decode(data))
+            return
+        path = cache.disk.get_path(self.filename)
+        if path is None:
+            if p.api.image_store is cache.disk:
+                path = p.api.download_image(self.filename)
+            else:
+                data = p.api.get_image_bytes(self.filename)
+                if data is None:
+                    return
+                cache.put_bytes(self.filename, data)
+                path = cache.disk.get_path(self.filename)
+            if path is None:
+                return
+        # decode into the memory tier only while it stays within the prefetch budget,
+        # otherwise the disk tier is warm enough to skip the network
+        if cache.memory_bytes < p.budget_bytes:
+            cache.memory.put(self.filename, ImageCache.decode_file(path))
+
+
+class ZPrefetcher(QObject):
+    """Fetches images of neighbouring tasks in the background.
+
+    Their annotations go through the batched ``ZGetAnnosWorker`` instead.
+    """
+
+    def __init__(
+        self,
+        api: SamApiHelper,
+        image_cache: ImageCache,
+        radius: int = 3,
+        threads: int = 2,
+        budget_bytes: int = 256 * 1024 * 1024,
+        username: str | None = None,
+        password: str | None = None,
+        parent: QObject | None = None,
+    ) -> None:
+        super().__init__(parent)
+        self.logger = ZLogger("ZPrefetcher")
+        self.api = api
+        self.image_cache = image_cache
+        self.radius = radius
+        self.budget_bytes = budget_bytes
+        self.username = username
+        self.password = password
+        # images of an open offline pack are read from it, never fetched
+        self.pack: OfflinePack | None = None
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, threads))
+        self._lock = threading.Lock()
+        self._running: set[str] = set()
+
+    def ensure_login(self):
+        if not self.api.user_token and self.username and self.password:
+            self.api.login(self.username, self.password)
+
+    def begin(self, filename: str) -> bool:
+        with self._lock:
+            if filename in self._running:
+                return False
+            self._running.add(filename)
+            return True
+
+    def end(self, filename: str):
+        with self._lock:
+            self._running.discard(filename)
+
+    def schedule(self, filenames: List[str]):
+        """
+        filenames: nearest first
+        """
+        # drop what is still queued for the previous row, running fetches finish anyway
+        self.pool.clear()
+        n = len(filenames)
+        for i, filename in enumerate(filenames):
+            if self.image_cache.peek(filename) is not None:
+                continue
+            self.pool.start(ZPrefetchWorker(self, filename), n - i)
+
+    def stop(self):
+        self.pool.clear()
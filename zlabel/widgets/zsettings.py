@@ -1,3 +1,5 @@
+from typing import List
+
 from qtpy.QtCore import QSettings
 from zlabel.utils import SettingsKey
 
@@ -17,7 +19,16 @@ class ZSettings(QSettings):
 
     @property
     def model_api(self):
-        return str(self.value(SettingsKey.MODEL_API.value, type=str))
+        value = self.value(SettingsKey.MODEL_API.value, "")
+        if isinstance(value, list):
+            # an unquoted comma separated list in the conf file
+            return ", ".join(str(v) for v in value)
+        return str(value)
+
+    @property
+    def model_apis(self) -> List[str]:
+        """model_api may list several servers separated by commas, the first one is the primary"""
+        return [url.strip() for url in self.model_api.split(",") if url.strip()]
 
     @property
     def username(self) -> str:
@@ -39,6 +50,20 @@ class ZSettings(QSettings):
     def project_path(self):
         return f"{self.project_dir}/{self.project_name}.zproj"
 
+    @property
+    def project_db_path(self):
+        return f"{self.project_dir}/{self.project_name}.zdb"
+
+    @property
+    def project_backend(self):
+        """journal: json snapshot, journal and shards, sqlite: one indexed database"""
+        return str(self.value(SettingsKey.PROJECT_BACKEND.value, "journal", type=str))
+
+    @property
+    def anno_format(self):
+        """json, or binary: a json header with the results packed as numpy columns"""
+        return str(self.value(SettingsKey.PROJ_ANNO_FORMAT.value, "json", type=str))
+
     @property
     def project_dir(self):
         return f"{self.root_dir}/projects/{self.project_name}"
@@ -67,8 +92,89 @@ class ZSettings(QSettings):
     def fetch_finished(self, value: int):
         self.setValue(SettingsKey.FETCH_FINISHED.value, value)
 
+    @property
+    def cache_memory_mb(self):
+        return int(self.value(SettingsKey.CACHE_MEMORY_MB.value, 512, type=int))  # type: ignore
+
+    @property
+    def cache_disk_mb(self):
+        return int(self.value(SettingsKey.CACHE_DISK_MB.value, 2048, type=int))  # type: ignore
+
+    @property
+    def image_cache_dir(self):
+        return f"{self.project_dir}/cache/images"
+
+    @property
+    def anno_cache_dir(self):
+        return f"{self.project_dir}/cache/annos"
+
+    @property
+    def anno_store_dir(self):
+        return f"{self.project_dir}/cache/zlabels"
+
+    @property
+    def token_path(self):
+        return f"{self.root_dir}/cache/token.json"
+
+    @property
+    def offline_pack_path(self):
+        return f"{self.project_dir}/offline.zpack"
+
+    @property
+    def acked_dir(self):
+        return f"{self.project_dir}/cache/acked"
+
+    @property
+    def prefetch_radius(self):
+        return int(self.value(SettingsKey.PREFETCH_RADIUS.value, 3, type=int))  # type: ignore
+
+    @property
+    def prefetch_threads(self):
+        return int(self.value(SettingsKey.PREFETCH_THREADS.value, 2, type=int))  # type: ignore
+
+    @property
+    def prefetch_budget_mb(self):
+        return int(self.value(SettingsKey.PREFETCH_BUDGET_MB.value, 256, type=int))  # type: ignore
+
+    @property
+    def anno_page_size(self):
+        return max(1, int(self.value(SettingsKey.ANNO_PAGE_SIZE.value, 50, type=int)))  # type: ignore
+
+    @property
+    def tasks_page_size(self):
+        return max(1, int(self.value(SettingsKey.TASKS_PAGE_SIZE.value, 1000, type=int)))  # type: ignore
+
+    @property
+    def upload_batch_size(self):
+        return max(1, int(self.value(SettingsKey.UPLOAD_BATCH_SIZE.value, 20, type=int)))  # type: ignore
+
+    @property
+    def preview_size(self):
+        """Longest side of the image preview shown while the full image loads, 0 to disable"""
+        return max(0, int(self.value(SettingsKey.PREVIEW_SIZE.value, 512, type=int)))  # type: ignore
+
+    @property
+    def hedge_percentile(self):
+        """Duplicate a prediction slower than this percentile of recent latencies, 0 to disable"""
+        value = float(self.value(SettingsKey.HEDGE_PERCENTILE.value, 0, type=float))  # type: ignore
+        return min(100.0, max(0.0, value))
+
+    @property
+    def anno_memory_mb(self):
+        """Memory for loaded annotations, the least recently used go back to their shards"""
+        return int(self.value(SettingsKey.ANNO_MEMORY_MB.value, 64, type=int))  # type: ignore
+
+    @property
+    def shard_dir(self):
+        return f"{self.project_dir}/shards"
+
+    @property
+    def upload_queue_path(self):
+        return f"{self.project_dir}/upload_queue.json"
+
     def validate(self) -> bool:
         passed = True
-        if not self.model_api.startswith("http") or self.username == "":
+        apis = self.model_apis
+        if not apis or not all(api.startswith("http") for api in apis) or self.username == "":
             passed = False
         return passed
@@ -1,14 +1,33 @@
 from dataclasses import dataclass
 import json
-import os
+import threading
 import time
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
+import requests
+from numpy.typing import NDArray
 from PIL import Image
 from qtpy.QtCore import QObject, QThread, Signal, QRunnable
 from rich import print
 
-from zlabel.utils import SamApiHelper, AutoMode, Label, Result, ResultType
+from zlabel.utils import (
+    SamApiHelper,
+    AnnotationCache,
+    Annotation,
+    AutoMode,
+    DeltaUploader,
+    ImageCache,
+    Label,
+    OfflinePack,
+    ProjectDB,
+    ProjectJournal,
+    Result,
+    ResultType,
+    SaveService,
+    SyncUnavailable,
+    UploadQueue,
+)
 from zlabel.utils.project import Task
 
 
@@ -145,36 +164,75 @@ class ZPreuploadImageWorker(QRunnable):
             print(e)
 
 
-class UploadFileEmitter(QObject):
+class FlushUploadsEmitter(QObject):
     success = Signal(str)
     fail = Signal(str)
+    finished = Signal()
 
 
-class ZUploadFileWorker(QRunnable):
+class ZFlushUploadsWorker(QRunnable):
     def __init__(
         self,
         api: SamApiHelper,
-        filename: str,
+        queue: UploadQueue,
+        uploader: DeltaUploader,
+        batch_size: int = 20,
         username: str | None = None,
         password: str | None = None,
+        saver: SaveService | None = None,
     ) -> None:
         super().__init__()
 
         self.api = api
-        self.filename = filename
+        self.queue = queue
+        self.uploader = uploader
+        self.saver = saver
+        self.batch_size = batch_size
         self.username = username
         self.password = password
-        self.emitter = UploadFileEmitter()
+        self.emitter = FlushUploadsEmitter()
 
     def run(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self.emitter.finished.emit()
+
+    def flush(self):
+        if self.saver is not None:
+            # queued files may still be waiting to be written
+            self.saver.flush()
         if not self.api.user_token and self.username and self.password:
             self.api.login(self.username, self.password)
-        if os.path.exists(self.filename):
-            r = self.api.save_zlabel(self.filename)
-            if r:
-                self.emitter.success.emit("Upload success!")
-            else:
-                self.emitter.fail.emit(f"Upload failed with {r=}")
+        uploaded, failed = 0, 0
+        tried: set[str] = set()
+        ignore_backoff = False
+        while True:
+            batch = self.queue.due(0, ignore_backoff=ignore_backoff)
+            batch = [it for it in batch if it.anno_id not in tried][: self.batch_size]
+            if not batch:
+                break
+            tried.update(it.anno_id for it in batch)
+            started_at = time.time()
+            try:
+                results = self.uploader.upload_many([it.filename for it in batch])
+            except Exception as e:
+                # most likely offline, everything waits for its backoff
+                self.queue.failed([it.anno_id for it in batch], str(e))
+                failed += len(batch)
+                break
+            ok = [it.anno_id for it in batch if results.get(it.filename, False)]
+            refused = [it.anno_id for it in batch if not results.get(it.filename, False)]
+            self.queue.done(ok, started_at)
+            self.queue.failed(refused, "refused by server")
+            uploaded += len(ok)
+            failed += len(refused)
+            # the connection is back, the rest doesn't have to wait for its backoff
+            ignore_backoff = True
+        if uploaded:
+            self.emitter.success.emit(f"Uploaded {uploaded} annotations")
+        if failed:
+            self.emitter.fail.emit(f"Upload failed, {len(self.queue)} annotations queued")
 
 
 class GetFileEmitter(QObject):
@@ -189,6 +247,8 @@ class ZGetImageWorker(QRunnable):
         filename: str,
         username: str | None = None,
         password: str | None = None,
+        cache: ImageCache | None = None,
+        pack: OfflinePack | None = None,
     ) -> None:
         super().__init__()
 
@@ -196,25 +256,229 @@ class ZGetImageWorker(QRunnable):
         self.filename = filename
         self.username = username
         self.password = password
+        self.cache = cache
+        self.pack = pack
         self.emitter = GetFileEmitter()
 
     def run(self) -> None:
-        if not self.api.user_token and self.username and self.password:
-            self.api.login(self.username, self.password)
-        image = self.api.get_image(self.filename)
-        time.sleep(0.5)
+        # counted in the cache statistics, a disk tier hit skips the network
+        image = self.cache.get(self.filename) if self.cache is not None else None
+        if image is None and self.pack is not None and (data := self.pack.image(self.filename)):
+            image = ImageCache.decode(data)
+        if image is None:
+            if not self.api.user_token and self.username and self.password:
+                self.api.login(self.username, self.password)
+            try:
+                image = self.fetch_image()
+            except Exception as e:
+                self.emitter.fail.emit(f"Decode image {self.filename} failed, {e=}")
+                return
+            if image is not None and self.cache is not None:
+                self.cache.memory.put(self.filename, image)
         if image is not None:
             self.emitter.success.emit(self.filename, image)
         else:
             self.emitter.fail.emit(f"Get image {self.filename} failed")
 
+    def fetch_image(self) -> NDArray[np.uint8] | None:
+        cache = self.cache
+        if cache is None:
+            data = self.api.get_image_bytes(self.filename)
+            return ImageCache.decode(data) if data is not None else None
+        if self.api.image_store is cache.disk:
+            # streamed to the disk tier and decoded from there, offline a copy stored
+            # meanwhile is used
+            try:
+                path = self.api.download_image(self.filename)
+            except requests.RequestException:
+                path = cache.disk.get_path(self.filename)
+            return ImageCache.decode_file(path) if path is not None else None
+        data = cache.get_bytes(self.filename)
+        if data is None:
+            data = self.api.get_image_bytes(self.filename)
+            if data is None:
+                return None
+            cache.put_bytes(self.filename, data)
+        return ImageCache.decode(data)
+
+
+class GetPreviewEmitter(QObject):
+    # filename, preview, (height, width) of the full image
+    success = Signal(str, object, object)
+
+
+class ZGetPreviewWorker(QRunnable):
+    """
+    Downscaled image to show while the full one loads: a JPEG already in the disk
+    tier is decoded at reduced scale, otherwise the server's thumbnail is fetched.
+    Failures are silent, the full image is on its way anyway.
+    """
+
+    def __init__(
+        self,
+        api: SamApiHelper,
+        filename: str,
+        size: int = 512,
+        username: str | None = None,
+        password: str | None = None,
+        cache: ImageCache | None = None,
+    ) -> None:
+        super().__init__()
+
+        self.api = api
+        self.filename = filename
+        self.size = size
+        self.username = username
+        self.password = password
+        self.cache = cache
+        self.emitter = GetPreviewEmitter()
+
+    def run(self) -> None:
+        try:
+            preview = self.local_preview()
+            if preview is None:
+                if not self.api.user_token and self.username and self.password:
+                    self.api.login(self.username, self.password)
+                preview = self.remote_preview()
+        except Exception:
+            return
+        if preview is not None:
+            image, full = preview
+            self.emitter.success.emit(self.filename, image, full)
+
+    def local_preview(self):
+        data = self.cache.get_bytes(self.filename) if self.cache is not None else None
+        if data is None:
+            return None
+        return ImageCache.decode_preview(data, self.size)
+
+    def remote_preview(self):
+        resp = self.api.get_thumbnail(self.filename, self.size)
+        if resp is None:
+            return None
+        data, full = resp
+        return ImageCache.decode(data), full
+
+
+class GetAnnosEmitter(QObject):
+    # found anno ids, missing anno ids
+    success = Signal(object, object)
+    # requested anno ids, message
+    fail = Signal(object, str)
+
+
+class ZGetAnnosWorker(QRunnable):
+    def __init__(
+        self,
+        api: SamApiHelper,
+        anno_ids: List[str],
+        cache: AnnotationCache,
+        suffix: str = "zlabel",
+        username: str | None = None,
+        password: str | None = None,
+    ) -> None:
+        super().__init__()
+
+        self.api = api
+        self.anno_ids = anno_ids
+        self.cache = cache
+        self.suffix = suffix
+        self.username = username
+        self.password = password
+        self.emitter = GetAnnosEmitter()
+
+    def run(self) -> None:
+        try:
+            if not self.api.user_token and self.username and self.password:
+                self.api.login(self.username, self.password)
+            names = {f"{i}.{self.suffix}": i for i in self.anno_ids}
+            zlabels = self.api.get_zlabels(list(names.keys()))
+        except Exception as e:
+            self.emitter.fail.emit(self.anno_ids, f"Get annos failed with {e=}")
+            return
+        if zlabels is None:
+            self.emitter.fail.emit(self.anno_ids, "Get annos failed")
+            return
+        found, missing = [], []
+        for name, text in zlabels.items():
+            anno_id = names[name]
+            try:
+                if text is None:
+                    raise ValueError("not found")
+                # validate here, so the UI thread only has to take it from the cache
+                self.cache.put(anno_id, text, Annotation.model_validate_json(text))
+                found.append(anno_id)
+            except Exception:
+                missing.append(anno_id)
+        self.emitter.success.emit(found, missing)
+
+
+class BuildPackEmitter(QObject):
+    # done, total
+    progress = Signal(int, int)
+    # pack, tasks left out
+    success = Signal(object, object)
+    fail = Signal(str)
+
+
+class ZBuildPackWorker(QRunnable):
+    def __init__(
+        self,
+        api: SamApiHelper,
+        path: str,
+        tasks: List[Task],
+        suffix: str = "zlabel",
+        threads: int = 8,
+        username: str | None = None,
+        password: str | None = None,
+    ) -> None:
+        super().__init__()
+
+        self.api = api
+        self.path = path
+        self.tasks = tasks
+        self.suffix = suffix
+        self.threads = threads
+        self.username = username
+        self.password = password
+        self.emitter = BuildPackEmitter()
+
+    def run(self) -> None:
+        try:
+            if not self.api.user_token and self.username and self.password:
+                self.api.login(self.username, self.password)
+            pack, failed = OfflinePack.build(
+                self.path,
+                self.api,
+                self.tasks,
+                self.suffix,
+                self.threads,
+                progress=self.emitter.progress.emit,
+            )
+        except Exception as e:
+            self.emitter.fail.emit(f"Build offline pack failed, {e=}")
+            return
+        self.emitter.success.emit(pack, failed)
+
 
 class GetTasksEmitter(QObject):
-    success = Signal(object)
+    # page of tasks, emitted as soon as it is validated
+    page = Signal(object)
+    # total number of tasks, sync cursor
+    success = Signal(object, object)
+    # page of synced changes: upserted tasks, removed anno_ids
+    changes = Signal(object, object)
+    # number of changes, sync cursor
+    synced = Signal(object, object)
     fail = Signal(object)
 
 
 class ZGetTasksWorker(QRunnable):
+    """
+    Fetch the task list page by page, or with `since` only the changes after that
+    sync cursor, falling back to the full list if the server can't serve them.
+    """
+
     def __init__(
         self,
         api: SamApiHelper,
@@ -222,6 +486,8 @@ class ZGetTasksWorker(QRunnable):
         finished: int = 1,
         username: str | None = None,
         password: str | None = None,
+        page_size: int = 1000,
+        since: str | None = None,
     ) -> None:
         super().__init__()
 
@@ -230,20 +496,108 @@ class ZGetTasksWorker(QRunnable):
         self.password = password
         self.num = num
         self.finished = finished
+        self.page_size = page_size
+        self.since = since
         self.emitter = GetTasksEmitter()
 
     def run(self) -> None:
         if not self.api.user_token and self.username and self.password:
             self.api.login(self.username, self.password)
-        tasks = self.api.get_tasks(self.num, self.finished)
-        if tasks is not None:
-            try:
-                task_list = [Task.model_validate(t) for t in tasks]
-                self.emitter.success.emit(task_list)
-            except Exception as e:
-                self.emitter.fail.emit(f"Get tasks failed with {e=}")
-        else:
-            self.emitter.fail.emit("Get tasks failed")
+        try:
+            if self.since is not None and self.sync():
+                return
+            self.fetch_all()
+        except Exception as e:
+            self.emitter.fail.emit(f"Get tasks failed with {e=}")
+
+    def sync(self) -> bool:
+        meta: Dict[str, Any] = {}
+        total = 0
+        upserts: List[Task] = []
+        removed: List[str] = []
+        try:
+            for d in self.api.iter_task_changes(self.since, self.finished, self.page_size, meta):
+                if d.get("op") == "remove":
+                    removed.append(d["anno_id"])
+                else:
+                    upserts.append(Task.model_validate(d["task"]))
+                if len(upserts) + len(removed) >= self.page_size:
+                    total += len(upserts) + len(removed)
+                    self.emitter.changes.emit(upserts, removed)
+                    upserts, removed = [], []
+        except SyncUnavailable:
+            if total > 0:
+                raise
+            return False
+        if upserts or removed:
+            total += len(upserts) + len(removed)
+            self.emitter.changes.emit(upserts, removed)
+        self.emitter.synced.emit(total, meta.get("sync_cursor", self.since))
+        return True
+
+    def fetch_all(self):
+        meta: Dict[str, Any] = {}
+        total = 0
+        page: List[Task] = []
+        for t in self.api.iter_tasks(self.num, self.finished, self.page_size, meta):
+            page.append(Task.model_validate(t))
+            if len(page) >= self.page_size:
+                total += len(page)
+                self.emitter.page.emit(page)
+                page = []
+        if page:
+            total += len(page)
+            self.emitter.page.emit(page)
+        self.emitter.success.emit(total, meta.get("sync_cursor", None))
+
+
+class LoadProjectEmitter(QObject):
+    # page of tasks, emitted as soon as it is parsed
+    page = Signal(object)
+    # the project, None if there is none yet
+    success = Signal(object)
+    fail = Signal(str)
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class ZLoadProjectWorker(QRunnable):
+    """Load the project off the UI thread, the file list fills while it is parsed"""
+
+    def __init__(self, store: ProjectJournal | ProjectDB, page_size: int = 1000) -> None:
+        super().__init__()
+
+        self.store = store
+        self.page_size = page_size
+        self.emitter = LoadProjectEmitter()
+        # set once run returns, the store may be closed after that
+        self.done = threading.Event()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop at the next page, nothing is emitted afterwards"""
+        self._cancelled.set()
+
+    def run(self) -> None:
+        try:
+            proj = self.store.load(on_tasks=self.on_tasks, page_size=self.page_size)
+        except LoadCancelled:
+            return
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.emitter.fail.emit(f"Load project failed with {e=}")
+            return
+        finally:
+            self.done.set()
+        if not self._cancelled.is_set():
+            self.emitter.success.emit(proj)
+
+    def on_tasks(self, tasks: List[Task]):
+        if self._cancelled.is_set():
+            raise LoadCancelled()
+        self.emitter.page.emit(tasks)
 
 
 if __name__ == "__main__":